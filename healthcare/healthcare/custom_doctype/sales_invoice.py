@@ -2,28 +2,22 @@ import frappe
 
 from erpnext.accounts.doctype.sales_invoice.sales_invoice import SalesInvoice
 
+from healthcare.healthcare.utils import HealthcarePriceResolver
+
 
 class HealthcareSalesInvoice(SalesInvoice):
 	@frappe.whitelist()
 	def set_healthcare_services(self, checked_values):
-		from erpnext.stock.get_item_details import get_item_details
+		prices = HealthcarePriceResolver.for_patient(
+			self.patient,
+			self.company,
+			price_list=self.selling_price_list,
+			currency=self.price_list_currency,
+		)
+		prices.get_item_details([item["item"] for item in checked_values if not item["rate"]])
 
 		for checked_item in checked_values:
 			item_line = self.append("items", {})
-			price_list, price_list_currency = frappe.db.get_values(
-				"Price List", {"selling": 1}, ["name", "currency"]
-			)[0]
-			args = {
-				"doctype": "Sales Invoice",
-				"item_code": checked_item["item"],
-				"company": self.company,
-				"customer": frappe.db.get_value("Patient", self.patient, "customer"),
-				"selling_price_list": price_list,
-				"price_list_currency": price_list_currency,
-				"plc_conversion_rate": 1.0,
-				"conversion_rate": 1.0,
-			}
-			item_details = get_item_details(args)
 			item_line.item_code = checked_item["item"]
 			item_line.qty = 1
 			if checked_item["qty"]:
@@ -31,7 +25,7 @@ class HealthcareSalesInvoice(SalesInvoice):
 			if checked_item["rate"]:
 				item_line.rate = checked_item["rate"]
 			else:
-				item_line.rate = item_details.price_list_rate
+				item_line.rate = prices.get_rate(checked_item["item"])
 			item_line.amount = float(item_line.rate) * float(item_line.qty)
 			if checked_item["income_account"]:
 				item_line.income_account = checked_item["income_account"]
@@ -1,5 +1,19 @@
 import frappe
 from frappe.tests import IntegrationTestCase
+from frappe.utils import add_days, now_datetime, nowdate
+
+from healthcare.healthcare.doctype.lab_test.test_lab_test import (
+	create_lab_test,
+	create_lab_test_template,
+)
+from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
+	create_patient,
+)
+from healthcare.healthcare.utils import (
+	HealthcarePriceResolver,
+	get_healthcare_services_to_invoice,
+	set_invoiced_in_bulk,
+)
 
 EXTRA_TEST_RECORD_DEPENDENCIES = ["Sales Invoice"]
 
@@ -27,3 +41,142 @@ class TestSalesInvoice(IntegrationTestCase):
 
 		invoice.set_healthcare_services(checked_values)
 		self.assertEqual(count + 2, len(invoice.items))
+
+	def test_healthcare_services_to_invoice_should_not_query_per_record(self):
+		patient = create_patient(patient_name="_Test Patient Bulk Billing")
+		template = create_lab_test_template()
+		frappe.db.sql("delete from `tabLab Test` where patient=%s", patient)
+
+		timestamp = now_datetime()
+		frappe.db.bulk_insert(
+			"Lab Test",
+			["name", "creation", "modified", "docstatus", "patient", "company", "template", "invoiced"],
+			[
+				(
+					f"_Test Bulk Lab Test {i}",
+					timestamp,
+					timestamp,
+					1,
+					patient,
+					"_Test Company",
+					template.name,
+					0,
+				)
+				for i in range(5000)
+			],
+		)
+
+		# query count must not scale with the number of unbilled records
+		with self.assertQueryCount(50):
+			services = get_healthcare_services_to_invoice(patient, None, "_Test Company")
+
+		lab_tests = [service for service in services if service["reference_type"] == "Lab Test"]
+		self.assertEqual(len(lab_tests), 5000)
+		self.assertTrue(all(service["service"] == template.item for service in lab_tests))
+
+	def test_set_invoiced_in_bulk(self):
+		template = create_lab_test_template()
+		lab_tests = [create_lab_test(template).name for i in range(3)]
+		items = [
+			frappe._dict(reference_dt="Lab Test", reference_dn=lab_test, item_code=template.item, qty=1)
+			for lab_test in lab_tests
+		]
+
+		set_invoiced_in_bulk(items, "on_submit")
+		for lab_test in lab_tests:
+			self.assertEqual(frappe.db.get_value("Lab Test", lab_test, "invoiced"), 1)
+
+		# already invoiced
+		self.assertRaises(frappe.ValidationError, set_invoiced_in_bulk, items[:1], "on_submit")
+
+		set_invoiced_in_bulk(items, "on_cancel")
+		for lab_test in lab_tests:
+			self.assertEqual(frappe.db.get_value("Lab Test", lab_test, "invoiced"), 0)
+
+		# same document referenced twice in one invoice
+		self.assertRaises(
+			frappe.ValidationError, set_invoiced_in_bulk, [items[0], items[0]], "on_submit"
+		)
+
+	def test_price_resolver(self):
+		price_list = create_price_list("_Test Healthcare Price List")
+		frappe.db.set_single_value("Healthcare Settings", "default_price_list", price_list)
+		frappe.db.delete("Pricing Rule", {"rate_or_discount": "Rate"})
+		frappe.db.delete("Item Price", {"price_list": price_list})
+		customer = create_customer("_Test Healthcare Pricing Customer")
+
+		items = [create_service_item(f"_Test Healthcare Priced Item {i}") for i in range(10)]
+		for i, item in enumerate(items):
+			create_item_price(item, price_list, 100 + i)
+		create_item_price(items[0], price_list, 50, customer=customer)
+		# expired
+		create_item_price(
+			items[1],
+			price_list,
+			10,
+			valid_from=add_days(nowdate(), -10),
+			valid_upto=add_days(nowdate(), -1),
+		)
+
+		prices = HealthcarePriceResolver("_Test Company", customer)
+		self.assertEqual(prices.price_list, price_list)
+		with self.assertQueryCount(2):
+			details = prices.get_item_details(items)
+
+		self.assertEqual(details[items[0]].price_list_rate, 50)
+		self.assertEqual(details[items[1]].price_list_rate, 101)
+		self.assertEqual(details[items[9]].price_list_rate, 109)
+		self.assertEqual(details[items[9]].item_name, items[9])
+
+		# cached for the lifetime of the resolver
+		with self.assertQueryCount(0):
+			self.assertEqual(prices.get_rate(items[5]), 105)
+
+		frappe.db.set_single_value("Healthcare Settings", "default_price_list", None)
+
+
+def create_price_list(name):
+	if not frappe.db.exists("Price List", name):
+		frappe.get_doc(
+			{"doctype": "Price List", "price_list_name": name, "currency": "INR", "selling": 1}
+		).insert()
+	return name
+
+
+def create_customer(name):
+	if not frappe.db.exists("Customer", name):
+		frappe.get_doc(
+			{
+				"doctype": "Customer",
+				"customer_name": name,
+				"customer_group": "All Customer Groups",
+				"territory": "All Territories",
+			}
+		).insert()
+	return name
+
+
+def create_service_item(item_code):
+	if not frappe.db.exists("Item", item_code):
+		frappe.get_doc(
+			{
+				"doctype": "Item",
+				"item_code": item_code,
+				"item_group": "Services",
+				"is_stock_item": 0,
+				"stock_uom": "Nos",
+			}
+		).insert()
+	return item_code
+
+
+def create_item_price(item_code, price_list, rate, **kwargs):
+	return frappe.get_doc(
+		{
+			"doctype": "Item Price",
+			"item_code": item_code,
+			"price_list": price_list,
+			"price_list_rate": rate,
+			**kwargs,
+		}
+	).insert()
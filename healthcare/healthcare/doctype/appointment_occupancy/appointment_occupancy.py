@@ -0,0 +1,200 @@
+# Copyright (c) 2026, earthians Health Informatics Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+"""
+Per day, per resource interval index of Patient Appointments.
+
+Every appointment that is not Cancelled gets one row per resource it occupies
+(practitioner, patient and service unit) with its start and end time, so that
+overlap and capacity checks are range lookups on an index instead of computing
+`appointment_time + INTERVAL duration MINUTE` for every appointment of the day.
+Status changes that bypass the document (Closed by an encounter, re-opened on
+cancel) are handled by joining the appointment status at lookup time.
+"""
+
+import datetime
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, now, to_timedelta
+
+RESOURCE_FIELDS = {
+	"Healthcare Practitioner": "practitioner",
+	"Patient": "patient",
+	"Healthcare Service Unit": "service_unit",
+}
+APPOINTMENT_FIELDS = [
+	"name",
+	"status",
+	"appointment_date",
+	"appointment_time",
+	"duration",
+	*RESOURCE_FIELDS.values(),
+]
+INDEX_FIELDS = [
+	"name",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"appointment",
+	"appointment_date",
+	"start_time",
+	"end_time",
+	"resource_type",
+	"resource",
+]
+
+
+class AppointmentOccupancy(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index(
+		"Appointment Occupancy",
+		["resource_type", "resource", "appointment_date", "start_time"],
+		index_name="resource_date_start_time_index",
+	)
+
+
+def get_occupancy_interval(appointment_time, duration):
+	"""Returns start and end of the appointment as TIME strings, end may be past 24:00:00"""
+	start = to_timedelta(appointment_time or "00:00:00")
+	end = start + datetime.timedelta(minutes=flt(duration))
+
+	return format_time(start), format_time(end)
+
+
+def format_time(delta):
+	seconds = int(delta.total_seconds())
+	return "{:02d}:{:02d}:{:02d}".format(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def get_occupancy_rows(appointment):
+	if appointment.status == "Cancelled" or not appointment.appointment_date:
+		return []
+
+	start_time, end_time = get_occupancy_interval(appointment.appointment_time, appointment.duration)
+	timestamp = now()
+	rows = []
+	for resource_type, fieldname in RESOURCE_FIELDS.items():
+		if appointment.get(fieldname):
+			rows.append(
+				(
+					frappe.generate_hash(length=10),
+					timestamp,
+					timestamp,
+					frappe.session.user,
+					frappe.session.user,
+					appointment.name,
+					appointment.appointment_date,
+					start_time,
+					end_time,
+					resource_type,
+					appointment.get(fieldname),
+				)
+			)
+
+	return rows
+
+
+def update_appointment_occupancy(appointment):
+	"""Re-index `appointment`, a Patient Appointment doc or name"""
+	if isinstance(appointment, str):
+		appointment = frappe.db.get_value(
+			"Patient Appointment", appointment, APPOINTMENT_FIELDS, as_dict=True
+		)
+		if not appointment:
+			return
+
+	delete_appointment_occupancy(appointment.name)
+	rows = get_occupancy_rows(appointment)
+	if rows:
+		frappe.db.bulk_insert("Appointment Occupancy", INDEX_FIELDS, rows)
+
+
+def delete_appointment_occupancy(appointment):
+	frappe.db.delete("Appointment Occupancy", {"appointment": appointment})
+
+
+def get_overlapping_appointments(
+	resources, appointment_date, appointment_time, duration, exclude=None
+):
+	"""
+	Returns active appointments occupying any of `resources` in the interval
+
+	:param resources: list of (resource_type, resource) tuples
+	:param exclude: appointment name to leave out, usually the one being validated
+	"""
+	resources = [(resource_type, resource) for resource_type, resource in resources if resource]
+	if not resources:
+		return []
+
+	start_time, end_time = get_occupancy_interval(appointment_time, duration)
+	occupancy = frappe.qb.DocType("Appointment Occupancy")
+	appointment = frappe.qb.DocType("Patient Appointment")
+
+	resource_condition = None
+	for resource_type, resource in resources:
+		condition = (occupancy.resource_type == resource_type) & (occupancy.resource == resource)
+		resource_condition = condition if resource_condition is None else resource_condition | condition
+
+	query = (
+		frappe.qb.from_(occupancy)
+		.join(appointment)
+		.on(occupancy.appointment == appointment.name)
+		.select(
+			appointment.name,
+			appointment.practitioner,
+			appointment.patient,
+			appointment.appointment_time,
+			appointment.duration,
+			appointment.service_unit,
+		)
+		.distinct()
+		.where(
+			resource_condition
+			& (occupancy.appointment_date == appointment_date)
+			& (
+				((occupancy.start_time < end_time) & (occupancy.end_time > start_time))
+				| (occupancy.start_time == start_time)
+			)
+			& (appointment.status.notin(["Closed", "Cancelled"]))
+		)
+	)
+	if exclude:
+		query = query.where(occupancy.appointment != exclude)
+
+	return query.run(as_dict=True)
+
+
+def rebuild_appointment_occupancy(from_date=None, chunk_size=5000):
+	"""Rebuild the index from `tabPatient Appointment`, optionally only from `from_date` onwards"""
+	filters = {"status": ("!=", "Cancelled")}
+	if from_date:
+		filters["appointment_date"] = (">=", from_date)
+		frappe.db.delete("Appointment Occupancy", {"appointment_date": (">=", from_date)})
+	else:
+		frappe.db.delete("Appointment Occupancy")
+
+	start = 0
+	while True:
+		appointments = frappe.get_all(
+			"Patient Appointment",
+			filters=filters,
+			fields=APPOINTMENT_FIELDS,
+			order_by="name",
+			start=start,
+			page_length=chunk_size,
+		)
+		if not appointments:
+			break
+
+		rows = []
+		for appointment in appointments:
+			rows += get_occupancy_rows(appointment)
+		if rows:
+			frappe.db.bulk_insert("Appointment Occupancy", INDEX_FIELDS, rows)
+
+		start += chunk_size
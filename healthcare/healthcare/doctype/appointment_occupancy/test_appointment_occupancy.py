@@ -0,0 +1,102 @@
+# Copyright (c) 2026, earthians Health Informatics Pvt. Ltd. and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests import IntegrationTestCase
+from frappe.utils import nowdate
+
+from healthcare.healthcare.doctype.appointment_occupancy.appointment_occupancy import (
+	INDEX_FIELDS,
+	get_overlapping_appointments,
+	rebuild_appointment_occupancy,
+)
+from healthcare.healthcare.doctype.patient_appointment.patient_appointment import update_status
+from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
+	create_appointment,
+	create_healthcare_docs,
+	create_service_unit,
+)
+
+
+class TestAppointmentOccupancy(IntegrationTestCase):
+	def setUp(self):
+		frappe.db.sql("""delete from `tabPatient Appointment`""")
+		frappe.db.sql("""delete from `tabAppointment Occupancy`""")
+
+	def test_occupancy_maintained_on_appointment_changes(self):
+		patient, practitioner = create_healthcare_docs()
+		service_unit = create_service_unit(id=0)
+		appointment = create_appointment(
+			patient, practitioner, nowdate(), service_unit=service_unit, appointment_time="10:00:00"
+		)
+
+		occupancy = get_occupancy(appointment.name)
+		self.assertEqual(
+			{row.resource_type for row in occupancy},
+			{"Healthcare Practitioner", "Patient", "Healthcare Service Unit"},
+		)
+		self.assertTrue(all(str(row.end_time) == "10:15:00" for row in occupancy))
+
+		# reschedule
+		appointment.appointment_time = "11:00:00"
+		appointment.save()
+		occupancy = get_occupancy(appointment.name)
+		self.assertEqual(len(occupancy), 3)
+		self.assertTrue(all(str(row.start_time) == "11:00:00" for row in occupancy))
+
+		update_status(appointment.name, "Cancelled")
+		self.assertFalse(get_occupancy(appointment.name))
+
+	def test_rebuild_occupancy(self):
+		patient, practitioner = create_healthcare_docs()
+		for appointment_time in ["09:00:00", "09:30:00", "10:00:00"]:
+			create_appointment(patient, practitioner, nowdate(), appointment_time=appointment_time)
+
+		expected = get_occupancy()
+		rebuild_appointment_occupancy()
+		self.assertEqual(expected, get_occupancy())
+
+	def test_overlap_lookup_on_busy_day(self):
+		patient, practitioner = create_healthcare_docs()
+		appointment = create_appointment(
+			patient, practitioner, nowdate(), appointment_time="10:00:00"
+		)
+
+		# other resources booked all day should not be looked at
+		timestamp = frappe.utils.now()
+		frappe.db.bulk_insert(
+			"Appointment Occupancy",
+			INDEX_FIELDS,
+			[
+				(
+					f"_Test Occupancy {i}",
+					timestamp,
+					timestamp,
+					"Administrator",
+					"Administrator",
+					appointment.name,
+					nowdate(),
+					"10:00:00",
+					"10:15:00",
+					"Healthcare Practitioner",
+					f"_Test Busy Practitioner {i}",
+				)
+				for i in range(10000)
+			],
+		)
+
+		resources = [("Healthcare Practitioner", practitioner)]
+		overlapping = get_overlapping_appointments(resources, nowdate(), "10:10:00", 15)
+		self.assertEqual([row.name for row in overlapping], [appointment.name])
+		self.assertFalse(get_overlapping_appointments(resources, nowdate(), "10:15:00", 15))
+		self.assertFalse(get_overlapping_appointments(resources, nowdate(), "09:45:00", 15))
+
+
+def get_occupancy(appointment=None):
+	filters = {"appointment": appointment} if appointment else {}
+	return frappe.get_all(
+		"Appointment Occupancy",
+		filters=filters,
+		fields=["appointment", "resource_type", "resource", "appointment_date", "start_time", "end_time"],
+		order_by="appointment, resource_type",
+	)
@@ -8,7 +8,6 @@ from frappe.model.document import Document
 from frappe.model.mapper import get_mapped_doc
 from frappe.utils import flt, get_link_to_form, now_datetime, nowdate, nowtime
 
-from erpnext.stock.get_item_details import get_item_details
 from erpnext.stock.stock_ledger import get_previous_sle
 
 from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import get_account
@@ -17,7 +16,7 @@ from healthcare.healthcare.doctype.nursing_task.nursing_task import NursingTask
 from healthcare.healthcare.doctype.service_request.service_request import (
 	update_service_request_status,
 )
-from healthcare.healthcare.utils import validate_nursing_tasks
+from healthcare.healthcare.utils import HealthcarePriceResolver, validate_nursing_tasks
 
 
 class ClinicalProcedure(Document):
@@ -126,31 +125,21 @@ class ClinicalProcedure(Document):
 			consumption_details = False
 			customer = frappe.db.get_value("Patient", self.patient, "customer")
 			if customer:
-				for item in self.items:
-					if item.invoice_separately_as_consumables:
-						price_list, price_list_currency = frappe.db.get_values(
-							"Price List", {"selling": 1}, ["name", "currency"]
-						)[0]
-						args = {
-							"doctype": "Sales Invoice",
-							"item_code": item.item_code,
-							"company": self.company,
-							"warehouse": self.warehouse,
-							"customer": customer,
-							"selling_price_list": price_list,
-							"price_list_currency": price_list_currency,
-							"plc_conversion_rate": 1.0,
-							"conversion_rate": 1.0,
-						}
-						item_details = get_item_details(args)
-						item_price = item_details.price_list_rate * item.qty
-						item_consumption_details = (
-							item_details.item_name + " " + str(item.qty) + " " + item.uom + " " + str(item_price)
-						)
-						consumable_total_amount += item_price
-						if not consumption_details:
-							consumption_details = _("Clinical Procedure ({0}):").format(self.name)
-						consumption_details += "\n\t" + item_consumption_details
+				consumables = [
+					item for item in self.items if item.invoice_separately_as_consumables
+				]
+				prices = HealthcarePriceResolver(self.company, customer, warehouse=self.warehouse)
+				details = prices.get_item_details([item.item_code for item in consumables])
+				for item in consumables:
+					item_details = details[item.item_code]
+					item_price = item_details.price_list_rate * item.qty
+					item_consumption_details = (
+						item_details.item_name + " " + str(item.qty) + " " + item.uom + " " + str(item_price)
+					)
+					consumable_total_amount += item_price
+					if not consumption_details:
+						consumption_details = _("Clinical Procedure ({0}):").format(self.name)
+					consumption_details += "\n\t" + item_consumption_details
 
 				if consumable_total_amount > 0:
 					frappe.db.set_value(
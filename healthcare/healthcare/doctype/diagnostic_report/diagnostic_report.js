@@ -21,6 +21,16 @@ frappe.ui.form.on("Diagnostic Report", {
 			args: {
 				docname: frm.doc.name
 			},
+			callback: function(r) {
+				if (r.message && r.message.queued) {
+					frappe.show_alert({
+						message: __("Updating {0} Observations in the background", [
+							r.message.queued
+						]),
+						indicator: "blue"
+					});
+				}
+			}
 		})
 	}
 });
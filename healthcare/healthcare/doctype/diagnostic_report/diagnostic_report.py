@@ -2,10 +2,18 @@
 # For license information, please see license.txt
 
 import frappe
+from frappe import _
 from frappe.model.document import Document
 from frappe.model.workflow import get_workflow_name, get_workflow_state_field
 
-from healthcare.healthcare.doctype.observation.observation import get_observation_details
+from healthcare.healthcare.doctype.observation.observation import (
+	OBSERVATION_RESULT_FIELDS,
+	get_observation_details,
+	get_sales_invoice_observation_counters,
+	observation_has_result,
+)
+
+BULK_STATUS_QUEUE_THRESHOLD = 20
 
 
 class DiagnosticReport(Document):
@@ -18,6 +26,9 @@ class DiagnosticReport(Document):
 	def before_insert(self):
 		if self.ref_doctype == "Sales Invoice" and self.docname:
 			self.practitioner = frappe.db.get_value(self.ref_doctype, self.docname, "ref_practitioner")
+			self.pending_observations, self.approved_observations = (
+				get_sales_invoice_observation_counters([self.docname]).get(self.docname, (0, 0))
+			)
 
 	def set_age(self):
 		if not self.age:
@@ -43,7 +54,6 @@ def diagnostic_report_print(diagnostic_report):
 
 def validate_observations_has_result(doc):
 	if doc.ref_doctype == "Sales Invoice":
-		submittable = True
 		observations = frappe.db.get_all(
 			"Observation",
 			{
@@ -52,12 +62,9 @@ def validate_observations_has_result(doc):
 				"has_component": False,
 				"status": ["!=", "Cancelled"],
 			},
-			pluck="name",
+			OBSERVATION_RESULT_FIELDS,
 		)
-		for obs in observations:
-			if not frappe.get_doc("Observation", obs).has_result():
-				submittable = False
-		return submittable
+		return all(observation_has_result(obs) for obs in observations)
 
 
 def set_diagnostic_status(doc):
@@ -79,28 +86,106 @@ def set_diagnostic_status(doc):
 
 @frappe.whitelist()
 def set_observation_status(docname):
+	"""
+	Approves the observations with a result, or disapproves the approved ones, of the report
+	`docname` as per the report's status. Reports with more than BULK_STATUS_QUEUE_THRESHOLD
+	observations to update are processed in a background job.
+	"""
 	doc = frappe.get_doc("Diagnostic Report", docname)
-	if doc.ref_doctype == "Sales Invoice":
-		observations = frappe.db.get_all(
+	if doc.ref_doctype != "Sales Invoice" or doc.status not in ["Approved", "Disapproved"]:
+		return
+
+	filters = {"sales_invoice": doc.docname, "has_component": False}
+	if doc.status == "Approved":
+		filters.update(
+			{"docstatus": 0, "status": ["not in", ["Cancelled", "Approved", "Disapproved"]]}
+		)
+	else:
+		filters.update({"docstatus": 1, "status": "Approved"})
+
+	observations = [
+		obs.name
+		for obs in frappe.get_all(
 			"Observation",
-			{
-				"sales_invoice": doc.docname,
-				"docstatus": ["!=", 2],
-				"has_component": False,
-				"status": ["not in", ["Cancelled", "Approved", "Disapproved"]],
-			},
-			pluck="name",
+			filters=filters,
+			fields=["name", *OBSERVATION_RESULT_FIELDS],
+			order_by="creation",
+		)
+		if observation_has_result(obs)
+	]
+	if not observations:
+		return
+
+	if len(observations) > BULK_STATUS_QUEUE_THRESHOLD:
+		frappe.enqueue(
+			update_observations_status,
+			queue="long",
+			docname=docname,
+			observations=observations,
+			status=doc.status,
+			enqueue_after_commit=True,
+			now=frappe.flags.in_test,
+		)
+		return {"queued": len(observations)}
+
+	update_observations_status(docname, observations, doc.status)
+
+
+def update_observations_status(docname, observations, status):
+	"""Submits, or cancels and re-creates as drafts, `observations` of the report `docname`"""
+	for i, observation in enumerate(observations):
+		observation_doc = frappe.get_doc("Observation", observation)
+		if status == "Approved":
+			observation_doc.status = status
+			observation_doc.submit()
+		else:
+			new_doc = frappe.copy_doc(observation_doc)
+			new_doc.status = ""
+			new_doc.insert()
+			observation_doc.cancel()
+
+		frappe.publish_progress(
+			(i + 1) * 100 / len(observations),
+			title=_("Updating Observations"),
+			doctype="Diagnostic Report",
+			docname=docname,
+		)
+
+
+def reconcile_observation_counters(chunk_size=1000):
+	"""
+	Daily, recounts the pending and approved observations of the Diagnostic Reports of sales
+	invoices and corrects the counters that drifted
+
+	:return: number of reports corrected
+	"""
+	corrected = 0
+	last_name = ""
+	while True:
+		reports = frappe.get_all(
+			"Diagnostic Report",
+			filters={"ref_doctype": "Sales Invoice", "name": (">", last_name)},
+			fields=["name", "docname", "pending_observations", "approved_observations"],
+			order_by="name",
+			limit=chunk_size,
 		)
-		if observations:
-			for obs in observations:
-				if doc.status in ["Approved", "Disapproved"]:
-					observation_doc = frappe.get_doc("Observation", obs)
-					if observation_doc.has_result():
-						if doc.status == "Approved" and not observation_doc.status in ["Approved", "Disapproved"]:
-							observation_doc.status = doc.status
-							observation_doc.save().submit()
-						if doc.status == "Disapproved" and observation_doc.status == "Approved":
-							new_doc = frappe.copy_doc(observation_doc)
-							new_doc.status = ""
-							new_doc.insert()
-							observation_doc.cancel()
+		if not reports:
+			break
+
+		counters = get_sales_invoice_observation_counters([report.docname for report in reports])
+		for report in reports:
+			pending, approved = counters.get(report.docname, (0, 0))
+			if (report.pending_observations, report.approved_observations) != (pending, approved):
+				frappe.db.set_value(
+					"Diagnostic Report",
+					report.name,
+					{"pending_observations": pending, "approved_observations": approved},
+					update_modified=False,
+				)
+				corrected += 1
+
+		last_name = reports[-1].name
+		if not frappe.flags.in_test:
+			frappe.db.commit()
+
+	return corrected
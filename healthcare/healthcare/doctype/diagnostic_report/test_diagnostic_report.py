@@ -1,9 +1,93 @@
 # Copyright (c) 2023, healthcare and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
 from frappe.tests import IntegrationTestCase
 
+from healthcare.healthcare.doctype.diagnostic_report import diagnostic_report
+from healthcare.healthcare.doctype.diagnostic_report.diagnostic_report import (
+	reconcile_observation_counters,
+	validate_observations_has_result,
+)
+from healthcare.healthcare.doctype.observation.observation import set_observation_status
+from healthcare.healthcare.doctype.observation.test_observation import create_sales_invoice
+from healthcare.healthcare.doctype.observation_template.test_observation_template import (
+	create_observation_template,
+)
+from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
+	create_patient,
+)
+
 
 class TestDiagnosticReport(IntegrationTestCase):
-	pass
+	def test_observation_counters(self):
+		frappe.db.set_single_value("Healthcare Settings", "create_observation_on_si_submit", 1)
+		patient = create_patient()
+		obs_template = create_observation_template("Total Cholesterol")
+		sales_invoice = create_sales_invoice(patient, obs_template.name)
+		report = frappe.db.get_value(
+			"Diagnostic Report", {"ref_doctype": "Sales Invoice", "docname": sales_invoice.name}
+		)
+		self.assertEqual(get_counters(report), (1, 0))
+
+		observation = frappe.get_doc("Observation", {"sales_invoice": sales_invoice.name})
+		observation.result_data = "180"
+		observation.save()
+		self.assertEqual(
+			frappe.db.get_value("Diagnostic Report", report, "status"), "Partially Approved"
+		)
+
+		set_observation_status(observation.name, "Approved")
+		self.assertEqual(get_counters(report), (0, 1))
+
+		frappe.db.set_value(
+			"Diagnostic Report", report, {"pending_observations": 3, "approved_observations": 0}
+		)
+		self.assertTrue(reconcile_observation_counters())
+		self.assertEqual(get_counters(report), (0, 1))
+
+	def test_bulk_observation_status(self):
+		frappe.db.set_single_value("Healthcare Settings", "create_observation_on_si_submit", 1)
+		patient = create_patient()
+		obs_template = create_observation_template("Total Cholesterol")
+		sales_invoice = create_sales_invoice(patient, obs_template.name)
+		report = frappe.get_doc(
+			"Diagnostic Report", {"ref_doctype": "Sales Invoice", "docname": sales_invoice.name}
+		)
+		observation = frappe.get_doc("Observation", {"sales_invoice": sales_invoice.name})
+		self.assertFalse(validate_observations_has_result(report))
+
+		observation.result_data = "180"
+		observation.save()
+		self.assertTrue(validate_observations_has_result(report))
+
+		frappe.db.set_value("Diagnostic Report", report.name, "status", "Approved")
+		diagnostic_report.set_observation_status(report.name)
+		self.assertEqual(
+			frappe.db.get_value("Observation", observation.name, ["status", "docstatus"]),
+			("Approved", 1),
+		)
+
+		# large reports are queued
+		frappe.db.set_value("Diagnostic Report", report.name, "status", "Disapproved")
+		with patch.object(diagnostic_report, "BULK_STATUS_QUEUE_THRESHOLD", 0):
+			self.assertEqual(diagnostic_report.set_observation_status(report.name), {"queued": 1})
+		self.assertEqual(frappe.db.get_value("Observation", observation.name, "docstatus"), 2)
+		self.assertTrue(
+			frappe.db.exists(
+				"Observation",
+				{
+					"sales_invoice": sales_invoice.name,
+					"docstatus": 0,
+					"name": ["!=", observation.name],
+				},
+			)
+		)
+
+
+def get_counters(report):
+	return frappe.db.get_value(
+		"Diagnostic Report", report, ["pending_observations", "approved_observations"]
+	)
@@ -4,10 +4,16 @@
 
 import datetime
 import json
+import time
 
 import frappe
 from frappe.model.document import Document
-from frappe.utils import getdate
+from frappe.query_builder.functions import Count
+from frappe.utils import getdate, now
+
+from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import (
+	get_healthcare_settings,
+)
 
 
 class FeeValidity(Document):
@@ -35,8 +41,9 @@ def create_fee_validity(appointment):
 	fee_validity.sales_invoice_ref = frappe.db.get_value(
 		"Sales Invoice Item", {"reference_dn": appointment.name}, "parent"
 	)
-	fee_validity.max_visits = frappe.db.get_single_value("Healthcare Settings", "max_visits") or 1
-	valid_days = frappe.db.get_single_value("Healthcare Settings", "valid_days") or 1
+	settings = get_healthcare_settings()
+	fee_validity.max_visits = settings.max_visits or 1
+	valid_days = settings.valid_days or 1
 	fee_validity.visited = 0
 	fee_validity.start_date = getdate(appointment.appointment_date)
 	fee_validity.valid_till = getdate(appointment.appointment_date) + datetime.timedelta(
@@ -63,7 +70,7 @@ def patient_has_validity(appointment):
 
 @frappe.whitelist()
 def check_fee_validity(appointment, date=None, practitioner=None):
-	if not frappe.db.get_single_value("Healthcare Settings", "enable_free_follow_ups"):
+	if not get_healthcare_settings().enable_free_follow_ups:
 		return
 
 	if isinstance(appointment, str):
@@ -103,9 +110,9 @@ def check_fee_validity(appointment, date=None, practitioner=None):
 
 
 def manage_fee_validity(appointment):
-	free_follow_ups = frappe.db.get_single_value("Healthcare Settings", "enable_free_follow_ups")
+	settings = get_healthcare_settings()
 	# Update fee validity dates when rescheduling an invoiced appointment
-	if free_follow_ups:
+	if settings.enable_free_follow_ups:
 		invoiced_fee_validity = frappe.db.exists(
 			"Fee Validity", {"patient_appointment": appointment.name}
 		)
@@ -118,9 +125,7 @@ def manage_fee_validity(appointment):
 					{
 						"start_date": appointment.appointment_date,
 						"valid_till": getdate(appointment.appointment_date)
-						+ datetime.timedelta(
-							days=int(frappe.db.get_single_value("Healthcare Settings", "valid_days") or 1)
-						),
+						+ datetime.timedelta(days=int(settings.valid_days or 1)),
 					},
 				)
 
@@ -188,11 +193,73 @@ def get_fee_validity(appointment_name, date, ignore_status=False):
 	return query.run(as_dict=True)
 
 
-def update_validity_status():
-	# update the status of fee validity daily
-	validities = frappe.db.get_all("Fee Validity", {"status": ["not in", ["Expired", "Cancelled"]]})
+def update_validity_status(chunk_size=1000):
+	"""
+	Daily update of fee validity status, mirrors FeeValidity.update_status with one
+	UPDATE per chunk of validities whose status actually changes. Chunks are committed
+	as they go, so an interrupted run is resumed by running it again.
+
+	:return: dict of rows scanned, rows changed per target status and elapsed seconds
+	"""
+	started = time.monotonic()
+	fee_validity = frappe.qb.DocType("Fee Validity")
+	logger = frappe.logger("healthcare")
+
+	summary = {
+		"scanned": frappe.qb.from_(fee_validity)
+		.select(Count(fee_validity.name))
+		.where(fee_validity.status.notin(["Expired", "Cancelled"]))
+		.run()[0][0]
+	}
+
+	for status, condition in get_validity_status_conditions(fee_validity, getdate()).items():
+		summary[status] = 0
+		last_name = ""
+		while True:
+			validities = (
+				frappe.qb.from_(fee_validity)
+				.select(fee_validity.name)
+				.where(condition & (fee_validity.name > last_name))
+				.orderby(fee_validity.name)
+				.limit(chunk_size)
+				.run(pluck=True)
+			)
+			if not validities:
+				break
+
+			(
+				frappe.qb.update(fee_validity)
+				.set(fee_validity.status, status)
+				.set(fee_validity.modified, now())
+				.set(fee_validity.modified_by, frappe.session.user)
+				.where(fee_validity.name.isin(validities))
+			).run()
+
+			if not frappe.flags.in_test:
+				frappe.db.commit()
+
+			summary[status] += len(validities)
+			last_name = validities[-1]
+			logger.info(f"Fee Validity status update: {summary[status]} set to {status} so far")
 
-	for fee_validity in validities:
-		fee_validity_doc = frappe.get_doc("Fee Validity", fee_validity.name)
-		fee_validity_doc.update_status()
-		fee_validity_doc.save()
+	summary["changed"] = sum(summary[status] for status in ["Expired", "Completed", "Active"])
+	summary["elapsed"] = round(time.monotonic() - started, 3)
+	logger.info(f"Fee Validity status update finished: {summary}")
+	return summary
+
+
+def get_validity_status_conditions(fee_validity, today):
+	# validities that are Expired or Cancelled are never picked up again
+	fixed = ["Expired", "Cancelled"]
+	# getdate(None) in update_status is today, so validities without valid_till never expire
+	not_expired = (fee_validity.valid_till >= today) | fee_validity.valid_till.isnull()
+
+	return {
+		"Expired": (fee_validity.valid_till < today) & fee_validity.status.notin(fixed),
+		"Completed": not_expired
+		& (fee_validity.visited == fee_validity.max_visits)
+		& fee_validity.status.notin(fixed + ["Completed"]),
+		"Active": not_expired
+		& (fee_validity.visited != fee_validity.max_visits)
+		& fee_validity.status.notin(fixed + ["Active"]),
+	}
@@ -9,6 +9,7 @@ from frappe.utils import add_days, nowdate
 
 from erpnext.accounts.doctype.pos_profile.test_pos_profile import make_pos_profile
 
+from healthcare.healthcare.doctype.fee_validity.fee_validity import update_validity_status
 from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
 	create_appointment,
 	create_healthcare_docs,
@@ -83,3 +84,65 @@ class TestFeeValidity(IntegrationTestCase):
 		# For first appointment cancel should cancel fee validity
 		update_status(appointment.name, "Cancelled")
 		self.assertEqual(frappe.db.get_value("Fee Validity", fee_validity, "status"), "Cancelled")
+
+	def test_update_validity_status(self):
+		timestamp = frappe.utils.now()
+		today = nowdate()
+		# (status, visited, max_visits, valid_till) -> expected status
+		cases = {
+			("Active", 0, 2, add_days(today, -1)): "Expired",
+			("Completed", 2, 2, add_days(today, -1)): "Expired",
+			("Active", 2, 2, today): "Completed",
+			("Completed", 1, 2, add_days(today, 1)): "Active",
+			("Active", 1, 2, today): "Active",
+			("Cancelled", 0, 2, add_days(today, -1)): "Cancelled",
+		}
+		rows = []
+		for i, (status, visited, max_visits, valid_till) in enumerate(cases):
+			for j in range(200):
+				rows.append(
+					(
+						f"_Test Fee Validity {i}-{j}",
+						timestamp,
+						timestamp,
+						"Administrator",
+						"Administrator",
+						status,
+						visited,
+						max_visits,
+						add_days(valid_till, -7),
+						valid_till,
+					)
+				)
+		frappe.db.bulk_insert(
+			"Fee Validity",
+			[
+				"name",
+				"creation",
+				"modified",
+				"owner",
+				"modified_by",
+				"status",
+				"visited",
+				"max_visits",
+				"start_date",
+				"valid_till",
+			],
+			rows,
+		)
+
+		with self.assertQueryCount(30):
+			summary = update_validity_status(chunk_size=500)
+
+		self.assertEqual(summary["scanned"], 1000)
+		self.assertEqual(summary["Expired"], 400)
+		self.assertEqual(summary["Completed"], 200)
+		self.assertEqual(summary["Active"], 200)
+		self.assertEqual(summary["changed"], 800)
+		for i, expected in enumerate(cases.values()):
+			self.assertEqual(
+				frappe.db.get_value("Fee Validity", f"_Test Fee Validity {i}-0", "status"), expected
+			)
+
+		# nothing left to change on a second run
+		self.assertEqual(update_validity_status()["changed"], 0)
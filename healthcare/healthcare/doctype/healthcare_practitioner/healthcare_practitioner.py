@@ -15,6 +15,10 @@ from frappe.utils import get_link_to_form
 
 from erpnext.accounts.party import validate_party_accounts
 
+from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import (
+	get_healthcare_settings,
+)
+
 
 class HealthcarePractitioner(Document):
 	def onload(self):
@@ -83,8 +87,9 @@ class HealthcarePractitioner(Document):
 				"Practitioner Schedule", practitioner_schedule.schedule, "allow_video_conferencing"
 			):
 
-				if not self.google_calendar and not frappe.db.get_single_value(
-					"Healthcare Settings", "default_google_calendar"
+				if (
+					not self.google_calendar
+					and not get_healthcare_settings().default_google_calendar
 				):
 					frappe.throw(
 						_(
@@ -8,9 +8,13 @@ import json
 import frappe
 from frappe import _
 from frappe.contacts.address_and_contact import load_address_and_contact
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Count, Sum
 from frappe.utils import cint, cstr
 from frappe.utils.nestedset import NestedSet
 
+OCCUPANCY_CACHE_KEY = "healthcare_service_unit_occupancy"
+
 
 class HealthcareServiceUnit(NestedSet):
 	nsm_parent_field = "parent_healthcare_service_unit"
@@ -33,12 +37,17 @@ class HealthcareServiceUnit(NestedSet):
 	def on_update(self):
 		super(HealthcareServiceUnit, self).on_update()
 		self.validate_one_root()
+		clear_occupancy_cache()
 
 	def on_trash(self):
 		if self.flags.on_trash_company:
 			NestedSet.on_trash(self, allow_root_deletion=True)
 		else:
 			NestedSet.on_trash(self)
+		clear_occupancy_cache()
+
+	def after_rename(self, old, new, merge=False):
+		clear_occupancy_cache()
 
 	def set_service_unit_properties(self):
 		if cint(self.is_group):
@@ -141,6 +150,90 @@ def add_multiple_service_units(parent, data):
 	return failed_list
 
 
+def get_occupancy(subtree=False):
+	"""
+	Returns a dict like { group service unit: { occupied, total, parent, company } } counting
+	the Inpatient Occupancy service units directly below each group, or anywhere in its
+	subtree if `subtree` is set. Cached until occupancy or the tree changes.
+	"""
+	cache_key = f"{OCCUPANCY_CACHE_KEY}::{'subtree' if subtree else 'children'}"
+	occupancy = frappe.cache().get_value(cache_key)
+	if occupancy is None:
+		occupancy = build_occupancy(subtree)
+		frappe.cache().set_value(cache_key, occupancy)
+
+	return occupancy
+
+
+def build_occupancy(subtree=False):
+	group = frappe.qb.DocType("Healthcare Service Unit").as_("group_unit")
+	unit = frappe.qb.DocType("Healthcare Service Unit")
+
+	if subtree:
+		condition = (unit.lft > group.lft) & (unit.rgt < group.rgt)
+	else:
+		condition = unit.parent_healthcare_service_unit == group.name
+
+	rows = (
+		frappe.qb.from_(group)
+		.join(unit)
+		.on(condition & (unit.inpatient_occupancy == 1))
+		.select(
+			group.name,
+			group.parent_healthcare_service_unit.as_("parent"),
+			group.company,
+			Sum(Case().when(unit.occupancy_status == "Occupied", 1).else_(0)).as_("occupied"),
+			Count(unit.name).as_("total"),
+		)
+		.where(group.is_group == 1)
+		.groupby(group.name, group.parent_healthcare_service_unit, group.company)
+		.run(as_dict=True)
+	)
+
+	return {row.pop("name"): row for row in rows}
+
+
+def clear_occupancy_cache():
+	cache_keys = [f"{OCCUPANCY_CACHE_KEY}::children", f"{OCCUPANCY_CACHE_KEY}::subtree"]
+	frappe.cache().delete_value(cache_keys)
+	# readers may cache the committed state again before this transaction commits
+	frappe.db.after_commit.add(lambda: frappe.cache().delete_value(cache_keys))
+
+
+@frappe.whitelist()
+def get_bed_census(company=None):
+	"""
+	Occupied and vacant Inpatient Occupancy service units of every group service unit
+	(whole subtree) and of the hospital as a whole
+	"""
+	frappe.has_permission("Healthcare Service Unit", throw=True)
+
+	service_units = []
+	totals = frappe._dict(occupied=0, vacant=0, total=0)
+	for service_unit, row in get_occupancy(subtree=True).items():
+		if company and row.company != company:
+			continue
+
+		occupied, total = cint(row.occupied), cint(row.total)
+		service_units.append(
+			frappe._dict(
+				service_unit=service_unit,
+				parent=row.parent,
+				company=row.company,
+				occupied=occupied,
+				vacant=total - occupied,
+				total=total,
+			)
+		)
+		# roots span all units of their company
+		if not row.parent:
+			totals.occupied += occupied
+			totals.vacant += total - occupied
+			totals.total += total
+
+	return {"service_units": service_units, "totals": totals}
+
+
 def on_doctype_update():
 	frappe.db.add_unique(
 		"Healthcare Service Unit",
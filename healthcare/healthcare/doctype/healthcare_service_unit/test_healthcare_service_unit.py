@@ -4,6 +4,16 @@
 import frappe
 from frappe.tests import IntegrationTestCase
 
+from healthcare.healthcare.doctype.healthcare_service_unit.healthcare_service_unit import (
+	clear_occupancy_cache,
+	get_bed_census,
+	get_occupancy,
+)
+from healthcare.healthcare.doctype.inpatient_record.test_inpatient_record import (
+	get_service_unit_type,
+)
+from healthcare.healthcare.utils import get_children
+
 
 class TestHealthcareServiceUnit(IntegrationTestCase):
 	def test_create_company_should_create_root_service_unit(self):
@@ -22,3 +32,46 @@ class TestHealthcareServiceUnit(IntegrationTestCase):
 		filters = {"company": company.name, "parent_healthcare_service_unit": None}
 		root_service_unit = frappe.db.exists("Healthcare Service Unit", filters)
 		self.assertTrue(root_service_unit)
+
+	def test_occupancy_rollup(self):
+		root = frappe.db.get_value(
+			"Healthcare Service Unit",
+			{"company": "_Test Company", "parent_healthcare_service_unit": ("is", "not set")},
+		)
+		ward = create_service_unit("_Test Ward", root, is_group=1)
+		room = create_service_unit("_Test Ward Room", ward, is_group=1)
+		beds = [
+			create_service_unit(f"_Test Ward Bed {i}", ward if i < 2 else room) for i in range(4)
+		]
+		frappe.db.set_value("Healthcare Service Unit", beds[0], "occupancy_status", "Occupied")
+		frappe.db.set_value("Healthcare Service Unit", beds[3], "occupancy_status", "Occupied")
+		clear_occupancy_cache()
+
+		self.assertEqual((get_occupancy()[ward].occupied, get_occupancy()[ward].total), (1, 2))
+		subtree = get_occupancy(subtree=True)[ward]
+		self.assertEqual((subtree.occupied, subtree.total), (2, 4))
+
+		# tree is built from the cached rollup
+		with self.assertQueryCount(1):
+			children = get_children("Healthcare Service Unit", ward)
+		room_node = next(child for child in children if child["value"] == room)
+		self.assertEqual(room_node["occupied_of_available"], "1 Occupied of 2")
+
+		census = get_bed_census("_Test Company")
+		ward_census = next(row for row in census["service_units"] if row.service_unit == ward)
+		self.assertEqual((ward_census.occupied, ward_census.vacant), (2, 2))
+		self.assertGreaterEqual(census["totals"].occupied, 2)
+
+
+def create_service_unit(name, parent, is_group=0):
+	service_unit = frappe.get_doc(
+		{
+			"doctype": "Healthcare Service Unit",
+			"healthcare_service_unit_name": name,
+			"company": "_Test Company",
+			"parent_healthcare_service_unit": parent,
+			"is_group": is_group,
+			"service_unit_type": None if is_group else get_service_unit_type(),
+		}
+	).insert(ignore_permissions=True)
+	return service_unit.name
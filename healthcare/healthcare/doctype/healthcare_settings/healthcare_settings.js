@@ -30,6 +30,14 @@ frappe.ui.form.on('Healthcare Settings', {
 				}
 			};
 		});
+		frm.set_query('default_price_list', function(doc) {
+			return {
+				filters: {
+					'selling': 1,
+					'enabled': 1
+				}
+			};
+		});
 		frm.set_query('default_code_system', function(doc) {
 			return {
 				filters: {
@@ -8,7 +8,17 @@ import json
 import frappe
 from frappe import _
 from frappe.core.doctype.sms_settings.sms_settings import send_sms
+from frappe.model import no_value_fields, table_fields
 from frappe.model.document import Document
+from frappe.utils import cint, flt
+
+SETTINGS_FIELD_TYPES = {
+	"Check": lambda value: bool(cint(value)),
+	"Int": cint,
+	"Currency": flt,
+	"Float": flt,
+	"Percent": flt,
+}
 
 
 class HealthcareSettings(Document):
@@ -33,6 +43,46 @@ class HealthcareSettings(Document):
 			validate_service_item(self.op_consulting_charge_item)
 		if self.clinical_procedure_consumable_item:
 			validate_service_item(self.clinical_procedure_consumable_item)
+		if self.default_price_list and not frappe.db.get_value(
+			"Price List", self.default_price_list, "selling"
+		):
+			frappe.throw(
+				_("Price List {0} is not a selling Price List").format(self.default_price_list)
+			)
+
+	def on_update(self):
+		clear_healthcare_settings()
+
+
+def get_healthcare_settings():
+	"""
+	Returns a typed snapshot of Healthcare Settings, to be read instead of
+	`frappe.db.get_single_value("Healthcare Settings", ...)`
+
+	The snapshot is built once per request from the cached document, which Frappe keeps in
+	Redis for every process and invalidates whenever the settings are saved or set.
+	Checks are bools, Int and Currency fields are numbers and table fields are left out.
+	"""
+	settings = frappe.get_cached_doc("Healthcare Settings")
+	cached = getattr(frappe.local, "healthcare_settings", None)
+	if cached and cached[0] is settings:
+		return cached[1]
+
+	snapshot = frappe._dict()
+	for df in settings.meta.get("fields"):
+		if df.fieldtype in table_fields or df.fieldtype in no_value_fields:
+			continue
+		value = settings.get(df.fieldname)
+		if df.fieldtype in SETTINGS_FIELD_TYPES:
+			value = SETTINGS_FIELD_TYPES[df.fieldtype](value)
+		snapshot[df.fieldname] = value
+
+	frappe.local.healthcare_settings = (settings, snapshot)
+	return snapshot
+
+
+def clear_healthcare_settings():
+	frappe.local.healthcare_settings = None
 
 
 def validate_service_item(item):
@@ -46,23 +96,21 @@ def get_sms_text(doc):
 	doc = frappe.get_doc("Lab Test", doc)
 	context = {"doc": doc, "alert": doc, "comments": None}
 
-	emailed = frappe.db.get_single_value("Healthcare Settings", "sms_emailed")
-	sms_text["emailed"] = frappe.render_template(emailed, context)
-
-	printed = frappe.db.get_single_value("Healthcare Settings", "sms_printed")
-	sms_text["printed"] = frappe.render_template(printed, context)
+	settings = get_healthcare_settings()
+	sms_text["emailed"] = frappe.render_template(settings.sms_emailed, context)
+	sms_text["printed"] = frappe.render_template(settings.sms_printed, context)
 
 	return sms_text
 
 
 def send_registration_sms(doc):
-	if frappe.db.get_single_value("Healthcare Settings", "send_registration_msg"):
+	settings = get_healthcare_settings()
+	if settings.send_registration_msg:
 		if doc.mobile:
 			context = {"doc": doc, "alert": doc, "comments": None}
 			if doc.get("_comments"):
 				context["comments"] = json.loads(doc.get("_comments"))
-			messages = frappe.db.get_single_value("Healthcare Settings", "registration_msg")
-			messages = frappe.render_template(messages, context)
+			messages = frappe.render_template(settings.registration_msg, context)
 			number = [doc.mobile]
 			send_sms(number, messages)
 		else:
@@ -93,6 +141,35 @@ def get_income_account(practitioner, company):
 	return frappe.get_cached_value("Company", company, "default_income_account")
 
 
+def get_income_accounts(practitioners, company):
+	"""Batched get_income_account, returns {practitioner: income_account}"""
+	practitioners = {practitioner for practitioner in practitioners if practitioner}
+	if not practitioners:
+		return {}
+
+	income_accounts = {}
+	for row in frappe.get_all(
+		"Party Account",
+		filters={
+			"parenttype": "Healthcare Practitioner",
+			"parent": ("in", list(practitioners)),
+			"company": company,
+		},
+		fields=["parent", "account"],
+	):
+		if row.account:
+			income_accounts.setdefault(row.parent, row.account)
+
+	if len(income_accounts) < len(practitioners):
+		default_income_account = get_account(
+			None, "income_account", "Healthcare Settings", company
+		) or frappe.get_cached_value("Company", company, "default_income_account")
+		for practitioner in practitioners:
+			income_accounts.setdefault(practitioner, default_income_account)
+
+	return income_accounts
+
+
 def get_account(parent_type, parent_field, parent, company):
 	if parent_type:
 		return frappe.db.get_value(
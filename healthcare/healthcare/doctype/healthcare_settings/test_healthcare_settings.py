@@ -2,9 +2,89 @@
 # Copyright (c) 2017, Frappe Technologies Pvt. Ltd. and Contributors
 # See license.txt
 
+import ast
+import os
 
+import frappe
 from frappe.tests import IntegrationTestCase
 
+from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import (
+	get_healthcare_settings,
+)
+
+LOOP_NODES = (
+	ast.For,
+	ast.AsyncFor,
+	ast.While,
+	ast.ListComp,
+	ast.SetComp,
+	ast.DictComp,
+	ast.GeneratorExp,
+)
+SETTINGS_READERS = ("get_single_value", "get_cached_value", "get_cached_doc", "get_single")
+
 
 class TestHealthcareSettings(IntegrationTestCase):
-	pass
+	def test_settings_snapshot(self):
+		frappe.db.set_single_value("Healthcare Settings", "max_visits", 3)
+		frappe.db.set_single_value("Healthcare Settings", "enable_free_follow_ups", 1)
+
+		settings = get_healthcare_settings()
+		self.assertEqual(settings.max_visits, 3)
+		self.assertIs(settings.enable_free_follow_ups, True)
+		self.assertNotIn("income_account", settings)
+		with self.assertQueryCount(0):
+			for i in range(10):
+				self.assertIs(get_healthcare_settings(), settings)
+
+		# invalidated when the settings are set or saved
+		frappe.db.set_single_value("Healthcare Settings", "enable_free_follow_ups", 0)
+		self.assertIs(get_healthcare_settings().enable_free_follow_ups, False)
+
+		doc = frappe.get_doc("Healthcare Settings")
+		doc.max_visits = 5
+		doc.save()
+		self.assertEqual(get_healthcare_settings().max_visits, 5)
+
+	def test_no_settings_reads_in_loops(self):
+		"""Loops should read `get_healthcare_settings()` or a settings variable set outside them"""
+		root = frappe.get_app_path("healthcare")
+		offenders = []
+		for path, dirs, files in os.walk(root):
+			for filename in files:
+				if not filename.endswith(".py"):
+					continue
+				filepath = os.path.join(path, filename)
+				with open(filepath) as f:
+					tree = ast.parse(f.read(), filename=filepath)
+				offenders += [
+					f"{os.path.relpath(filepath, root)}:{lineno}"
+					for lineno in get_settings_reads_in_loops(tree)
+				]
+
+		self.assertFalse(offenders, "Healthcare Settings read from the database inside a loop")
+
+
+def get_settings_reads_in_loops(tree):
+	"""Returns the line numbers of Healthcare Settings database reads nested in loops"""
+	lines = []
+
+	def visit(node, in_loop):
+		if in_loop and is_settings_read(node):
+			lines.append(node.lineno)
+		for child in ast.iter_child_nodes(node):
+			visit(child, in_loop or isinstance(node, LOOP_NODES))
+
+	visit(tree, False)
+	return lines
+
+
+def is_settings_read(node):
+	return (
+		isinstance(node, ast.Call)
+		and isinstance(node.func, ast.Attribute)
+		and node.func.attr in SETTINGS_READERS
+		and bool(node.args)
+		and isinstance(node.args[0], ast.Constant)
+		and node.args[0].value == "Healthcare Settings"
+	)
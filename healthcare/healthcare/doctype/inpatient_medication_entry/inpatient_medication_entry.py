@@ -12,6 +12,9 @@ from frappe.utils import flt, get_link_to_form, get_time, getdate
 from erpnext.stock.utils import get_latest_stock_qty
 
 from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import get_account
+from healthcare.healthcare.doctype.inpatient_record.inpatient_record import (
+	get_current_service_units,
+)
 
 
 class InpatientMedicationEntry(Document):
@@ -240,10 +243,9 @@ def get_pending_medication_orders(entry):
 		as_dict=1,
 	)
 
+	service_units = get_current_service_units([doc.inpatient_record for doc in data])
 	for doc in data:
-		inpatient_record = doc.inpatient_record
-		if inpatient_record:
-			doc["service_unit"] = get_current_healthcare_service_unit(inpatient_record)
+		doc["service_unit"] = service_units.get(doc.inpatient_record)
 
 		if entry.service_unit and doc.service_unit != entry.service_unit:
 			to_remove.append(doc)
@@ -293,10 +295,7 @@ def get_filters(entry):
 
 
 def get_current_healthcare_service_unit(inpatient_record):
-	ip_record = frappe.get_doc("Inpatient Record", inpatient_record)
-	if ip_record.status in ["Admitted", "Discharge Scheduled"] and ip_record.inpatient_occupancies:
-		return ip_record.inpatient_occupancies[-1].service_unit
-	return
+	return get_current_service_units([inpatient_record]).get(inpatient_record)
 
 
 def get_drug_shortage_map(medication_orders, warehouse):
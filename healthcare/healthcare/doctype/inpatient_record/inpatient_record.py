@@ -10,7 +10,10 @@ from frappe import _
 from frappe.desk.reportview import get_match_cond
 from frappe.model.document import Document
 from frappe.model.mapper import get_mapped_doc
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Sum
 from frappe.utils import (
+	flt,
 	get_datetime,
 	get_link_to_form,
 	getdate,
@@ -20,9 +23,17 @@ from frappe.utils import (
 	today,
 )
 
-from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import get_account
+from healthcare.healthcare.doctype.healthcare_service_unit.healthcare_service_unit import (
+	clear_occupancy_cache,
+)
+from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import (
+	get_account,
+	get_healthcare_settings,
+)
 from healthcare.healthcare.doctype.nursing_task.nursing_task import NursingTask
-from healthcare.healthcare.utils import validate_nursing_tasks
+from healthcare.healthcare.utils import HealthcarePriceResolver, validate_nursing_tasks
+
+OCCUPANCY_BILLING_BATCH_SIZE = 100
 
 
 class InpatientRecord(Document):
@@ -73,6 +84,7 @@ class InpatientRecord(Document):
 
 		set_item_rate(self)
 		set_total(self)
+		self.set_current_service_unit()
 
 	def validate_dates(self):
 		if (getdate(self.expected_discharge) < getdate(self.scheduled_date)) or (
@@ -90,6 +102,11 @@ class InpatientRecord(Document):
 					_("Row #{0}: Check Out datetime cannot be less than Check In datetime").format(entry.idx)
 				)
 
+	def set_current_service_unit(self):
+		self.current_service_unit = None
+		if self.status in ["Admitted", "Discharge Scheduled"] and self.inpatient_occupancies:
+			self.current_service_unit = self.inpatient_occupancies[-1].service_unit
+
 	def validate_already_scheduled_or_admitted(self):
 		query = """
 			select name, status
@@ -126,100 +143,8 @@ class InpatientRecord(Document):
 	@frappe.whitelist()
 	def add_service_unit_rent_to_billable_items(self):
 		try:
-			io = frappe.qb.DocType("Inpatient Occupancy")
-			su = frappe.qb.DocType("Healthcare Service Unit")
-			sut = frappe.qb.DocType("Healthcare Service Unit Type")
-
-			query = (
-				frappe.qb.from_(io)
-				.left_join(su)
-				.on(io.service_unit == su.name)
-				.left_join(sut)
-				.on(su.service_unit_type == sut.name)
-				.select(
-					io.check_in,
-					io.check_out,
-					io.left,
-					io.parent,
-					io.name,
-					sut.item,
-					sut.uom,
-					sut.rate,
-					sut.no_of_hours,
-					sut.minimum_billable_qty,
-				)
-				.where(io.parent == self.name)
-			)
-
-			inpatient_details = query.run(as_dict=True)
-			item_hours = {}
-
-			# Calculate total hours for each item
-			for record in inpatient_details:
-				check_in = get_datetime(record["check_in"])
-				check_out = get_datetime(record["check_out"]) if record["check_out"] else get_datetime()
-
-				hours_diff = time_diff_in_hours(check_out, check_in)
-				item = record.get("item")
-
-				if item not in item_hours:
-					record["total_hours"] = 0
-					item_hours[item] = record
-
-				item_hours[item]["total_hours"] += hours_diff
-
-			ip_records = list(item_hours.values())
-
-			for inpatient in ip_records:
-				item_name, stock_uom = frappe.db.get_value(
-					"Item", inpatient.get("item"), ["item_name", "stock_uom"]
-				)
-				item_row = frappe.db.get_value(
-					"Inpatient Record Item",
-					{"item_code": inpatient.get("item"), "parent": self.name},
-					["name", "quantity", "invoiced"],
-					order_by="idx DESC",
-					as_dict=True,
-				)
-
-				minimum_billable_qty = inpatient.get("minimum_billable_qty")
-				quantity = max(inpatient.get("total_hours", 0.5), minimum_billable_qty or 0.5)
-
-				# Add or update item row based on existing data
-				if not item_row:
-					# Add new item row if none exists
-					se_child = self.append("items")
-					se_child.item_code = inpatient.get("item")
-					se_child.item_name = item_name
-					se_child.stock_uom = stock_uom
-					se_child.uom = inpatient.get("uom")
-					se_child.quantity = quantity
-					se_child.rate = inpatient.rate / inpatient.get("no_of_hours")
-				else:
-					if item_row.get("invoiced"):
-						# Add new row if invoiced and additional quantity exists
-						if item_row.get("quantity") and quantity and quantity > item_row.get("quantity"):
-							se_child = self.append("items")
-							se_child.item_code = inpatient.get("item")
-							se_child.item_name = item_name
-							se_child.stock_uom = stock_uom
-							se_child.uom = inpatient.get("uom")
-							se_child.quantity = quantity - item_row.get("quantity")
-							se_child.rate = inpatient.rate / inpatient.get("no_of_hours")
-					else:
-						# Update existing non-invoiced item row
-						if quantity != item_row.get("quantity"):
-							for item in self.items:
-								if item.name == item_row.get("name"):
-									item.quantity = quantity
-
-			# Update inpatient occupancy billing time
-			for test in self.inpatient_occupancies:
-				if test.name == inpatient.get("name"):
-					test.scheduled_billing_time = now()
-
-			self.save()
-
+			bill_service_unit_occupancy([self.name])
+			self.reload()
 		except Exception as e:
 			frappe.log_error(message=e, title="Can't bill Service Unit occupancy")
 
@@ -350,6 +275,7 @@ def check_out_inpatient(inpatient_record):
 				frappe.db.set_value(
 					"Healthcare Service Unit", inpatient_occupancy.service_unit, "occupancy_status", "Vacant"
 				)
+		clear_occupancy_cache()
 
 
 def discharge_patient(inpatient_record):
@@ -366,7 +292,7 @@ def discharge_patient(inpatient_record):
 
 
 def validate_inpatient_invoicing(inpatient_record):
-	if frappe.db.get_single_value("Healthcare Settings", "allow_discharge_despite_unbilled_services"):
+	if get_healthcare_settings().allow_discharge_despite_unbilled_services:
 		return
 
 	pending_invoices = get_pending_invoices(inpatient_record)
@@ -401,7 +327,7 @@ def validate_inpatient_invoicing(inpatient_record):
 
 def get_pending_invoices(inpatient_record):
 	pending_invoices = {}
-	if not frappe.db.get_single_value("Healthcare Settings", "automatically_generate_billable"):
+	if not get_healthcare_settings().automatically_generate_billable:
 		if inpatient_record.inpatient_occupancies:
 			service_unit_names = False
 			for inpatient_occupancy in inpatient_record.inpatient_occupancies:
@@ -527,6 +453,7 @@ def transfer_patient(inpatient_record, service_unit, check_in, txred=0):
 	inpatient_record.save(ignore_permissions=True)
 
 	frappe.db.set_value("Healthcare Service Unit", service_unit, "occupancy_status", "Occupied")
+	clear_occupancy_cache()
 
 
 def patient_leave_service_unit(inpatient_record, check_out, leave_from):
@@ -539,6 +466,7 @@ def patient_leave_service_unit(inpatient_record, check_out, leave_from):
 					"Healthcare Service Unit", inpatient_occupancy.service_unit, "occupancy_status", "Vacant"
 				)
 	inpatient_record.save(ignore_permissions=True)
+	clear_occupancy_cache()
 
 
 @frappe.whitelist()
@@ -559,6 +487,25 @@ def get_leave_from(doctype, txt, searchfield, start, page_len, filters):
 	)
 
 
+def get_current_service_units(inpatient_records):
+	"""Returns a dict like { inpatient_record: service_unit } for records currently admitted"""
+	inpatient_records = list({name for name in inpatient_records if name})
+	if not inpatient_records:
+		return {}
+
+	return dict(
+		frappe.get_all(
+			"Inpatient Record",
+			filters={
+				"name": ("in", inpatient_records),
+				"status": ("in", ["Admitted", "Discharge Scheduled"]),
+			},
+			fields=["name", "current_service_unit"],
+			as_list=True,
+		)
+	)
+
+
 def is_service_unit_billable(service_unit):
 	service_unit_doc = frappe.qb.DocType("Healthcare Service Unit")
 	service_unit_type = frappe.qb.DocType("Healthcare Service Unit Type")
@@ -655,45 +602,320 @@ def create_stock_entry(items, inpatient_record):
 
 
 def set_item_rate(doc):
-	from erpnext.stock.get_item_details import get_item_details
+	unpriced = [item for item in doc.items if not item.rate]
+	if unpriced:
+		details = get_price_resolver(doc).get_item_details([item.item_code for item in unpriced])
+		for item in unpriced:
+			item.rate = details[item.item_code].price_list_rate
 
-	price_list, price_list_currency = frappe.db.get_values(
-		"Price List", {"selling": 1}, ["name", "currency"]
-	)[0]
-	total_amount = 0
 	for item in doc.items:
-		if not item.rate:
-			args = {
-				"doctype": "Sales Invoice",
-				"item_code": item.get("item_code"),
-				"company": doc.company,
-				"customer": frappe.db.get_value("Patient", doc.patient, "customer"),
-				"selling_price_list": doc.price_list or price_list,
-				"price_list_currency": doc.currency or price_list_currency,
-				"plc_conversion_rate": 1.0,
-				"conversion_rate": 1.0,
-			}
-			item_details = get_item_details(args)
-			item.rate = item_details.get("price_list_rate")
-			item.amount = item.rate * item.quantity
-
 		item.amount = item.rate * item.quantity
-		# if item.amount:
-		# 	total_amount += item.amount
+
+
+def get_price_resolver(doc):
+	"""Returns a HealthcarePriceResolver for the Inpatient Record's patient and price list"""
+	return HealthcarePriceResolver.for_patient(
+		doc.patient, doc.company, price_list=doc.price_list, currency=doc.currency
+	)
 
 
 def add_occupied_service_unit_in_ip_to_billables():
-	if not frappe.db.get_single_value("Healthcare Settings", "automatically_generate_billable"):
+	if not get_healthcare_settings().automatically_generate_billable:
 		return
 
 	inpatient_records = frappe.get_all(
-		"Inpatient Record", {"status": ("in", ["Admitted", "Discharge Scheduled"])}
+		"Inpatient Record",
+		{"status": ("in", ["Admitted", "Discharge Scheduled"])},
+		pluck="name",
+		order_by="name",
+	)
+	billing_time = now()
+
+	for i in range(0, len(inpatient_records), OCCUPANCY_BILLING_BATCH_SIZE):
+		frappe.enqueue(
+			"healthcare.healthcare.doctype.inpatient_record.inpatient_record.bill_service_unit_occupancy",
+			queue="long",
+			inpatient_records=inpatient_records[i : i + OCCUPANCY_BILLING_BATCH_SIZE],
+			billing_time=billing_time,
+		)
+
+	frappe.logger("healthcare").info(
+		f"Service Unit occupancy billing till {billing_time}: "
+		f"{len(inpatient_records)} Inpatient Records queued"
 	)
 
+
+def bill_service_unit_occupancy(inpatient_records, billing_time=None):
+	"""
+	Accrues service unit rent of `inpatient_records` up to `billing_time`, billing only
+	the hours since each occupancy's `scheduled_billing_time`. The billable quantity of the
+	rent item is the total accrued hours, but not less than its minimum billable quantity,
+	and is set on the last uninvoiced Inpatient Record Item or billed in a new row once it
+	is invoiced.
+
+	:return: summary of the run
+	"""
+	billing_time = get_datetime(billing_time or now())
+	summary = frappe._dict(
+		inpatient_records=len(inpatient_records),
+		occupancies=0,
+		hours=0,
+		items_added=0,
+		items_updated=0,
+	)
+
+	occupancies = get_occupancies_to_bill(inpatient_records, billing_time)
+	if occupancies:
+		accrued = {}
+		for occupancy in occupancies:
+			billed_till = get_datetime(occupancy.scheduled_billing_time or occupancy.check_in)
+			check_out = billing_time
+			if occupancy.check_out:
+				check_out = min(get_datetime(occupancy.check_out), billing_time)
+
+			key = (occupancy.parent, occupancy.item)
+			if key not in accrued:
+				accrued[key] = occupancy
+				occupancy.hours = 0
+			accrued[key].hours += max(time_diff_in_hours(check_out, billed_till), 0)
+
+		summary.occupancies = len(occupancies)
+		summary.hours = flt(sum(row.hours for row in accrued.values()), 2)
+		previously_accrued = get_previously_accrued_hours(list(inpatient_records))
+		for key, occupancy in accrued.items():
+			occupancy.previous_hours = previously_accrued.get(key, 0)
+
+		summary.items_added, summary.items_updated = update_occupancy_billable_items(
+			accrued, billing_time
+		)
+
+		frappe.db.set_value(
+			"Inpatient Occupancy",
+			{"name": ("in", [occupancy.name for occupancy in occupancies])},
+			"scheduled_billing_time",
+			billing_time,
+			update_modified=False,
+		)
+		update_inpatient_record_totals(list({occupancy.parent for occupancy in occupancies}))
+
+	frappe.logger("healthcare").info(
+		f"Service Unit occupancy billed till {billing_time}: {frappe.as_json(summary, indent=None)}"
+	)
+	return summary
+
+
+def get_occupancies_to_bill(inpatient_records, billing_time):
+	io = frappe.qb.DocType("Inpatient Occupancy")
+	su = frappe.qb.DocType("Healthcare Service Unit")
+	sut = frappe.qb.DocType("Healthcare Service Unit Type")
+	item = frappe.qb.DocType("Item")
+
+	return (
+		frappe.qb.from_(io)
+		.join(su)
+		.on(io.service_unit == su.name)
+		.join(sut)
+		.on(su.service_unit_type == sut.name)
+		.join(item)
+		.on(sut.item == item.name)
+		.select(
+			io.name,
+			io.parent,
+			io.check_in,
+			io.check_out,
+			io.scheduled_billing_time,
+			sut.item,
+			sut.uom,
+			sut.rate,
+			sut.no_of_hours,
+			sut.minimum_billable_qty,
+			item.item_name,
+			item.stock_uom,
+		)
+		.where(
+			(io.parenttype == "Inpatient Record")
+			& io.parent.isin(inpatient_records)
+			& io.check_in.isnotnull()
+			& (io.check_in < billing_time)
+			& (
+				io.scheduled_billing_time.isnull()
+				| io.check_out.isnull()
+				| (io.scheduled_billing_time < io.check_out)
+			)
+		)
+		.orderby(io.parent)
+		.orderby(io.idx)
+		.run(as_dict=True)
+	)
+
+
+def get_previously_accrued_hours(inpatient_records):
+	"""Returns hours accrued till each occupancy's `scheduled_billing_time` by (parent, item)"""
+	io = frappe.qb.DocType("Inpatient Occupancy")
+	su = frappe.qb.DocType("Healthcare Service Unit")
+	sut = frappe.qb.DocType("Healthcare Service Unit Type")
+
+	accrued = {}
+	for occupancy in (
+		frappe.qb.from_(io)
+		.join(su)
+		.on(io.service_unit == su.name)
+		.join(sut)
+		.on(su.service_unit_type == sut.name)
+		.select(io.parent, io.check_in, io.check_out, io.scheduled_billing_time, sut.item)
+		.where(
+			(io.parenttype == "Inpatient Record")
+			& io.parent.isin(inpatient_records)
+			& io.check_in.isnotnull()
+			& io.scheduled_billing_time.isnotnull()
+		)
+		.run(as_dict=True)
+	):
+		billed_till = get_datetime(occupancy.scheduled_billing_time)
+		if occupancy.check_out:
+			billed_till = min(get_datetime(occupancy.check_out), billed_till)
+
+		key = (occupancy.parent, occupancy.item)
+		accrued[key] = accrued.get(key, 0) + max(
+			time_diff_in_hours(billed_till, get_datetime(occupancy.check_in)), 0
+		)
+
+	return accrued
+
+
+def update_occupancy_billable_items(accrued, billing_time):
+	"""Bills the accrued hours in Inpatient Record Items, returns count of rows added and updated"""
+	iri = frappe.qb.DocType("Inpatient Record Item")
+	inpatient_records = list({parent for parent, item_code in accrued})
+
+	last_items, billed_qty, last_idx = {}, {}, {}
+	for row in (
+		frappe.qb.from_(iri)
+		.select(iri.name, iri.parent, iri.idx, iri.item_code, iri.quantity, iri.rate, iri.invoiced)
+		.where((iri.parenttype == "Inpatient Record") & iri.parent.isin(inpatient_records))
+		.orderby(iri.idx)
+		.run(as_dict=True)
+	):
+		key = (row.parent, row.item_code)
+		last_items[key] = row
+		billed_qty[key] = billed_qty.get(key, 0) + flt(row.quantity)
+		last_idx[row.parent] = row.idx
+
+	new_rows, updated, resolvers = [], {}, {}
+	for (parent, item_code), occupancy in accrued.items():
+		item_row = last_items.get((parent, item_code))
+		# the minimum billable quantity is a floor over all the hours accrued in the stay
+		billable_qty = max(
+			flt(occupancy.get("previous_hours")) + occupancy.hours,
+			occupancy.minimum_billable_qty or 0.5,
+		)
+		quantity = billable_qty - billed_qty.get((parent, item_code), 0)
+
+		if item_row and not item_row.invoiced:
+			quantity += flt(item_row.quantity)
+			if flt(quantity, 6) != flt(item_row.quantity, 6):
+				updated[item_row.name] = (quantity, flt(item_row.rate) * quantity)
+			continue
+
+		# bill only the excess over invoiced rows
+		if flt(quantity, 6) <= 0:
+			continue
+
+		rate = flt(occupancy.rate) / (occupancy.no_of_hours or 1)
+		if not rate:
+			if parent not in resolvers:
+				inpatient_record = frappe.db.get_value(
+					"Inpatient Record",
+					parent,
+					["company", "patient", "price_list", "currency"],
+					as_dict=True,
+				)
+				resolvers[parent] = get_price_resolver(inpatient_record)
+			rate = flt(resolvers[parent].get_rate(item_code))
+
+		last_idx[parent] = last_idx.get(parent, 0) + 1
+		new_rows.append(
+			(
+				frappe.generate_hash(length=10),
+				billing_time,
+				billing_time,
+				frappe.session.user,
+				frappe.session.user,
+				parent,
+				"Inpatient Record",
+				"items",
+				last_idx[parent],
+				item_code,
+				occupancy.item_name,
+				occupancy.stock_uom,
+				occupancy.uom,
+				quantity,
+				rate,
+				rate * quantity,
+			)
+		)
+
+	if new_rows:
+		frappe.db.bulk_insert(
+			"Inpatient Record Item",
+			[
+				"name",
+				"creation",
+				"modified",
+				"owner",
+				"modified_by",
+				"parent",
+				"parenttype",
+				"parentfield",
+				"idx",
+				"item_code",
+				"item_name",
+				"stock_uom",
+				"uom",
+				"quantity",
+				"rate",
+				"amount",
+			],
+			new_rows,
+		)
+
+	if updated:
+		quantity, amount = Case(), Case()
+		for name, (row_quantity, row_amount) in updated.items():
+			quantity = quantity.when(iri.name == name, row_quantity)
+			amount = amount.when(iri.name == name, row_amount)
+		(
+			frappe.qb.update(iri)
+			.set(iri.quantity, quantity)
+			.set(iri.amount, amount)
+			.set(iri.modified, billing_time)
+			.where(iri.name.isin(list(updated)))
+		).run()
+
+	return len(new_rows), len(updated)
+
+
+def update_inpatient_record_totals(inpatient_records):
+	iri = frappe.qb.DocType("Inpatient Record Item")
+	totals = dict(
+		frappe.qb.from_(iri)
+		.select(iri.parent, Sum(iri.amount))
+		.where((iri.parenttype == "Inpatient Record") & iri.parent.isin(inpatient_records))
+		.groupby(iri.parent)
+		.run()
+	)
+
+	ip = frappe.qb.DocType("Inpatient Record")
+	total = Case()
 	for inpatient_record in inpatient_records:
-		frappe.get_doc(
-			"Inpatient Record", inpatient_record.name
-		).add_service_unit_rent_to_billable_items()
+		total = total.when(ip.name == inpatient_record, flt(totals.get(inpatient_record)))
+	(
+		frappe.qb.update(ip)
+		.set(ip.total, total)
+		.set(ip.modified, now())
+		.set(ip.modified_by, frappe.session.user)
+		.where(ip.name.isin(inpatient_records))
+	).run()
 
 
 def set_total(self):
@@ -706,9 +928,7 @@ def set_total(self):
 
 
 def validate_incompleted_service_requests(inpatient_record):
-	if not frappe.db.get_single_value(
-		"Healthcare Settings", "allow_discharge_despite_pending_healthcare_services"
-	):
+	if not get_healthcare_settings().allow_discharge_despite_pending_healthcare_services:
 		return
 
 	filters = {
@@ -5,12 +5,17 @@
 
 import frappe
 from frappe.tests import IntegrationTestCase
-from frappe.utils import now_datetime, today
+from frappe.utils import add_to_date, flt, now_datetime, today
 from frappe.utils.make_random import get_random
 
+from healthcare.healthcare.doctype.healthcare_service_unit_type.test_healthcare_service_unit_type import (
+	get_unit_type,
+)
 from healthcare.healthcare.doctype.inpatient_record.inpatient_record import (
 	admit_patient,
+	bill_service_unit_occupancy,
 	discharge_patient,
+	get_current_service_units,
 	schedule_discharge,
 )
 from healthcare.healthcare.doctype.lab_test.test_lab_test import create_patient_encounter
@@ -35,6 +40,7 @@ class TestInpatientRecord(IntegrationTestCase):
 		self.assertEqual(
 			"Occupied", frappe.db.get_value("Healthcare Service Unit", service_unit, "occupancy_status")
 		)
+		self.assertEqual(get_current_service_units([ip_record.name]), {ip_record.name: service_unit})
 
 		# Discharge
 		schedule_discharge(frappe.as_json({"patient": patient}))
@@ -48,6 +54,7 @@ class TestInpatientRecord(IntegrationTestCase):
 		mark_invoiced_inpatient_occupancy(ip_record1)
 
 		discharge_patient(ip_record1)
+		self.assertFalse(get_current_service_units([ip_record.name]))
 
 		self.assertEqual(None, frappe.db.get_value("Patient", patient, "inpatient_record"))
 		self.assertEqual(None, frappe.db.get_value("Patient", patient, "inpatient_status"))
@@ -127,6 +134,90 @@ class TestInpatientRecord(IntegrationTestCase):
 		self.assertRaises(frappe.ValidationError, ip_record_new.save)
 		frappe.db.sql("""delete from `tabInpatient Record`""")
 
+	def test_incremental_service_unit_billing(self):
+		frappe.db.sql("""delete from `tabInpatient Record`""")
+		patient = create_patient()
+		ip_record = create_inpatient(patient)
+		ip_record.expected_length_of_stay = 0
+		ip_record.save(ignore_permissions=True)
+
+		unit_type = get_unit_type()
+		service_unit = get_healthcare_service_unit("_Test Billable Room")
+		frappe.db.set_value("Healthcare Service Unit", service_unit, "service_unit_type", unit_type.name)
+		check_in = add_to_date(now_datetime(), hours=-10)
+		admit_patient(ip_record, service_unit, check_in)
+
+		def get_items():
+			return frappe.get_all(
+				"Inpatient Record Item",
+				filters={"parent": ip_record.name},
+				fields=["name", "item_code", "quantity", "rate", "amount"],
+				order_by="idx",
+			)
+
+		summary = bill_service_unit_occupancy([ip_record.name], add_to_date(check_in, hours=10))
+		self.assertEqual(summary.items_added, 1)
+		items = get_items()
+		self.assertEqual(len(items), 1)
+		self.assertEqual(items[0].item_code, unit_type.item)
+		self.assertEqual(flt(items[0].quantity, 2), 10)
+		self.assertEqual(flt(items[0].amount), 40000)
+
+		# only the hours since the last run are added to the unbilled row
+		summary = bill_service_unit_occupancy([ip_record.name], add_to_date(check_in, hours=12))
+		self.assertEqual(summary.items_updated, 1)
+		items = get_items()
+		self.assertEqual(len(items), 1)
+		self.assertEqual(flt(items[0].quantity, 2), 12)
+		self.assertEqual(flt(frappe.db.get_value("Inpatient Record", ip_record.name, "total")), 48000)
+
+		# invoiced rows are left alone, new hours go to a new row
+		frappe.db.set_value("Inpatient Record Item", items[0].name, "invoiced", 1)
+		bill_service_unit_occupancy([ip_record.name], add_to_date(check_in, hours=15))
+		items = get_items()
+		self.assertEqual(len(items), 2)
+		self.assertEqual(flt(items[1].quantity, 2), 3)
+
+		frappe.db.sql("""delete from `tabInpatient Record`""")
+
+	def test_minimum_billable_service_unit_hours(self):
+		frappe.db.sql("""delete from `tabInpatient Record`""")
+		patient = create_patient()
+		ip_record = create_inpatient(patient)
+		ip_record.expected_length_of_stay = 0
+		ip_record.save(ignore_permissions=True)
+
+		unit_type = get_unit_type()
+		frappe.db.set_value("Healthcare Service Unit Type", unit_type.name, "minimum_billable_qty", 4)
+		service_unit = get_healthcare_service_unit("_Test Billable Room")
+		frappe.db.set_value("Healthcare Service Unit", service_unit, "service_unit_type", unit_type.name)
+		check_in = add_to_date(now_datetime(), hours=-10)
+		admit_patient(ip_record, service_unit, check_in)
+
+		def get_quantities(billed_hours):
+			bill_service_unit_occupancy([ip_record.name], add_to_date(check_in, hours=billed_hours))
+			return [
+				flt(quantity, 2)
+				for quantity in frappe.get_all(
+					"Inpatient Record Item",
+					filters={"parent": ip_record.name},
+					pluck="quantity",
+					order_by="idx",
+				)
+			]
+
+		# the minimum covers the first hours of the stay, it is not charged on top of them
+		self.assertEqual(get_quantities(1), [4])
+		self.assertEqual(get_quantities(3), [4])
+		self.assertEqual(get_quantities(6), [6])
+
+		# only the hours over the invoiced quantity are billed
+		frappe.db.set_value("Inpatient Record Item", {"parent": ip_record.name}, "invoiced", 1)
+		self.assertEqual(get_quantities(7), [6, 1])
+
+		frappe.db.set_value("Healthcare Service Unit Type", unit_type.name, "minimum_billable_qty", 0)
+		frappe.db.sql("""delete from `tabInpatient Record`""")
+
 
 def mark_invoiced_inpatient_occupancy(ip_record):
 	if ip_record.inpatient_occupancies:
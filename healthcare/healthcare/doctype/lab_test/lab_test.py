@@ -8,6 +8,9 @@ from frappe import _
 from frappe.model.document import Document
 from frappe.utils import get_link_to_form, getdate, now_datetime
 
+from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import (
+	get_healthcare_settings,
+)
 from healthcare.healthcare.doctype.nursing_task.nursing_task import NursingTask
 from healthcare.healthcare.doctype.service_request.service_request import (
 	update_service_request_status,
@@ -353,7 +356,7 @@ def create_sample_doc(template, patient, invoice, company=None):
 
 
 def create_sample_collection(lab_test, template, patient, invoice):
-	if frappe.get_cached_value("Healthcare Settings", None, "create_sample_collection_for_lab_test"):
+	if get_healthcare_settings().create_sample_collection_for_lab_test:
 		sample_collection = create_sample_doc(template, patient, invoice, lab_test.company)
 		if sample_collection:
 			lab_test.sample = sample_collection.name
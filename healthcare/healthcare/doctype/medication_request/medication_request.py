@@ -7,6 +7,9 @@ import frappe
 from frappe import _
 
 from healthcare.controllers.service_request_controller import ServiceRequestController
+from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import (
+	get_healthcare_settings,
+)
 
 
 class MedicationRequest(ServiceRequestController):
@@ -36,10 +39,10 @@ class MedicationRequest(ServiceRequestController):
 				self.staff_role = medication.staff_role
 
 		if not self.intent:
-			self.intent = frappe.db.get_single_value("Healthcare Settings", "default_intent")
+			self.intent = get_healthcare_settings().default_intent
 
 		if not self.priority:
-			self.priority = frappe.db.get_single_value("Healthcare Settings", "default_priority")
+			self.priority = get_healthcare_settings().default_priority
 
 	def calculate_total_dispensable_quantity(self):
 		if self.number_of_repeats_allowed:
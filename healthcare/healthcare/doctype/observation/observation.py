@@ -1,6 +1,7 @@
 # Copyright (c) 2023, healthcare and contributors
 # For license information, please see license.txt
 
+import bisect
 import json
 import re
 
@@ -8,12 +9,33 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 from frappe.model.workflow import get_workflow_name, get_workflow_state_field
-from frappe.utils import flt, get_link_to_form, getdate, now_datetime, nowdate
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Coalesce, Sum
+from frappe.utils import flt, get_link_to_form, getdate, now, now_datetime, nowdate
+from frappe.utils.caching import site_cache
 
 from erpnext.setup.doctype.terms_and_conditions.terms_and_conditions import (
 	get_terms_and_conditions,
 )
 
+OBSERVATION_DETAILS_CACHE_KEY = "healthcare:observation_details"
+OBSERVATION_DETAILS_CACHE_EXPIRY = 6 * 60 * 60
+REFERENCE_RANGE_CACHE_KEY = "healthcare:observation_reference_ranges"
+FORMULA_GRAPH_CACHE_KEY = "healthcare:observation_formula_graph"
+OBSERVATION_RESULT_FIELDS = [
+	"result_attach",
+	"result_boolean",
+	"result_data",
+	"result_text",
+	"result_float",
+	"result_select",
+]
+# TODO: handle fields defaulting to now
+# "result_datetime",
+# "result_time",
+# "result_period_from",
+# "result_period_to",
+
 
 class Observation(Document):
 	def validate(self):
@@ -24,6 +46,8 @@ class Observation(Document):
 		self.validate_input()
 
 	def on_update(self):
+		clear_observation_details_cache([self])
+		update_diagnostic_report_counters(self)
 		set_diagnostic_report_status(self)
 		if (
 			self.parent_observation
@@ -35,21 +59,33 @@ class Observation(Document):
 	def before_insert(self):
 		set_observation_idx(self)
 
+	def on_update_after_submit(self):
+		clear_observation_details_cache([self])
+
 	def on_submit(self):
+		# counters are updated by on_update, which also runs on submit
+		clear_observation_details_cache([self])
 		if self.service_request:
 			frappe.db.set_value(
 				"Service Request", self.service_request, "status", "completed-Request Status"
 			)
 
 	def on_cancel(self):
+		clear_observation_details_cache([self])
+		update_diagnostic_report_counters(self)
 		if self.service_request:
 			frappe.db.set_value("Service Request", self.service_request, "status", "active-Request Status")
 
+	def on_trash(self):
+		clear_observation_details_cache([self])
+		update_diagnostic_report_counters(self, trash=True)
+
 	def set_age(self):
-		patient_doc = frappe.get_doc("Patient", self.patient)
+		patient_doc = frappe.get_cached_doc("Patient", self.patient)
 		if patient_doc.dob:
-			self.age = patient_doc.calculate_age().get("age_in_string")
-			self.days = patient_doc.calculate_age().get("age_in_days")
+			age = patient_doc.calculate_age()
+			self.age = age.get("age_in_string")
+			self.days = age.get("age_in_days")
 
 	def set_status(self):
 		if self.status not in ["Approved", "Disapproved"]:
@@ -73,25 +109,7 @@ class Observation(Document):
 			self.time_of_approval = ""
 
 	def has_result(self):
-		result_fields = [
-			"result_attach",
-			"result_boolean",
-			"result_data",
-			"result_text",
-			"result_float",
-			"result_select",
-		]
-		for field in result_fields:
-			if self.get(field, None):
-				return True
-
-		# TODO: handle fields defaulting to now
-		# "result_datetime",
-		# "result_time",
-		# "result_period_from",
-		# "result_period_to",
-
-		return False
+		return observation_has_result(self)
 
 	def validate_input(self):
 		if self.permitted_data_type in ["Quantity", "Numeric"]:
@@ -105,23 +123,36 @@ class Observation(Document):
 
 @frappe.whitelist()
 def get_observation_details(docname):
+	"""
+	Returns the observations of the Diagnostic Report `docname` as (out_data, obs_length),
+	cached per report and user until any of its observations is saved
+	"""
 	reference = frappe.get_value(
 		"Diagnostic Report", docname, ["docname", "ref_doctype"], as_dict=True
 	)
-	observation = []
+	cache_key = get_observation_details_cache_key(
+		reference.get("ref_doctype"), reference.get("docname")
+	)
+	details = frappe.cache().hget(cache_key, frappe.session.user)
+
+	if details is None:
+		details = aggregate_and_return_observation_data(get_report_observations(reference))
+		frappe.cache().hset(cache_key, frappe.session.user, details)
+		frappe.cache().expire(frappe.cache().make_key(cache_key), OBSERVATION_DETAILS_CACHE_EXPIRY)
+
+	return details
+
+
+def get_report_observations(reference):
+	"""Returns the parent observations listed in the Diagnostic Report of `reference`"""
+	filters = {
+		"parent_observation": "",
+		"status": ["!=", "Cancelled"],
+		"docstatus": ["!=", 2],
+	}
 
 	if reference.get("ref_doctype") == "Sales Invoice":
-		observation = frappe.get_list(
-			"Observation",
-			fields=["*"],
-			filters={
-				"sales_invoice": reference.get("docname"),
-				"parent_observation": "",
-				"status": ["!=", "Cancelled"],
-				"docstatus": ["!=", 2],
-			},
-			order_by="creation",
-		)
+		filters["sales_invoice"] = reference.get("docname")
 	elif reference.get("ref_doctype") == "Patient Encounter":
 		service_requests = frappe.get_all(
 			"Service Request",
@@ -134,27 +165,24 @@ def get_observation_details(docname):
 			order_by="creation",
 			pluck="name",
 		)
-		observation = frappe.get_list(
-			"Observation",
-			fields=["*"],
-			filters={
-				"service_request": ["in", service_requests],
-				"parent_observation": "",
-				"status": ["!=", "Cancelled"],
-				"docstatus": ["!=", 2],
-			},
-			order_by="creation",
-		)
-
-	out_data, obs_length = aggregate_and_return_observation_data(observation)
+		if not service_requests:
+			return []
+		filters["service_request"] = ["in", service_requests]
+	else:
+		return []
 
-	return out_data, obs_length
+	return frappe.get_list("Observation", fields=["*"], filters=filters, order_by="creation")
 
 
 def aggregate_and_return_observation_data(observations):
 	out_data = []
 	obs_length = 0
 
+	child_observations = get_child_observations(observations)
+	received_times = get_specimen_received_times(
+		[*observations, *[child for children in child_observations.values() for child in children]]
+	)
+
 	for obs in observations:
 
 		if not obs.get("has_component"):
@@ -165,13 +193,14 @@ def aggregate_and_return_observation_data(observations):
 				obs["options_list"] = obs.get("options").split("\n")
 
 			if obs.get("observation_template") and obs.get("specimen"):
-				obs["received_time"] = frappe.get_value("Specimen", obs.get("specimen"), "received_time")
+				obs["received_time"] = received_times.get(obs.get("specimen"))
 
 			out_data.append({"observation": obs})
 
 		else:
-			child_observations = get_child_observations(obs)
-			obs_dict = return_child_observation_data_as_dict(child_observations, obs, obs_length)
+			obs_dict = return_child_observation_data_as_dict(
+				child_observations.get(obs.get("name"), []), obs, obs_length, received_times
+			)
 
 			if len(obs_dict) > 0:
 				out_data.append(obs_dict)
@@ -179,31 +208,60 @@ def aggregate_and_return_observation_data(observations):
 	return out_data, obs_length
 
 
-def get_child_observations(obs):
-	return frappe.get_list(
+def get_child_observations(observations):
+	"""Returns the component observations of `observations` grouped by parent, in one query"""
+	parents = [obs.get("name") for obs in observations if obs.get("has_component")]
+	if not parents:
+		return {}
+
+	child_observations = {}
+	for child in frappe.get_list(
 		"Observation",
 		fields=["*"],
 		filters={
-			"parent_observation": obs.get("name"),
+			"parent_observation": ["in", parents],
 			"status": ["!=", "Cancelled"],
 			"docstatus": ["!=", 2],
 		},
 		order_by="observation_idx",
+	):
+		child_observations.setdefault(child.parent_observation, []).append(child)
+
+	return child_observations
+
+
+def get_specimen_received_times(observations):
+	specimens = list({obs.get("specimen") for obs in observations if obs.get("specimen")})
+	if not specimens:
+		return {}
+
+	return dict(
+		frappe.get_all(
+			"Specimen",
+			filters={"name": ["in", specimens]},
+			fields=["name", "received_time"],
+			as_list=True,
+		)
 	)
 
 
-def return_child_observation_data_as_dict(child_observations, obs, obs_length):
+def return_child_observation_data_as_dict(
+	child_observations, obs, obs_length, received_times=None
+):
 	obs_list = []
 	has_result = False
 	obs_approved = False
 
+	if received_times is None:
+		received_times = get_specimen_received_times(child_observations)
+
 	for child in child_observations:
 		if child.get("permitted_data_type"):
 			obs_length += 1
 		if child.get("permitted_data_type") == "Select" and child.get("options"):
 			child["options_list"] = child.get("options").split("\n")
 		if child.get("specimen"):
-			child["received_time"] = frappe.get_value("Specimen", child.get("specimen"), "received_time")
+			child["received_time"] = received_times.get(child.get("specimen"))
 		observation_data = {"observation": child}
 		obs_list.append(observation_data)
 
@@ -231,37 +289,169 @@ def return_child_observation_data_as_dict(child_observations, obs, obs_length):
 	return obs_dict
 
 
+def get_observation_details_cache_key(ref_doctype, docname):
+	return f"{OBSERVATION_DETAILS_CACHE_KEY}::{ref_doctype}::{docname}"
+
+
+def get_report_references(observations):
+	"""Returns the (ref_doctype, docname) of the Diagnostic Reports listing `observations`"""
+	parents = {
+		obs.get("parent_observation")
+		for obs in observations
+		if obs.get("parent_observation")
+		and not (obs.get("sales_invoice") or obs.get("service_request"))
+	}
+	if parents:
+		observations = [
+			*observations,
+			*frappe.get_all(
+				"Observation",
+				filters={"name": ["in", list(parents)]},
+				fields=["sales_invoice", "service_request"],
+			),
+		]
+
+	references = {
+		("Sales Invoice", obs.get("sales_invoice"))
+		for obs in observations
+		if obs.get("sales_invoice")
+	}
+	service_requests = {
+		obs.get("service_request") for obs in observations if obs.get("service_request")
+	}
+	if service_requests:
+		references.update(
+			("Patient Encounter", order_group)
+			for order_group in frappe.get_all(
+				"Service Request",
+				filters={
+					"name": ["in", list(service_requests)],
+					"source_doc": "Patient Encounter",
+				},
+				pluck="order_group",
+			)
+			if order_group
+		)
+
+	return references
+
+
+def clear_observation_details_cache(observations):
+	cache_keys = [
+		get_observation_details_cache_key(ref_doctype, docname)
+		for ref_doctype, docname in get_report_references(observations)
+	]
+	if not cache_keys:
+		return
+
+	frappe.cache().delete_value(cache_keys)
+	# readers may cache the committed state again before this transaction commits
+	frappe.db.after_commit.add(lambda: frappe.cache().delete_value(cache_keys))
+
+
 def get_observation_reference(doc):
-	template_doc = frappe.get_doc("Observation Template", doc.observation_template)
-	display_reference = ""
+	"""Returns the reference ranges of the template applicable to the patient's gender and age"""
+	if not doc.observation_template:
+		return ""
+
+	index = get_reference_range_index(doc.observation_template)
+	bucket = index.get(doc.gender) or index[None]
+
+	if not doc.days:
+		return bucket["without_age"]
+
+	days = flt(doc.days)
+	i = bisect.bisect_left(bucket["bounds"], days)
+	if i < len(bucket["bounds"]) and bucket["bounds"][i] == days:
+		return bucket["points"][i]
+	if 0 < i < len(bucket["bounds"]):
+		return bucket["segments"][i - 1]
+
+	return bucket["outside"]
+
+
+def get_reference_range_index(observation_template):
+	"""
+	Returns the reference ranges of `observation_template` compiled per gender, see
+	`build_reference_range_index`, cached until the template is changed
+	"""
+	index = frappe.cache().hget(REFERENCE_RANGE_CACHE_KEY, observation_template)
+	if index is None:
+		index = build_reference_range_index(observation_template)
+		frappe.cache().hset(REFERENCE_RANGE_CACHE_KEY, observation_template, index)
+
+	return index
+
+
+def build_reference_range_index(observation_template):
+	"""
+	Returns a dict like { gender: bucket } with a bucket for every `applies_to` of the ranges,
+	and one for any other gender (None) holding the ranges that apply to All. Range ages are
+	converted to day intervals and the bucket keeps the reference strings, in row order, for
+	each interval bound (`points`) and between consecutive bounds (`segments`).
+	"""
+	ranges = frappe.get_all(
+		"Observation Reference Range",
+		filters={"parent": observation_template, "parenttype": "Observation Template"},
+		fields=[
+			"applies_to",
+			"age",
+			"age_from",
+			"from_age_type",
+			"age_to",
+			"to_age_type",
+			"reference_from",
+			"reference_to",
+			"conditions",
+			"short_interpretation",
+			"long_interpretation",
+		],
+		order_by="idx",
+	)
+	for row in ranges:
+		row.reference = set_reference_string(row)
+		if row.age == "Range":
+			row.day_from = get_age_in_days(row.age_from, row.from_age_type)
+			row.day_to = get_age_in_days(row.age_to, row.to_age_type)
+
+	index = {}
+	for gender in {None, *(row.applies_to for row in ranges if row.applies_to != "All")}:
+		rows = [row for row in ranges if row.applies_to in ("All", gender)]
+		bounds = sorted(
+			{day for row in rows if row.age == "Range" for day in (row.day_from, row.day_to)}
+		)
+		index[gender] = {
+			"without_age": "".join(row.reference for row in rows if row.age != "Range"),
+			"bounds": bounds,
+			"points": [get_reference_for_day(rows, day) for day in bounds],
+			# any day between two consecutive bounds falls in the same ranges as their midpoint
+			"segments": [
+				get_reference_for_day(rows, (bounds[i] + bounds[i + 1]) / 2)
+				for i in range(len(bounds) - 1)
+			],
+			"outside": "".join(row.reference for row in rows if row.age == "All"),
+		}
+
+	return index
+
+
+def get_reference_for_day(rows, days):
+	return "".join(
+		row.reference
+		for row in rows
+		if row.age == "All" or (row.age == "Range" and row.day_from <= days <= row.day_to)
+	)
 
-	for child in template_doc.observation_reference_range:
-		if not child.applies_to == "All":
-			if not child.applies_to == doc.gender:
-				continue
-		if child.age == "Range":
-			day_from = day_to = 0
-			if child.from_age_type == "Months":
-				day_from = float(child.age_from) * 30.436875
-			elif child.from_age_type == "Years":
-				day_from = float(child.age_from) * 365.2425
-			elif child.from_age_type == "Days":
-				day_from = float(child.age_from)
-
-			if child.to_age_type == "Months":
-				day_to = float(child.age_to) * 30.436875
-			elif child.to_age_type == "Years":
-				day_to = float(child.age_to) * 365.2425
-			elif child.to_age_type == "Days":
-				day_to = float(child.age_to)
-
-			if doc.days and float(day_from) <= float(doc.days) <= float(day_to):
-				display_reference += set_reference_string(child)
-
-		elif child.age == "All" or not doc.days:
-			display_reference += set_reference_string(child)
 
-	return display_reference
+def get_age_in_days(age, age_type):
+	if age_type == "Months":
+		return flt(age) * 30.436875
+	elif age_type == "Years":
+		return flt(age) * 365.2425
+	elif age_type == "Days":
+		return flt(age)
+
+	return 0
 
 
 def set_reference_string(child):
@@ -295,6 +485,13 @@ def edit_observation(observation, data_type, result):
 
 @frappe.whitelist()
 def add_observation(**args):
+	observation_doc = make_observation(**args)
+	observation_doc.insert(ignore_permissions=True)
+	return observation_doc.name
+
+
+def make_observation(**args):
+	"""Returns a new, not inserted Observation, see `add_observation` for the arguments"""
 	observation_doc = frappe.new_doc("Observation")
 	observation_doc.posting_datetime = now_datetime()
 	observation_doc.patient = args.get("patient")
@@ -314,103 +511,212 @@ def add_observation(**args):
 	if args.get("parent"):
 		observation_doc.parent_observation = args.get("parent")
 	observation_doc.sales_invoice_item = args.get("child") if args.get("child") else ""
-	observation_doc.insert(ignore_permissions=True)
-	return observation_doc.name
+	return observation_doc
+
+
+def preload_observation_links(observations):
+	"""
+	Sets the fetched fields and component index of the new `observations` with one query per
+	linked doctype instead of one per observation, so that they can be inserted with
+	`ignore_links`
+	"""
+	meta = frappe.get_meta("Observation")
+	fetch_fields = {}
+	for df in meta.fields:
+		if df.fetch_from and "." in df.fetch_from:
+			link_fieldname, source_fieldname = df.fetch_from.split(".", 1)
+			fetch_fields.setdefault(link_fieldname, []).append((df, source_fieldname))
+
+	for link_fieldname, fields in fetch_fields.items():
+		link_df = meta.get_field(link_fieldname)
+		names = list({doc.get(link_fieldname) for doc in observations if doc.get(link_fieldname)})
+		if not names or not link_df or link_df.fieldtype != "Link":
+			continue
+
+		values = {
+			row.name: row
+			for row in frappe.get_all(
+				link_df.options,
+				filters={"name": ["in", names]},
+				fields=["name", *{source_fieldname for df, source_fieldname in fields}],
+			)
+		}
+		for doc in observations:
+			row = values.get(doc.get(link_fieldname))
+			if not row:
+				continue
+			for df, source_fieldname in fields:
+				if not (df.fetch_if_empty and doc.get(df.fieldname)):
+					doc.set(df.fieldname, row.get(source_fieldname))
+
+	parents = list({doc.parent_observation for doc in observations if doc.parent_observation})
+	if parents:
+		parent_templates = dict(
+			frappe.get_all(
+				"Observation",
+				filters={"name": ["in", parents]},
+				fields=["name", "observation_template"],
+				as_list=True,
+			)
+		)
+		component_idx = {
+			(row.parent, row.observation_template): row.idx
+			for row in frappe.get_all(
+				"Observation Component",
+				filters={"parent": ["in", list(set(parent_templates.values()))]},
+				fields=["parent", "observation_template", "idx"],
+			)
+		}
+		for doc in observations:
+			if doc.parent_observation:
+				doc.observation_idx = component_idx.get(
+					(parent_templates.get(doc.parent_observation), doc.observation_template)
+				)
+
+	for doc in observations:
+		doc.flags.ignore_links = True
+
+
+def observation_has_result(observation):
+	"""`observation` is an Observation doc or a row with the OBSERVATION_RESULT_FIELDS"""
+	return any(observation.get(field) for field in OBSERVATION_RESULT_FIELDS)
+
+
+RESULT_FIELDS = {
+	"Range": "result_data",
+	"Ratio": "result_data",
+	"Quantity": "result_data",
+	"Numeric": "result_data",
+	"Text": "result_text",
+	"Select": "result_select",
+}
 
 
 @frappe.whitelist()
 def record_observation_result(values):
+	"""
+	Saves results, interpretations and notes entered in the observation widget, `values` is a
+	JSON list like [{ observation, result, interpretation, note }]. All observations are read
+	in one query and numeric results validated before any is saved, each observation is
+	saved at most once and the Diagnostic Report status is updated once at the end.
+	"""
 	values = json.loads(values)
-	if values:
-		values = [dict(t) for t in {tuple(d.items()) for d in values}]
-		for val in values:
-			if not val.get("observation"):
-				return
-			observation_doc = frappe.get_doc("Observation", val["observation"])
-			if observation_doc.get("permitted_data_type") in [
-				"Range",
-				"Ratio",
-				"Quantity",
-				"Numeric",
-			]:
-				if (
-					observation_doc.get("permitted_data_type")
-					in [
-						"Quantity",
-						"Numeric",
-					]
-					and val.get("result")
-					and not is_numbers_with_exceptions(val.get("result"))
-				):
-					frappe.msgprint(
-						_("Non numeric result {0} is not allowed for Permitted Type {1}").format(
-							frappe.bold(val.get("result")),
-							frappe.bold(observation_doc.get("permitted_data_type")),
-						),
-						indicator="orange",
-						alert=True,
-					)
-					return
-
-				if val.get("result") != observation_doc.get("result_data"):
-					if val.get("result"):
-						observation_doc.result_data = val.get("result")
-					if val.get("note"):
-						observation_doc.note = val.get("note")
-					if observation_doc.docstatus == 0:
-						observation_doc.save()
-					elif observation_doc.docstatus == 1:
-						observation_doc.save("Update")
-			elif observation_doc.get("permitted_data_type") == "Text":
-				if val.get("result") != observation_doc.get("result_text"):
-					if val.get("result"):
-						observation_doc.result_text = val.get("result")
-					if val.get("note"):
-						observation_doc.note = val.get("note")
-					if observation_doc.docstatus == 0:
-						observation_doc.save()
-					elif observation_doc.docstatus == 1:
-						observation_doc.save("Update")
-			elif observation_doc.get("permitted_data_type") == "Select":
-				if val.get("result") != observation_doc.get("result_select"):
-					if val.get("result"):
-						observation_doc.result_select = val.get("result")
-					if val.get("note"):
-						observation_doc.note = val.get("note")
-					if observation_doc.docstatus == 0:
-						observation_doc.save()
-					elif observation_doc.docstatus == 1:
-						observation_doc.save("Update")
-
-			if observation_doc.get("observation_category") == "Imaging":
-				if val.get("result"):
-					observation_doc.result_text = val.get("result")
-				if val.get("interpretation"):
-					observation_doc.result_interpretation = val.get("interpretation")
-				if val.get("result") or val.get("interpretation"):
-					if val.get("note"):
-						observation_doc.note = val.get("note")
-					if observation_doc.docstatus == 0:
-						observation_doc.save()
-					elif observation_doc.docstatus == 1:
-						observation_doc.save("Update")
-
-			if not val.get("result") and val.get("note"):
-				observation_doc.note = val.get("note")
-				if observation_doc.docstatus == 0:
-					observation_doc.save()
-				elif observation_doc.docstatus == 1:
-					observation_doc.save("Update")
+	values = [dict(t) for t in {tuple(d.items()) for d in values or []}]
+	values = [val for val in values if val.get("observation")]
+	if not values:
+		return
+
+	observations = {
+		obs.name: obs
+		for obs in frappe.get_all(
+			"Observation",
+			filters={"name": ["in", list({val["observation"] for val in values})]},
+			fields=[
+				"name",
+				"docstatus",
+				"permitted_data_type",
+				"observation_category",
+				*set(RESULT_FIELDS.values()),
+				"result_interpretation",
+				"note",
+			],
+		)
+	}
+
+	invalid = [
+		(val.get("result"), observations[val["observation"]].permitted_data_type)
+		for val in values
+		if val["observation"] in observations
+		and observations[val["observation"]].permitted_data_type in ["Quantity", "Numeric"]
+		and val.get("result")
+		and not is_numbers_with_exceptions(val.get("result"))
+	]
+	if invalid:
+		frappe.msgprint(
+			"<br>".join(
+				_("Non numeric result {0} is not allowed for Permitted Type {1}").format(
+					frappe.bold(result), frappe.bold(permitted_data_type)
+				)
+				for result, permitted_data_type in invalid
+			),
+			indicator="orange",
+			alert=True,
+		)
+		return
+
+	changes = {}
+	for val in values:
+		obs = observations.get(val["observation"])
+		if obs:
+			for fieldname, value in get_result_changes(obs, val).items():
+				if obs.get(fieldname) != value:
+					obs[fieldname] = value
+					changes.setdefault(obs.name, {})[fieldname] = value
+
+	sales_invoices = set()
+	for name, fields in changes.items():
+		if observations[name].docstatus == 2:
+			continue
+
+		observation_doc = frappe.get_doc("Observation", name)
+		observation_doc.update(fields)
+		observation_doc.flags.skip_diagnostic_report_status = True
+		if observation_doc.docstatus == 0:
+			observation_doc.save()
+		else:
+			observation_doc.save("Update")
+
+		if observation_doc.has_result() and observation_doc.sales_invoice:
+			sales_invoices.add(observation_doc.sales_invoice)
+
+	for sales_invoice in sales_invoices:
+		update_diagnostic_report_status(sales_invoice)
+
+
+def get_result_changes(obs, val):
+	"""Returns the fields to set on the observation `obs` for one entry `val` of the widget"""
+	changes = {}
+	result_field = RESULT_FIELDS.get(obs.permitted_data_type)
+	result, interpretation, note = val.get("result"), val.get("interpretation"), val.get("note")
+
+	if result_field and result != obs.get(result_field):
+		if result:
+			changes[result_field] = result
+		if note:
+			changes["note"] = note
+
+	if obs.observation_category == "Imaging":
+		if result:
+			changes["result_text"] = result
+		if interpretation:
+			changes["result_interpretation"] = interpretation
+		if (result or interpretation) and note:
+			changes["note"] = note
+
+	if not result and note:
+		changes["note"] = note
+
+	return changes
 
 
 @frappe.whitelist()
 def add_note(note, observation):
 	if note and observation:
 		frappe.db.set_value("Observation", observation, "note", note)
+		clear_observation_details_cache(
+			[
+				frappe.db.get_value(
+					"Observation",
+					observation,
+					["parent_observation", "sales_invoice", "service_request"],
+					as_dict=True,
+				)
+			]
+		)
 
 
 def set_observation_idx(doc):
-	if doc.parent_observation:
+	if doc.parent_observation and not doc.observation_idx:
 		parent_template = frappe.db.get_value(
 			"Observation", doc.parent_observation, "observation_template"
 		)
@@ -460,140 +766,294 @@ def set_observation_status(observation, status, reason=None):
 
 
 def set_diagnostic_report_status(doc):
-	if doc.has_result() and doc.sales_invoice and not doc.has_component and doc.sales_invoice:
-		observations = frappe.db.get_all(
-			"Observation",
-			{
-				"sales_invoice": doc.sales_invoice,
-				"docstatus": 0,
-				"status": ["!=", "Approved"],
-				"has_component": 0,
-			},
-		)
-		diagnostic_report = frappe.db.get_value(
-			"Diagnostic Report",
-			{"ref_doctype": "Sales Invoice", "docname": doc.sales_invoice},
-			["name"],
-			as_dict=True,
-		)
-		if diagnostic_report:
-			workflow_name = get_workflow_name("Diagnostic Report")
-			workflow_state_field = get_workflow_state_field(workflow_name)
-			if observations and len(observations) > 0:
-				set_status = "Partially Approved"
-			else:
-				set_status = "Approved"
-			set_value_dict = {"status": set_status}
-			if workflow_state_field:
-				set_value_dict[workflow_state_field] = set_status
-			frappe.db.set_value(
-				"Diagnostic Report", diagnostic_report.get("name"), set_value_dict, update_modified=False
+	if doc.flags.skip_diagnostic_report_status:
+		return
+
+	if doc.has_result() and doc.sales_invoice and not doc.has_component:
+		update_diagnostic_report_status(doc.sales_invoice)
+
+
+def update_diagnostic_report_status(sales_invoice):
+	"""Sets the status of the invoice's Diagnostic Report from its pending observations counter"""
+	report = frappe.qb.DocType("Diagnostic Report")
+	status = Case().when(report.pending_observations > 0, "Partially Approved").else_("Approved")
+	query = frappe.qb.update(report).set(report.status, status)
+
+	workflow_state_field = get_report_workflow_state_field()
+	if workflow_state_field:
+		query = query.set(report[workflow_state_field], status)
+
+	query.where((report.ref_doctype == "Sales Invoice") & (report.docname == sales_invoice)).run()
+
+
+@site_cache(ttl=5 * 60)
+def get_report_workflow_state_field():
+	return get_workflow_state_field(get_workflow_name("Diagnostic Report"))
+
+
+def get_observation_counters(doc):
+	"""Returns how much `doc` adds to the (pending, approved) counters of its report"""
+	if not doc or not doc.get("sales_invoice") or doc.get("has_component"):
+		return 0, 0
+
+	if doc.docstatus == 0 and doc.status != "Approved":
+		return 1, 0
+	elif doc.docstatus == 1:
+		return 0, 1
+
+	return 0, 0
+
+
+def update_diagnostic_report_counters(doc, trash=False):
+	"""Applies the change of `doc` since it was loaded to the counters of its Diagnostic Report"""
+	if trash:
+		states = [(doc, -1)]
+	else:
+		states = [(doc.get_doc_before_save(), -1), (doc, 1)]
+
+	deltas = {}
+	for observation, sign in states:
+		pending, approved = get_observation_counters(observation)
+		if pending or approved:
+			delta = deltas.setdefault(observation.sales_invoice, [0, 0])
+			delta[0] += sign * pending
+			delta[1] += sign * approved
+
+	report = frappe.qb.DocType("Diagnostic Report")
+	for sales_invoice, (pending, approved) in deltas.items():
+		if pending or approved:
+			(
+				frappe.qb.update(report)
+				.set(report.pending_observations, report.pending_observations + pending)
+				.set(report.approved_observations, report.approved_observations + approved)
+				.where((report.ref_doctype == "Sales Invoice") & (report.docname == sales_invoice))
+			).run()
+
+
+def get_sales_invoice_observation_counters(sales_invoices):
+	"""Counts the (pending, approved) observations of `sales_invoices` from Observation"""
+	obs = frappe.qb.DocType("Observation")
+	return {
+		sales_invoice: (int(pending or 0), int(approved or 0))
+		for sales_invoice, pending, approved in (
+			frappe.qb.from_(obs)
+			.select(
+				obs.sales_invoice,
+				Sum(
+					Case()
+					.when((obs.docstatus == 0) & (Coalesce(obs.status, "") != "Approved"), 1)
+					.else_(0)
+				),
+				Sum(Case().when(obs.docstatus == 1, 1).else_(0)),
 			)
+			.where(obs.sales_invoice.isin(sales_invoices) & (obs.has_component == 0))
+			.groupby(obs.sales_invoice)
+			.run()
+		)
+	}
 
 
 def set_calculated_result(doc):
-	if doc.parent_observation:
-		parent_template = frappe.db.get_value(
-			"Observation", doc.parent_observation, "observation_template"
+	"""
+	Evaluates the formula components of the parent template that depend, directly or through
+	other formula components, on the result of `doc` and saves their results in one update
+	"""
+	if not doc.parent_observation:
+		return
+
+	parent_template = frappe.db.get_value(
+		"Observation", doc.parent_observation, "observation_template"
+	)
+	graph = get_formula_graph(parent_template)
+	components = get_dependent_components(graph, doc.observation_template)
+	if not components:
+		return
+
+	siblings = frappe.get_all(
+		"Observation",
+		filters={"parent_observation": doc.parent_observation},
+		fields=["name", "observation_template", "result_data"],
+		order_by="observation_idx",
+	)
+	observations, results = {}, {}
+	for sibling in siblings:
+		observations.setdefault(sibling.observation_template, sibling)
+		if sibling.result_data:
+			results.setdefault(sibling.observation_template, sibling.result_data)
+
+	data = get_formula_context(doc, parent_template, components)
+	for abbr, observation_template in graph.abbrs.items():
+		data[abbr] = flt(results.get(observation_template))
+
+	updated = {}
+	for component in components:
+		result = eval_condition_and_formula(component, data)
+		if not result:
+			continue
+
+		# components chained on this one read the new result
+		for abbr, observation_template in graph.abbrs.items():
+			if observation_template == component.observation_template:
+				data[abbr] = flt(result)
+
+		observation = observations.get(component.observation_template)
+		if observation and observation.result_data != str(result):
+			observation.result_data = updated[observation.name] = str(result)
+
+	if updated:
+		obs = frappe.qb.DocType("Observation")
+		result_data = Case()
+		for name, result in updated.items():
+			result_data = result_data.when(obs.name == name, result)
+		(
+			frappe.qb.update(obs)
+			.set(obs.result_data, result_data)
+			.set(obs.modified, now())
+			.set(obs.modified_by, frappe.session.user)
+			.where(obs.name.isin(list(updated)))
+		).run()
+
+
+def get_formula_graph(observation_template):
+	"""
+	Returns the formula components of `observation_template` compiled and in dependency order,
+	see `build_formula_graph`, cached until the template is changed
+	"""
+	graph = frappe.cache().hget(FORMULA_GRAPH_CACHE_KEY, observation_template)
+	if graph is None:
+		graph = build_formula_graph(observation_template)
+		frappe.cache().hset(FORMULA_GRAPH_CACHE_KEY, observation_template, graph)
+
+	return graph
+
+
+def build_formula_graph(observation_template):
+	"""
+	Returns a dict like { abbrs: { abbr: observation_template }, components: [...] } where
+	every formula component has its condition and formula normalized, the operands of the
+	formula, all names it reads (`names`) and the abbrs of the components it depends on.
+	Components are sorted so that each comes after the ones it depends on, in table order
+	otherwise; components in a dependency cycle are evaluated once, in table order.
+	"""
+	template_doc = frappe.get_cached_doc("Observation Template", observation_template)
+	abbrs = {
+		component.abbr: component.observation_template
+		for component in template_doc.observation_component
+		if component.abbr
+	}
+
+	components = []
+	for component in template_doc.observation_component:
+		if not (component.based_on_formula and component.formula):
+			continue
+
+		formula = component.formula.strip().replace("\n", " ")
+		condition = " ".join((component.condition or "").strip().splitlines())
+		operands = [
+			operand for operand in re.split(r"\W+", formula) if re.search(r"[a-zA-Z]", operand)
+		]
+		names = {*operands, *re.findall(r"[A-Za-z_]\w*", condition)}
+		components.append(
+			frappe._dict(
+				parent=template_doc.name,
+				parenttype=template_doc.doctype,
+				idx=component.idx,
+				abbr=component.abbr,
+				observation_template=component.observation_template,
+				formula=formula,
+				condition=condition,
+				operands=operands,
+				names=names,
+				depends_on={name for name in names if name in abbrs},
+			)
 		)
-		parent_template_doc = frappe.get_cached_doc("Observation Template", parent_template)
-
-		data = frappe._dict()
-		patient_doc = frappe.get_cached_doc("Patient", doc.patient).as_dict()
-		settings = frappe.get_cached_doc("Healthcare Settings").as_dict()
-
-		data.update(doc.as_dict())
-		data.update(parent_template_doc.as_dict())
-		data.update(patient_doc)
-		data.update(settings)
-
-		for component in parent_template_doc.observation_component:
-			"""
-			Data retrieval from observations has been moved into the loop
-			to accommodate component observations, which may contain formulas
-			utilizing results from previous iterations.
-
-			"""
-			if component.based_on_formula and component.formula:
-				obs_data = get_data(doc, parent_template_doc)
-			else:
-				continue
 
-			if obs_data and len(obs_data) > 0:
-				data.update(obs_data)
-				result = eval_condition_and_formula(component, data)
-				if not result:
-					continue
+	# abbrs set by formula components, other abbrs are plain results
+	computed = {}
+	for component in components:
+		for abbr, template in abbrs.items():
+			if template == component.observation_template:
+				computed.setdefault(abbr, []).append(component.idx)
+
+	ordered, done = [], set()
+	pending = list(components)
+	while pending:
+		ready = [
+			component
+			for component in pending
+			if all(
+				idx in done or idx == component.idx
+				for abbr in component.depends_on
+				for idx in computed.get(abbr, [])
+			)
+		]
+		if not ready:
+			ready = pending
+		for component in ready:
+			ordered.append(component)
+			done.add(component.idx)
+		pending = [component for component in pending if component.idx not in done]
+
+	return frappe._dict(abbrs=abbrs, components=ordered)
+
+
+def get_dependent_components(graph, observation_template):
+	"""Returns the formula components reading the result of `observation_template`, in order"""
+	changed = {abbr for abbr, template in graph.abbrs.items() if template == observation_template}
+	components = []
+	for component in graph.components:
+		if component.depends_on & changed:
+			components.append(component)
+			changed.update(
+				abbr
+				for abbr, template in graph.abbrs.items()
+				if template == component.observation_template
+			)
 
-				result_observation_name, result_data = frappe.db.get_value(
-					"Observation",
-					{
-						"parent_observation": doc.parent_observation,
-						"observation_template": component.get("observation_template"),
-					},
-					["name", "result_data"],
-				)
-				if result_observation_name and result_data != str(result):
-					frappe.db.set_value(
-						"Observation",
-						result_observation_name,
-						"result_data",
-						str(result),
-					)
+	return components
 
 
-def get_data(doc, parent_template_doc):
+def get_formula_context(doc, parent_template, components):
+	"""
+	Returns the names other than abbrs read by `components` from the observation, the parent
+	template, the patient and Healthcare Settings, later ones taking precedence
+	"""
+	names = set().union(*(component.names for component in components))
+	patient_doc = frappe.get_cached_doc("Patient", doc.patient)
 	data = frappe._dict()
-	observation_details = frappe.get_all(
-		"Observation",
-		{"parent_observation": doc.parent_observation},
-		["observation_template", "result_data"],
-	)
 
-	# to get all result_data to map against abbs of all table rows
-	for component in parent_template_doc.observation_component:
-		result = [
-			d["result_data"]
-			for d in observation_details
-			if (d["observation_template"] == component.get("observation_template") and d["result_data"])
+	if names:
+		sources = [
+			doc,
+			frappe.get_cached_doc("Observation Template", parent_template),
+			patient_doc,
+			frappe.get_cached_doc("Healthcare Settings"),
 		]
-		data[component.get("abbr")] = flt(result[0]) if (result and len(result) > 0 and result[0]) else 0
+		for name in names:
+			for source in reversed(sources):
+				if source.meta.has_field(name) or name in source.__dict__:
+					data[name] = source.get(name)
+					break
+
+	if patient_doc.dob and any("age" in component.operands for component in components):
+		dob = getdate(patient_doc.dob)
+		today = getdate(nowdate())
+		age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+		if age > 0:
+			data["age"] = age
+
 	return data
 
 
 def eval_condition_and_formula(d, data):
 	try:
-		if d.get("condition"):
-			cond = d.get("condition")
-			parts = cond.strip().splitlines()
-			condition = " ".join(parts)
-			if condition:
-				if not frappe.safe_eval(condition, data):
-					return None
-
-		if d.based_on_formula:
-			amount = None
-			formula = d.formula.strip().replace("\n", " ") if d.formula else None
-			operands = re.split(r"\W+", formula)
-			abbrs = [operand for operand in operands if re.search(r"[a-zA-Z]", operand)]
-			if "age" in abbrs and data.get("dob"):
-				age = (
-					getdate(nowdate()).year
-					- data.get("dob").year
-					- (
-						(getdate(nowdate()).month, getdate(nowdate()).day)
-						< (data.get("dob").month, data.get("dob").day)
-					)
-				)
-				if age > 0:
-					data["age"] = age
-
-			# check the formula abbrs has result value
-			abbrs_present = all(abbr in data and data[abbr] != 0 for abbr in abbrs)
-			if formula and abbrs_present:
-				amount = flt(frappe.safe_eval(formula, {}, data))
+		if d.condition and not frappe.safe_eval(d.condition, data):
+			return None
 
-		return amount
+		# check the formula abbrs has result value
+		abbrs_present = all(abbr in data and data[abbr] != 0 for abbr in d.operands)
+		if d.formula and abbrs_present:
+			return flt(frappe.safe_eval(d.formula, {}, data))
 
 	except Exception as err:
 		description = _("This error can be due to invalid formula.")
@@ -602,3 +1062,15 @@ def eval_condition_and_formula(d, data):
 			<br><br> <b>Hint:</b> {4}"""
 		).format(d.parenttype, get_link_to_form(d.parenttype, d.parent), d.idx, err, description)
 		frappe.throw(message, title=_("Error in formula"))
+
+
+def clear_observation_template_cache(observation_template):
+	"""Drops the compiled reference ranges and formulas of `observation_template`"""
+	for cache_key in (REFERENCE_RANGE_CACHE_KEY, FORMULA_GRAPH_CACHE_KEY):
+		frappe.cache().hdel(cache_key, observation_template)
+
+	def clear():
+		for cache_key in (REFERENCE_RANGE_CACHE_KEY, FORMULA_GRAPH_CACHE_KEY):
+			frappe.cache().hdel(cache_key, observation_template)
+
+	frappe.db.after_commit.add(clear)
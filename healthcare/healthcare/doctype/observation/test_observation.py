@@ -1,16 +1,29 @@
 # Copyright (c) 2023, healthcare and Contributors
 # See license.txt
 
+import json
+from unittest.mock import patch
+
 import frappe
 from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
 from frappe.tests import IntegrationTestCase
 from frappe.utils import flt, getdate, nowtime
 
+from healthcare.healthcare import utils
 from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import (
 	get_income_account,
 	get_receivable_account,
 )
 from healthcare.healthcare.doctype.lab_test.test_lab_test import create_practitioner
+from healthcare.healthcare.doctype.observation import observation as observation_module
+from healthcare.healthcare.doctype.observation.observation import (
+	Observation,
+	add_note,
+	get_formula_graph,
+	get_observation_details,
+	get_observation_reference,
+	record_observation_result,
+)
 from healthcare.healthcare.doctype.observation_template.test_observation_template import (
 	create_grouped_observation_template,
 	create_observation_template,
@@ -18,6 +31,7 @@ from healthcare.healthcare.doctype.observation_template.test_observation_templat
 from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
 	create_patient,
 )
+from healthcare.healthcare.utils import create_sample_collection_and_observation_for_invoice
 
 
 class TestObservation(IntegrationTestCase):
@@ -173,6 +187,141 @@ class TestObservation(IntegrationTestCase):
 			)
 		)
 
+	def test_observation_details(self):
+		frappe.db.set_single_value("Healthcare Settings", "create_observation_on_si_submit", 1)
+		patient = create_patient()
+		obs_name = "Complete Blood Count (CBC)"
+		obs_template = create_grouped_observation_template(obs_name, 6)
+		sales_invoice = create_sales_invoice(patient, obs_name + "6")
+		diagnostic_report = frappe.db.get_value(
+			"Diagnostic Report", {"ref_doctype": "Sales Invoice", "docname": sales_invoice.name}
+		)
+
+		out_data, obs_length = get_observation_details(diagnostic_report)
+		self.assertEqual(len(out_data), 1)
+		self.assertTrue(out_data[0]["has_component"])
+		self.assertEqual(out_data[0]["display_name"], obs_template.name)
+		child_observations = out_data[0][out_data[0]["observation"]]
+		self.assertEqual(len(child_observations), 1)
+		self.assertFalse(out_data[0]["has_result"])
+
+		# served from cache, only the report is read
+		with self.assertQueryCount(1):
+			get_observation_details(diagnostic_report)
+
+		# saving an observation of the report invalidates it
+		child = frappe.get_doc("Observation", child_observations[0]["observation"].name)
+		child.result_data = "12"
+		child.save()
+		out_data, obs_length = get_observation_details(diagnostic_report)
+		self.assertTrue(out_data[0]["has_result"])
+		child_observations = out_data[0][out_data[0]["observation"]]
+		self.assertEqual(child_observations[0]["observation"].result_data, "12")
+
+		# and so does a note added from the report
+		add_note("Hemolysed sample", child.name)
+		out_data, obs_length = get_observation_details(diagnostic_report)
+		child_observations = out_data[0][out_data[0]["observation"]]
+		self.assertEqual(child_observations[0]["observation"].note, "Hemolysed sample")
+
+	def test_invoice_observations_job(self):
+		frappe.db.set_single_value("Healthcare Settings", "create_observation_on_si_submit", 0)
+		patient = create_patient()
+		create_grouped_observation_template("Thyroid Panel", 30)
+
+		# cancelled before the queued job ran
+		sales_invoice = create_sales_invoice(patient, "Thyroid Panel30")
+		sales_invoice.cancel()
+		create_sample_collection_and_observation_for_invoice(sales_invoice.name)
+		self.assertFalse(frappe.db.exists("Observation", {"sales_invoice": sales_invoice.name}))
+
+		sales_invoice = create_sales_invoice(patient, "Thyroid Panel30")
+		with patch.object(
+			utils, "create_sample_collection_and_observation", side_effect=frappe.ValidationError
+		):
+			create_sample_collection_and_observation_for_invoice(sales_invoice.name)
+
+		reference = {"reference_doctype": "Sales Invoice", "reference_name": sales_invoice.name}
+		self.assertTrue(frappe.db.exists("Error Log", reference))
+		self.assertTrue(frappe.db.exists("Comment", reference))
+
+	def test_observation_reference(self):
+		obs_template = create_observation_template("Hemoglobin")
+		for applies_to, age, age_from, age_to, reference_from, reference_to in [
+			("Male", "Range", 0, 12, "11", "15"),
+			("Male", "Range", 12, 100, "13", "17"),
+			("Female", "Range", 12, 100, "12", "16"),
+			("All", "All", None, None, "10", "18"),
+		]:
+			obs_template.append(
+				"observation_reference_range",
+				{
+					"applies_to": applies_to,
+					"age": age,
+					"age_from": age_from,
+					"from_age_type": "Years",
+					"age_to": age_to,
+					"to_age_type": "Years",
+					"reference_from": reference_from,
+					"reference_to": reference_to,
+				},
+			)
+		obs_template.save()
+
+		def get_reference(gender, years=None):
+			doc = frappe._dict(observation_template=obs_template.name, gender=gender)
+			doc.days = years * 365.2425 if years is not None else None
+			return get_observation_reference(doc)
+
+		self.assertEqual(get_reference("Male", 5), "11 - 1510 - 18")
+		# both Male ranges include the 12 years bound
+		self.assertEqual(get_reference("Male", 12), "11 - 1513 - 1710 - 18")
+		self.assertEqual(get_reference("Male", 40), "13 - 1710 - 18")
+		self.assertEqual(get_reference("Female", 5), "10 - 18")
+		self.assertEqual(get_reference("Female", 40), "12 - 1610 - 18")
+		self.assertEqual(get_reference("Male", 120), "10 - 18")
+		self.assertEqual(get_reference("Other", 40), "10 - 18")
+		self.assertEqual(get_reference("Female"), "10 - 18")
+
+		# compiled once per template
+		with self.assertQueryCount(0):
+			get_reference("Male", 40)
+
+		obs_template.observation_reference_range[1].reference_to = "18"
+		obs_template.save()
+		self.assertEqual(get_reference("Male", 40), "13 - 1810 - 18")
+
+	def test_record_observation_result(self):
+		frappe.db.set_single_value("Healthcare Settings", "create_observation_on_si_submit", 1)
+		patient = create_patient()
+		obs_template = create_observation_template("Total Cholesterol")
+		sales_invoice = create_sales_invoice(patient, obs_template.name)
+		observation = frappe.db.get_value(
+			"Observation", {"sales_invoice": sales_invoice.name, "patient": patient}
+		)
+
+		# nothing is saved if any result is invalid
+		record_observation_result(json.dumps([{"observation": observation, "result": "high"}]))
+		self.assertFalse(frappe.db.get_value("Observation", observation, "result_data"))
+
+		values = [
+			{"observation": observation, "result": "180"},
+			{"observation": observation, "note": "Fasting"},
+		]
+		# saved once, report status updated once
+		with (
+			patch.object(Observation, "on_update", autospec=True) as on_update,
+			patch.object(observation_module, "update_diagnostic_report_status") as update_status,
+		):
+			record_observation_result(json.dumps(values))
+
+		on_update.assert_called_once()
+		update_status.assert_called_once_with(sales_invoice.name)
+		self.assertEqual(
+			frappe.db.get_value("Observation", observation, ["result_data", "note"]),
+			("180", "Fasting"),
+		)
+
 	def test_observation_from_encounter(self):
 		observation_template = create_observation_template("Total Cholesterol")
 		patient = create_patient()
@@ -195,6 +344,60 @@ class TestObservation(IntegrationTestCase):
 		with_custom_field_in_patient(self, patient)
 		with_condition_patient(self, patient)
 
+	def test_chained_formulas(self):
+		frappe.db.set_single_value("Healthcare Settings", "create_observation_on_si_submit", 1)
+		patient = create_patient()
+		obs_template = create_grouped_observation_template("Lipid Panel", 10)
+		first_abbr = obs_template.observation_component[0].abbr
+		second = create_observation_template("Lipid Comp ", 12)
+		total = create_observation_template("Lipid Comp ", 13)
+		double = create_observation_template("Lipid Comp ", 14)
+
+		# listed before the component it depends on
+		obs_template.append(
+			"observation_component",
+			{
+				"observation_template": double.name,
+				"based_on_formula": True,
+				"formula": f"{total.abbr} * 2",
+			},
+		)
+		obs_template.append(
+			"observation_component",
+			{
+				"observation_template": total.name,
+				"based_on_formula": True,
+				"formula": f"{first_abbr} + {second.abbr}",
+			},
+		)
+		obs_template.append("observation_component", {"observation_template": second.name})
+		obs_template.save()
+
+		graph = get_formula_graph(obs_template.name)
+		self.assertEqual(
+			[component.observation_template for component in graph.components],
+			[total.name, double.name],
+		)
+
+		create_sales_invoice(patient, obs_template.name)
+		first = obs_template.observation_component[0].observation_template
+		for template, result in [(first, 5), (second.name, 2)]:
+			observation = frappe.get_doc(
+				"Observation", {"observation_template": template, "patient": patient}
+			)
+			observation.result_data = str(result)
+			observation.save()
+
+		def get_result(template):
+			return frappe.db.get_value(
+				"Observation",
+				{"observation_template": template, "patient": patient},
+				"result_data",
+			)
+
+		self.assertEqual(flt(get_result(total.name)), 7)
+		self.assertEqual(flt(get_result(double.name)), 14)
+
 
 def create_sales_invoice(patient, item):
 	sales_invoice = frappe.new_doc("Sales Invoice")
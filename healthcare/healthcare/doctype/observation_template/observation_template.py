@@ -9,6 +9,9 @@ from healthcare.healthcare.doctype.clinical_procedure_template.clinical_procedur
 	make_item_price,
 	update_item_and_item_price,
 )
+from healthcare.healthcare.doctype.observation.observation import clear_observation_template_cache
+
+ITEM_TEMPLATE_INDEX_CACHE_KEY = "healthcare:item_observation_templates"
 
 
 class ObservationTemplate(Document):
@@ -17,12 +20,18 @@ class ObservationTemplate(Document):
 			create_item_from_template(self)
 
 	def on_update(self):
+		clear_observation_template_cache(self.name)
+		clear_item_observation_templates()
 		# If change_in_item update Item and Price List
 		if self.change_in_item and self.is_billable:
 			update_item_and_item_price(self)
 		if not self.item and self.is_billable:
 			create_item_from_template(self)
 
+	def on_trash(self):
+		clear_observation_template_cache(self.name)
+		clear_item_observation_templates()
+
 	def validate(self):
 		if self.has_component and self.sample_collection_required:
 			self.sample_collection_required = 0
@@ -124,3 +133,73 @@ def get_observation_template_details(observation_template):
 			sample_reqd_component_obs.append(d.get("sample_reqd"))
 
 	return sample_reqd_component_obs, non_sample_reqd_component_obs
+
+
+def get_item_observation_templates():
+	"""
+	Returns a dict like { item: observation template } of the templates linked to an item,
+	each with its sample details and, for templates with components, the component templates
+	split by `sample_reqd_components` and `non_sample_reqd_components`. Cached until any
+	Observation Template changes.
+	"""
+	index = frappe.cache().get_value(ITEM_TEMPLATE_INDEX_CACHE_KEY)
+	if index is None:
+		index = build_item_observation_templates()
+		frappe.cache().set_value(ITEM_TEMPLATE_INDEX_CACHE_KEY, index)
+
+	return index
+
+
+def build_item_observation_templates():
+	templates = frappe.get_all(
+		"Observation Template",
+		filters={"item": ["is", "set"]},
+		fields=[
+			"item",
+			"sample_type",
+			"sample",
+			"medical_department",
+			"container_closure_color",
+			"name",
+			"sample_qty",
+			"has_component",
+			"sample_collection_required",
+		],
+		order_by="name",
+	)
+
+	obs_comp = frappe.qb.DocType("Observation Component")
+	obs_temp = frappe.qb.DocType("Observation Template")
+	components = {}
+	group_templates = [template.name for template in templates if template.has_component]
+	if group_templates:
+		for parent, component, sample_collection_required in (
+			frappe.qb.from_(obs_comp)
+			.join(obs_temp)
+			.on(obs_comp.observation_template == obs_temp.name)
+			.select(obs_comp.parent, obs_temp.name, obs_temp.sample_collection_required)
+			.where(obs_comp.parent.isin(group_templates))
+			.orderby(obs_comp.parent)
+			.orderby(obs_comp.idx)
+			.run()
+		):
+			sample_reqd, non_sample_reqd = components.setdefault(parent, ([], []))
+			if sample_collection_required:
+				sample_reqd.append(component)
+			else:
+				non_sample_reqd.append(component)
+
+	index = {}
+	for template in templates:
+		if template.has_component:
+			sample_reqd, non_sample_reqd = components.get(template.name, ([], []))
+			template.sample_reqd_components = sample_reqd
+			template.non_sample_reqd_components = non_sample_reqd
+		index.setdefault(template.pop("item"), template)
+
+	return index
+
+
+def clear_item_observation_templates():
+	frappe.cache().delete_value(ITEM_TEMPLATE_INDEX_CACHE_KEY)
+	frappe.db.after_commit.add(lambda: frappe.cache().delete_value(ITEM_TEMPLATE_INDEX_CACHE_KEY))
@@ -4,6 +4,10 @@
 import frappe
 from frappe.tests import IntegrationTestCase
 
+from healthcare.healthcare.doctype.observation_template.observation_template import (
+	get_item_observation_templates,
+)
+
 
 class TestObservationTemplate(IntegrationTestCase):
 	def test_observation_item(self):
@@ -14,6 +18,23 @@ class TestObservationTemplate(IntegrationTestCase):
 			obs_template.rate,
 		)
 
+	def test_item_observation_templates(self):
+		obs_template = create_grouped_observation_template("Renal Panel", 20)
+		component = obs_template.observation_component[0].observation_template
+		index = get_item_observation_templates()
+		self.assertEqual(index[obs_template.item].name, obs_template.name)
+		self.assertEqual(index[obs_template.item].non_sample_reqd_components, [component])
+		self.assertEqual(index[obs_template.item].sample_reqd_components, [])
+
+		# refreshed when a template changes
+		sample_template = create_observation_template("Renal Comp ", 22, True)
+		obs_template.append(
+			"observation_component", {"observation_template": sample_template.name}
+		)
+		obs_template.save()
+		index = get_item_observation_templates()
+		self.assertEqual(index[obs_template.item].sample_reqd_components, [sample_template.name])
+
 
 def create_observation_template(obs_name, idx="", sample_required=None):
 	if frappe.db.exists("Observation Template", obs_name + str(idx)):
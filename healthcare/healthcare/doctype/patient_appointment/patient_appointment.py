@@ -5,27 +5,52 @@
 
 import datetime
 import json
+import time
 
 import frappe
 from frappe import _
 from frappe.core.doctype.sms_settings.sms_settings import send_sms
 from frappe.model.document import Document
 from frappe.model.mapper import get_mapped_doc
-from frappe.utils import flt, format_date, get_link_to_form, get_time, getdate
+from frappe.query_builder.functions import Count
+from frappe.utils import (
+	add_days,
+	date_diff,
+	flt,
+	format_date,
+	get_link_to_form,
+	get_time,
+	getdate,
+	now,
+)
 
 from erpnext.setup.doctype.employee.employee import is_holiday
 
+from healthcare.healthcare.doctype.appointment_occupancy.appointment_occupancy import (
+	delete_appointment_occupancy,
+	get_overlapping_appointments,
+	update_appointment_occupancy,
+)
 from healthcare.healthcare.doctype.fee_validity.fee_validity import (
 	check_fee_validity,
 	get_fee_validity,
 	manage_fee_validity,
 )
 from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import (
+	get_healthcare_settings,
 	get_income_account,
 	get_receivable_account,
 )
 from healthcare.healthcare.utils import get_appointment_billing_item_and_rate
 
+AVAILABILITY_CACHE_KEY = "practitioner_availability"
+AVAILABILITY_CACHE_EXPIRY = 24 * 60 * 60
+MAX_AVAILABILITY_RANGE_DAYS = 31
+REMINDER_BATCH_SIZE = 100
+REMINDER_MAX_RETRIES = 3
+# SMS per second per queued batch
+REMINDER_RATE_LIMIT = 10
+
 
 class MaximumCapacityError(frappe.ValidationError):
 	pass
@@ -48,12 +73,20 @@ class PatientAppointment(Document):
 		self.set_postition_in_queue()
 
 	def on_update(self):
-		if (
-			not frappe.db.get_single_value("Healthcare Settings", "show_payment_popup")
-			or not self.practitioner
-		):
+		update_appointment_occupancy(self)
+
+		doc_before_save = self.get_doc_before_save()
+		clear_availability_cache_for_dates(
+			self.appointment_date, doc_before_save and doc_before_save.appointment_date
+		)
+
+		if not get_healthcare_settings().show_payment_popup or not self.practitioner:
 			update_fee_validity(self)
 
+	def on_trash(self):
+		delete_appointment_occupancy(self.name)
+		clear_availability_cache_for_dates(self.appointment_date)
+
 	def after_insert(self):
 		self.update_prescription_details()
 		self.set_payment_details()
@@ -103,33 +136,13 @@ class PatientAppointment(Document):
 		if not self.practitioner:
 			return
 
-		end_time = datetime.datetime.combine(
-			getdate(self.appointment_date), get_time(self.appointment_time)
-		) + datetime.timedelta(minutes=flt(self.duration))
-
 		# all appointments for both patient and practitioner overlapping the duration of this appointment
-		overlapping_appointments = frappe.db.sql(
-			"""
-			SELECT
-				name, practitioner, patient, appointment_time, duration, service_unit
-			FROM
-				`tabPatient Appointment`
-			WHERE
-				appointment_date=%(appointment_date)s AND name!=%(name)s AND status NOT IN ("Closed", "Cancelled") AND
-				(practitioner=%(practitioner)s OR patient=%(patient)s) AND
-				((appointment_time<%(appointment_time)s AND appointment_time + INTERVAL duration MINUTE>%(appointment_time)s) OR
-				(appointment_time>%(appointment_time)s AND appointment_time<%(end_time)s) OR
-				(appointment_time=%(appointment_time)s))
-			""",
-			{
-				"appointment_date": self.appointment_date,
-				"name": self.name,
-				"practitioner": self.practitioner,
-				"patient": self.patient,
-				"appointment_time": self.appointment_time,
-				"end_time": end_time.time(),
-			},
-			as_dict=True,
+		overlapping_appointments = get_overlapping_appointments(
+			[("Healthcare Practitioner", self.practitioner), ("Patient", self.patient)],
+			self.appointment_date,
+			self.appointment_time,
+			self.duration,
+			exclude=self.name,
 		)
 
 		if not overlapping_appointments:
@@ -237,14 +250,14 @@ class PatientAppointment(Document):
 		)
 
 	def set_payment_details(self):
-		if frappe.db.get_single_value("Healthcare Settings", "show_payment_popup"):
+		if get_healthcare_settings().show_payment_popup:
 			details = get_appointment_billing_item_and_rate(self)
 			self.db_set("billing_item", details.get("service_item"))
 			if not self.paid_amount:
 				self.db_set("paid_amount", details.get("practitioner_charge"))
 
 	def validate_customer_created(self):
-		if frappe.db.get_single_value("Healthcare Settings", "show_payment_popup"):
+		if get_healthcare_settings().show_payment_popup:
 			if not frappe.db.get_value("Patient", self.patient, "customer"):
 				msg = _("Please set a Customer linked to the Patient")
 				msg += " <b><a href='/app/Form/Patient/{0}'>{0}</a></b>".format(self.patient)
@@ -274,7 +287,7 @@ class PatientAppointment(Document):
 			"Healthcare Practitioner", self.practitioner, "google_calendar"
 		)
 		if not google_calendar:
-			google_calendar = frappe.db.get_single_value("Healthcare Settings", "default_google_calendar")
+			google_calendar = get_healthcare_settings().default_google_calendar
 
 		if self.appointment_type:
 			color = frappe.db.get_value("Appointment Type", self.appointment_type, "color")
@@ -381,10 +394,9 @@ def check_payment_reqd(patient):
 	return True if patient need to be invoiced when show_payment_popup enabled or have no fee validity
 	return False show_payment_popup is disabled
 	"""
-	show_payment_popup = frappe.db.get_single_value("Healthcare Settings", "show_payment_popup")
-	free_follow_ups = frappe.db.get_single_value("Healthcare Settings", "enable_free_follow_ups")
-	if show_payment_popup:
-		if free_follow_ups:
+	settings = get_healthcare_settings()
+	if settings.show_payment_popup:
+		if settings.enable_free_follow_ups:
 			fee_validity = frappe.db.exists("Fee Validity", {"patient": patient, "status": "Active"})
 			if fee_validity:
 				return {"fee_validity": fee_validity}
@@ -395,7 +407,7 @@ def check_payment_reqd(patient):
 @frappe.whitelist()
 def invoice_appointment(appointment_name, discount_percentage=0, discount_amount=0):
 	appointment_doc = frappe.get_doc("Patient Appointment", appointment_name)
-	settings = frappe.get_single("Healthcare Settings")
+	settings = get_healthcare_settings()
 
 	if settings.enable_free_follow_ups:
 		fee_validity = check_fee_validity(appointment_doc)
@@ -466,10 +478,7 @@ def update_fee_validity(appointment):
 		appointment = json.loads(appointment)
 		appointment = frappe.get_doc(appointment)
 
-	if (
-		not frappe.db.get_single_value("Healthcare Settings", "enable_free_follow_ups")
-		or not appointment.practitioner
-	):
+	if not get_healthcare_settings().enable_free_follow_ups or not appointment.practitioner:
 		return
 
 	fee_validity = manage_fee_validity(appointment)
@@ -518,7 +527,7 @@ def cancel_appointment(appointment_id):
 			msg = _("Appointment Cancelled. Please review and cancel the invoice {0}").format(
 				sales_invoice.name
 			)
-		if frappe.db.get_single_value("Healthcare Settings", "enable_free_follow_ups"):
+		if get_healthcare_settings().enable_free_follow_ups:
 			fee_validity = frappe.db.get_value("Fee Validity", {"patient_appointment": appointment.name})
 			if fee_validity:
 				frappe.db.set_value("Fee Validity", fee_validity, "status", "Cancelled")
@@ -538,7 +547,7 @@ def cancel_appointment(appointment_id):
 
 
 def cancel_sales_invoice(sales_invoice):
-	if frappe.db.get_single_value("Healthcare Settings", "show_payment_popup"):
+	if get_healthcare_settings().show_payment_popup:
 		if len(sales_invoice.items) == 1:
 			if sales_invoice.docstatus.is_submitted():
 				sales_invoice.cancel()
@@ -569,15 +578,101 @@ def get_availability_data(date, practitioner, appointment):
 	"""
 
 	date = getdate(date)
-	weekday = date.strftime("%A")
+	availability = get_practitioner_availability(practitioner, date)
+
+	if availability.get("unavailable"):
+		message = get_unavailability_message(availability["unavailable"], practitioner, date)
+		if availability["unavailable"] == "No Slots":
+			next_available_date = get_next_available_date(practitioner, date)
+			if next_available_date:
+				message += "<br>" + _("Next available date is {0}").format(
+					frappe.bold(format_date(next_available_date))
+				)
+		frappe.throw(message, title=_("Not Available"))
+
+	slot_details = availability["slot_details"]
 
+	if isinstance(appointment, str):
+		appointment = json.loads(appointment)
+		appointment = frappe.get_doc(appointment)
+
+	fee_validity = "Disabled"
+	if get_healthcare_settings().enable_free_follow_ups:
+		fee_validity = check_fee_validity(appointment, date, practitioner)
+		if not fee_validity and not appointment.get("__islocal"):
+			fee_validity = get_fee_validity(appointment.get("name"), date) or None
+
+	if appointment.invoiced:
+		fee_validity = "Disabled"
+
+	return {"slot_details": slot_details, "fee_validity": fee_validity}
+
+
+@frappe.whitelist()
+def get_availability_data_for_range(practitioner, from_date, to_date):
+	"""
+	Get availability of 'practitioner' for every date between 'from_date' and 'to_date'
+	:return: list of dicts with date, slot_details and the reason if not available
+	"""
+	from_date, to_date = getdate(from_date), getdate(to_date)
+	if date_diff(to_date, from_date) > MAX_AVAILABILITY_RANGE_DAYS:
+		frappe.throw(
+			_("Availability can be fetched for at most {0} days at a time").format(
+				MAX_AVAILABILITY_RANGE_DAYS
+			)
+		)
+
+	availability_data = []
+	date = from_date
+	while date <= to_date:
+		availability = get_practitioner_availability(practitioner, date)
+		availability_data.append(
+			{
+				"date": date,
+				"slot_details": availability.get("slot_details", []),
+				"message": get_unavailability_message(availability["unavailable"], practitioner, date)
+				if availability.get("unavailable")
+				else None,
+			}
+		)
+		date = add_days(date, 1)
+
+	return availability_data
+
+
+def get_next_available_date(practitioner, date, days=MAX_AVAILABILITY_RANGE_DAYS):
+	for i in range(1, days + 1):
+		next_date = add_days(date, i)
+		if get_practitioner_availability(practitioner, next_date).get("slot_details"):
+			return next_date
+
+
+def get_practitioner_availability(practitioner, date):
+	"""
+	Returns schedule slots and booked appointments per service unit of 'practitioner' on 'date'
+	as {"slot_details": [...]}, or {"unavailable": reason}, served from cache when possible
+	"""
+	date = getdate(date)
+	cache_key = get_availability_cache_key(date)
+	availability = frappe.cache().hget(cache_key, practitioner)
+
+	if availability is None:
+		availability = build_practitioner_availability(practitioner, date)
+		frappe.cache().hset(cache_key, practitioner, availability)
+		# cached dates are also invalidated explicitly, expiry only drops dates gone by
+		frappe.cache().expire(frappe.cache().make_key(cache_key), AVAILABILITY_CACHE_EXPIRY)
+
+	return availability
+
+
+def build_practitioner_availability(practitioner, date):
 	practitioner_doc = frappe.get_doc("Healthcare Practitioner", practitioner)
 
-	check_employee_wise_availability(date, practitioner_doc)
+	unavailable = get_employee_unavailability(date, practitioner_doc)
+	if unavailable:
+		return {"unavailable": unavailable}
 
-	if practitioner_doc.practitioner_schedules:
-		slot_details = get_available_slots(practitioner_doc, date)
-	else:
+	if not practitioner_doc.practitioner_schedules:
 		frappe.throw(
 			_(
 				"{0} does not have a Healthcare Practitioner Schedule. Add it in Healthcare Practitioner master"
@@ -585,29 +680,50 @@ def get_availability_data(date, practitioner, appointment):
 			title=_("Practitioner Schedule Not Found"),
 		)
 
+	slot_details = get_available_slots(practitioner_doc, date)
 	if not slot_details:
-		# TODO: return available slots in nearby dates
-		frappe.throw(
-			_("Healthcare Practitioner not available on {0}").format(weekday), title=_("Not Available")
-		)
+		return {"unavailable": "No Slots"}
 
-	if isinstance(appointment, str):
-		appointment = json.loads(appointment)
-		appointment = frappe.get_doc(appointment)
+	for slot_detail in slot_details:
+		slot_detail["avail_slot"] = [time_slot.as_dict() for time_slot in slot_detail["avail_slot"]]
 
-	fee_validity = "Disabled"
-	if frappe.db.get_single_value("Healthcare Settings", "enable_free_follow_ups"):
-		fee_validity = check_fee_validity(appointment, date, practitioner)
-		if not fee_validity and not appointment.get("__islocal"):
-			fee_validity = get_fee_validity(appointment.get("name"), date) or None
+	return {"slot_details": slot_details}
 
-	if appointment.invoiced:
-		fee_validity = "Disabled"
 
-	return {"slot_details": slot_details, "fee_validity": fee_validity}
+def get_unavailability_message(reason, practitioner, date):
+	if reason == "Holiday":
+		return _("{0} is a holiday").format(date)
+	elif reason == "Half Day Leave":
+		return _("{0} is on a Half day Leave on {1}").format(practitioner, date)
+	elif reason == "Leave":
+		return _("{0} is on Leave on {1}").format(practitioner, date)
+
+	return _("Healthcare Practitioner not available on {0}").format(date.strftime("%A"))
+
+
+def get_availability_cache_key(date):
+	return f"{AVAILABILITY_CACHE_KEY}::{getdate(date)}"
+
+
+def clear_availability_cache(doc=None, method=None):
+	"""Drop cached availability of all practitioners, schedules, holidays or leaves have changed"""
+	frappe.cache().delete_keys(AVAILABILITY_CACHE_KEY)
+
+
+def clear_availability_cache_for_dates(*dates):
+	for cache_date in {getdate(date) for date in dates if date}:
+		frappe.cache().delete_value(get_availability_cache_key(cache_date))
 
 
 def check_employee_wise_availability(date, practitioner_doc):
+	unavailable = get_employee_unavailability(date, practitioner_doc)
+	if unavailable:
+		frappe.throw(
+			get_unavailability_message(unavailable, practitioner_doc.name, date), title=_("Not Available")
+		)
+
+
+def get_employee_unavailability(date, practitioner_doc):
 	employee = None
 	if practitioner_doc.employee:
 		employee = practitioner_doc.employee
@@ -617,7 +733,7 @@ def check_employee_wise_availability(date, practitioner_doc):
 	if employee:
 		# check holiday
 		if is_holiday(employee, date):
-			frappe.throw(_("{0} is a holiday".format(date)), title=_("Not Available"))
+			return "Holiday"
 
 		# check leave status
 		if "hrms" in frappe.get_installed_apps():
@@ -629,15 +745,7 @@ def check_employee_wise_availability(date, practitioner_doc):
 				as_dict=True,
 			)
 			if leave_record:
-				if leave_record[0].half_day:
-					frappe.throw(
-						_("{0} is on a Half day Leave on {1}").format(practitioner_doc.name, date),
-						title=_("Not Available"),
-					)
-				else:
-					frappe.throw(
-						_("{0} is on Leave on {1}").format(practitioner_doc.name, date), title=_("Not Available")
-					)
+				return "Half Day Leave" if leave_record[0].half_day else "Leave"
 
 
 def get_available_slots(practitioner_doc, date):
@@ -732,6 +840,10 @@ def update_status(appointment_id, status):
 	if status == "Cancelled":
 		appointment_booked = False
 		cancel_appointment(appointment_id)
+		delete_appointment_occupancy(appointment_id)
+		clear_availability_cache_for_dates(
+			frappe.db.get_value("Patient Appointment", appointment_id, "appointment_date")
+		)
 
 	procedure_prescription = frappe.db.get_value(
 		"Patient Appointment", appointment_id, "procedure_prescription"
@@ -743,8 +855,9 @@ def update_status(appointment_id, status):
 
 
 def send_confirmation_msg(doc):
-	if frappe.db.get_single_value("Healthcare Settings", "send_appointment_confirmation"):
-		message = frappe.db.get_single_value("Healthcare Settings", "appointment_confirmation_msg")
+	settings = get_healthcare_settings()
+	if settings.send_appointment_confirmation:
+		message = settings.appointment_confirmation_msg
 		try:
 			send_message(doc, message)
 		except Exception:
@@ -777,28 +890,133 @@ def make_encounter(source_name, target_doc=None):
 
 
 def send_appointment_reminder():
-	if frappe.db.get_single_value("Healthcare Settings", "send_appointment_reminder"):
-		remind_before = datetime.datetime.strptime(
-			frappe.db.get_single_value("Healthcare Settings", "remind_before"), "%H:%M:%S"
-		)
-		reminder_dt = datetime.datetime.now() + datetime.timedelta(
-			hours=remind_before.hour, minutes=remind_before.minute, seconds=remind_before.second
+	"""
+	Claims appointments due for a reminder and hands the messages over to the short
+	queue in batches. Appointments are claimed by flipping `reminded` under a
+	SKIP LOCKED row lock, so overlapping scheduler ticks never pick the same
+	appointment and the scheduler worker never waits on the SMS gateway.
+	"""
+	settings = get_healthcare_settings()
+	if not settings.send_appointment_reminder or not settings.appointment_reminder_msg:
+		return
+
+	appointments = claim_due_appointments(get_reminder_datetime(settings.remind_before))
+	if not appointments:
+		return
+
+	template = get_reminder_template(settings.appointment_reminder_msg)
+	mobiles = dict(
+		frappe.get_all(
+			"Patient",
+			filters={"name": ("in", list({row.patient for row in appointments}))},
+			fields=["name", "mobile"],
+			as_list=True,
 		)
+	)
 
-		appointment_list = frappe.db.get_all(
-			"Patient Appointment",
+	messages = []
+	for appointment in appointments:
+		if not mobiles.get(appointment.patient):
+			continue
+		messages.append(
 			{
-				"appointment_datetime": ["between", (datetime.datetime.now(), reminder_dt)],
-				"reminded": 0,
-				"status": ["!=", "Cancelled"],
-			},
+				"appointment": appointment.name,
+				"receiver": mobiles[appointment.patient],
+				"message": template.render(get_reminder_context(appointment)),
+			}
 		)
 
-		for appointment in appointment_list:
-			doc = frappe.get_doc("Patient Appointment", appointment.name)
-			message = frappe.db.get_single_value("Healthcare Settings", "appointment_reminder_msg")
-			send_message(doc, message)
-			frappe.db.set_value("Patient Appointment", doc.name, "reminded", 1)
+	for i in range(0, len(messages), REMINDER_BATCH_SIZE):
+		frappe.enqueue(
+			"healthcare.healthcare.doctype.patient_appointment.patient_appointment.send_reminder_batch",
+			queue="short",
+			messages=messages[i : i + REMINDER_BATCH_SIZE],
+			enqueue_after_commit=True,
+		)
+
+
+def get_reminder_datetime(remind_before):
+	remind_before = get_time(remind_before or "00:00:00")
+	return datetime.datetime.now() + datetime.timedelta(
+		hours=remind_before.hour, minutes=remind_before.minute, seconds=remind_before.second
+	)
+
+
+def claim_due_appointments(reminder_dt):
+	"""Marks appointments due before `reminder_dt` as reminded and returns them"""
+	appointment = frappe.qb.DocType("Patient Appointment")
+	appointments = (
+		frappe.qb.from_(appointment)
+		.select("*")
+		.where(
+			appointment.appointment_datetime.between(datetime.datetime.now(), reminder_dt)
+			& (appointment.reminded == 0)
+			& (appointment.status != "Cancelled")
+		)
+		.for_update(skip_locked=True)
+		.run(as_dict=True)
+	)
+	if not appointments:
+		return []
+
+	(
+		frappe.qb.update(appointment)
+		.set(appointment.reminded, 1)
+		.where(appointment.name.isin([row.name for row in appointments]))
+	).run()
+
+	return appointments
+
+
+def get_reminder_template(message):
+	# same guard as frappe.render_template
+	if ".__" in message:
+		frappe.throw(_("Illegal template"))
+
+	return frappe.get_jenv().from_string(message)
+
+
+def get_reminder_context(appointment):
+	"""Same context as send_message, built from the claimed row without reloading it"""
+	doc = frappe.get_doc({**appointment, "doctype": "Patient Appointment"})
+	context = {"doc": doc, "alert": doc, "comments": None}
+	if doc.get("_comments"):
+		context["comments"] = json.loads(doc.get("_comments"))
+
+	return context
+
+
+def send_reminder_batch(messages):
+	"""
+	Sends reminder SMS at most REMINDER_RATE_LIMIT per second, retrying the failed
+	ones with backoff before logging them.
+	"""
+	for attempt in range(REMINDER_MAX_RETRIES + 1):
+		if attempt:
+			time.sleep(2**attempt)
+
+		failed = []
+		for message in messages:
+			sent_at = time.monotonic()
+			try:
+				send_sms([message["receiver"]], message["message"], success_msg=False)
+			except Exception:
+				failed.append(message)
+
+			wait = 1 / REMINDER_RATE_LIMIT - (time.monotonic() - sent_at)
+			if wait > 0:
+				time.sleep(wait)
+
+		messages = failed
+		if not messages:
+			return
+
+	frappe.log_error(
+		title=_("Appointment Reminder not sent"),
+		message=_("SMS not sent for Patient Appointments {0}, please check SMS Settings").format(
+			", ".join(message["appointment"] for message in messages)
+		),
+	)
 
 
 def send_message(doc, message):
@@ -892,13 +1110,103 @@ def get_prescribed_therapies(patient):
 	)
 
 
-def update_appointment_status():
-	# update the status of appointments daily
-	appointments = frappe.get_all(
-		"Patient Appointment", {"status": ("not in", ["Closed", "Cancelled", "Confirmed"])}
-	)
+def update_appointment_status(dry_run=False, chunk_size=1000):
+	"""
+	Daily rollover of appointment status based on appointment date, mirrors
+	PatientAppointment.set_status with one UPDATE per chunk of appointments
+	whose status actually changes. Chunks are committed as they go, so an
+	interrupted run is resumed by running it again.
+
+	:param dry_run: only count the appointments that would change
+	:return: dict of counts per target status and elapsed seconds
+	"""
+	started = time.monotonic()
+	appointment = frappe.qb.DocType("Patient Appointment")
+	summary = {}
+	notifications = get_status_change_notifications() if not dry_run else []
+
+	for status, condition in get_status_rollover_conditions(appointment, getdate()).items():
+		if dry_run:
+			summary[status] = (
+				frappe.qb.from_(appointment).select(Count(appointment.name)).where(condition).run()[0][0]
+			)
+			continue
+
+		summary[status] = 0
+		last_name = ""
+		while True:
+			appointments = (
+				frappe.qb.from_(appointment)
+				.select(appointment.name, appointment.status)
+				.where(condition & (appointment.name > last_name))
+				.orderby(appointment.name)
+				.limit(chunk_size)
+				.run(as_dict=True)
+			)
+			if not appointments:
+				break
+
+			(
+				frappe.qb.update(appointment)
+				.set(appointment.status, status)
+				.set(appointment.modified, now())
+				.set(appointment.modified_by, frappe.session.user)
+				.where(appointment.name.isin([row.name for row in appointments]))
+			).run()
+			send_status_change_notifications(appointments, notifications)
+
+			if not frappe.flags.in_test:
+				frappe.db.commit()
+
+			summary[status] += len(appointments)
+			last_name = appointments[-1].name
+
+	summary["elapsed"] = round(time.monotonic() - started, 3)
+	return summary
+
+
+def get_status_rollover_conditions(appointment, today):
+	# statuses never changed by the rollover, same as set_status
+	fixed = ["Closed", "Cancelled", "Confirmed"]
+
+	return {
+		"Open": (appointment.appointment_date == today)
+		& appointment.status.notin(fixed + ["Checked In", "Checked Out", "Open"]),
+		"Scheduled": (appointment.appointment_date > today)
+		& appointment.status.notin(fixed + ["Scheduled"]),
+		"No Show": (appointment.appointment_date < today) & appointment.status.notin(fixed + ["No Show"]),
+	}
+
+
+def get_status_change_notifications():
+	"""Enabled Notifications that fire on Patient Appointment status change"""
+	return [
+		frappe.get_cached_doc("Notification", notification)
+		for notification in frappe.get_all(
+			"Notification",
+			filters={
+				"document_type": "Patient Appointment",
+				"event": "Value Change",
+				"value_changed": "status",
+				"enabled": 1,
+			},
+			pluck="name",
+		)
+	]
+
+
+def send_status_change_notifications(appointments, notifications):
+	"""
+	The rollover bypasses document events, evaluate status change Notifications
+	for the updated appointments, documents are only loaded if there are any
+	"""
+	if not notifications:
+		return
+
+	from frappe.email.doctype.notification.notification import evaluate_alert
 
 	for appointment in appointments:
-		appointment_doc = frappe.get_doc("Patient Appointment", appointment.name)
-		appointment_doc.set_status()
-		appointment_doc.save()
+		doc = frappe.get_doc("Patient Appointment", appointment.name)
+		doc._doc_before_save = frappe._dict(status=appointment.status)
+		for notification in notifications:
+			evaluate_alert(doc, notification, "Value Change")
@@ -4,6 +4,7 @@
 
 
 import datetime
+from unittest.mock import patch
 
 import frappe
 from frappe.tests import IntegrationTestCase
@@ -14,8 +15,12 @@ from erpnext.accounts.doctype.pos_profile.test_pos_profile import make_pos_profi
 from healthcare.healthcare.doctype.patient_appointment.patient_appointment import (
 	check_is_new_patient,
 	check_payment_reqd,
+	get_availability_data_for_range,
+	get_practitioner_availability,
 	invoice_appointment,
 	make_encounter,
+	send_appointment_reminder,
+	update_appointment_status,
 	update_status,
 )
 
@@ -570,6 +575,104 @@ class TestPatientAppointment(IntegrationTestCase):
 		# different pracititoner can have multiple same time and date appointments for different patients
 		self.assertTrue(appointment_2.name)
 
+	def test_appointment_status_rollover(self):
+		patient, practitioner = create_healthcare_docs()
+		frappe.db.set_single_value("Healthcare Settings", "show_payment_popup", 0)
+		appointment = create_appointment(patient, practitioner, add_days(nowdate(), 2))
+		self.assertEqual(appointment.status, "Scheduled")
+
+		# appointment date has passed
+		frappe.db.set_value(
+			"Patient Appointment", appointment.name, "appointment_date", add_days(nowdate(), -1)
+		)
+
+		summary = update_appointment_status(dry_run=True)
+		self.assertEqual(summary["No Show"], 1)
+		self.assertEqual(
+			frappe.db.get_value("Patient Appointment", appointment.name, "status"), "Scheduled"
+		)
+
+		summary = update_appointment_status(chunk_size=1)
+		self.assertEqual(summary["No Show"], 1)
+		self.assertEqual(frappe.db.get_value("Patient Appointment", appointment.name, "status"), "No Show")
+
+		# nothing left to change
+		self.assertEqual(update_appointment_status(dry_run=True)["No Show"], 0)
+
+	def test_availability_cache(self):
+		patient, practitioner = create_healthcare_docs()
+		service_unit = create_service_unit(id=0)
+		add_practitioner_schedule(practitioner, service_unit)
+		appointment_date = add_days(nowdate(), 1)
+
+		availability = get_practitioner_availability(practitioner, appointment_date)
+		self.assertEqual(len(availability["slot_details"]), 1)
+		self.assertFalse(availability["slot_details"][0]["appointments"])
+
+		# booking invalidates cached availability of the day
+		appointment = create_appointment(
+			patient,
+			practitioner,
+			appointment_date,
+			service_unit=service_unit,
+			appointment_time="09:00:00",
+		)
+		availability = get_practitioner_availability(practitioner, appointment_date)
+		self.assertEqual(
+			[booked.name for booked in availability["slot_details"][0]["appointments"]],
+			[appointment.name],
+		)
+
+		update_status(appointment.name, "Cancelled")
+		availability = get_practitioner_availability(practitioner, appointment_date)
+		self.assertFalse(availability["slot_details"][0]["appointments"])
+
+		availability_data = get_availability_data_for_range(
+			practitioner, appointment_date, add_days(appointment_date, 6)
+		)
+		self.assertEqual(len(availability_data), 7)
+		self.assertTrue(all(day["slot_details"] for day in availability_data))
+
+	def test_appointment_reminder(self):
+		patient, practitioner = create_healthcare_docs()
+		frappe.db.set_value("Patient", patient, "mobile", "+911234567890")
+		settings = frappe.get_single("Healthcare Settings")
+		settings.send_appointment_reminder = 1
+		settings.remind_before = "01:00:00"
+		settings.appointment_reminder_msg = "Hello {{ doc.patient }}, see {{ doc.practitioner }}"
+		settings.save(ignore_permissions=True)
+
+		appointment = create_appointment(patient, practitioner, nowdate())
+		frappe.db.set_value(
+			"Patient Appointment",
+			appointment.name,
+			"appointment_datetime",
+			now_datetime() + datetime.timedelta(minutes=30),
+		)
+
+		with patch("frappe.enqueue") as enqueue:
+			send_appointment_reminder()
+			self.assertEqual(enqueue.call_count, 1)
+			messages = enqueue.call_args.kwargs["messages"]
+			self.assertEqual(
+				messages,
+				[
+					{
+						"appointment": appointment.name,
+						"receiver": "+911234567890",
+						"message": f"Hello {patient}, see {practitioner}",
+					}
+				],
+			)
+			self.assertEqual(frappe.db.get_value("Patient Appointment", appointment.name, "reminded"), 1)
+
+			# already claimed, not sent again by the next tick
+			send_appointment_reminder()
+			self.assertEqual(enqueue.call_count, 1)
+
+		settings.send_appointment_reminder = 0
+		settings.save(ignore_permissions=True)
+
 
 def create_healthcare_docs(id=0):
 	patient = create_patient(id)
@@ -811,3 +914,29 @@ def test_appointment_reschedule(self, appointment):
 def test_appointment_cancel(self, appointment):
 	update_status(appointment.name, "Cancelled")
 	self.assertTrue(frappe.db.exists("Event", {"name": appointment.event, "status": "Cancelled"}))
+
+
+def add_practitioner_schedule(practitioner, service_unit):
+	schedule_name = "_Test Availability Schedule"
+	if not frappe.db.exists("Practitioner Schedule", schedule_name):
+		schedule = frappe.new_doc("Practitioner Schedule")
+		schedule.schedule_name = schedule_name
+		for day in ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]:
+			schedule.append(
+				"time_slots",
+				{
+					"day": day,
+					"from_time": "09:00:00",
+					"to_time": "12:00:00",
+					"duration": 15,
+					"maximum_appointments": 0,
+				},
+			)
+		schedule.save(ignore_permissions=True)
+
+	practitioner = frappe.get_doc("Healthcare Practitioner", practitioner)
+	practitioner.set("practitioner_schedules", [])
+	practitioner.append(
+		"practitioner_schedules", {"schedule": schedule_name, "service_unit": service_unit}
+	)
+	practitioner.save(ignore_permissions=True)
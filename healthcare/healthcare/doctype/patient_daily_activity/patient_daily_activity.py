@@ -0,0 +1,202 @@
+# Copyright (c) 2026, earthians Health Informatics Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+"""
+Per patient, per day activity counters.
+
+Medical records (by communication date) and submitted Therapy Sessions (by creation
+date) are counted as the documents are created and removed, so that the patient
+progress heatmap and therapy counters read a handful of rows instead of grouping the
+patient's whole history on every page load.
+"""
+
+import frappe
+from frappe.model.document import Document
+from frappe.query_builder.functions import Count, Date
+from frappe.utils import getdate, now
+
+ACTIVITY_FIELDS = ["medical_records", "therapy_sessions"]
+INSERT_FIELDS = [
+	"name",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"patient",
+	"activity_date",
+	*ACTIVITY_FIELDS,
+]
+
+
+class PatientDailyActivity(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique(
+		"Patient Daily Activity",
+		["patient", "activity_date"],
+		constraint_name="unique_patient_activity_date",
+	)
+
+
+def update_patient_activity(patient, activity_date, field, delta=1):
+	"""Adds `delta` to the `field` counter of the patient's day"""
+	if not patient or not activity_date:
+		return
+
+	activity_date = getdate(activity_date)
+	name = frappe.db.get_value(
+		"Patient Daily Activity", {"patient": patient, "activity_date": activity_date}
+	)
+	if not name:
+		if delta <= 0:
+			return
+		try:
+			insert_activity_rows({(patient, activity_date): {field: delta}})
+			return
+		except Exception as e:
+			# inserted by a concurrent request
+			if not frappe.db.is_duplicate_entry(e):
+				raise
+			name = frappe.db.get_value(
+				"Patient Daily Activity", {"patient": patient, "activity_date": activity_date}
+			)
+
+	activity = frappe.qb.DocType("Patient Daily Activity")
+	(
+		frappe.qb.update(activity)
+		.set(activity[field], activity[field] + delta)
+		.set(activity.modified, now())
+		.where(activity.name == name)
+	).run()
+
+
+def insert_activity_rows(activity):
+	"""Inserts a dict like { (patient, activity_date): { field: count } }"""
+	timestamp = now()
+	rows = [
+		(
+			frappe.generate_hash(length=10),
+			timestamp,
+			timestamp,
+			frappe.session.user,
+			frappe.session.user,
+			patient,
+			activity_date,
+			*[counts.get(field, 0) for field in ACTIVITY_FIELDS],
+		)
+		for (patient, activity_date), counts in activity.items()
+	]
+	if rows:
+		frappe.db.bulk_insert("Patient Daily Activity", INSERT_FIELDS, rows)
+
+
+def get_patient_activity(patient, from_date=None, to_date=None, field="medical_records"):
+	"""Returns a list of (activity_date, count) of the patient's days with `field` activity"""
+	activity = frappe.qb.DocType("Patient Daily Activity")
+	query = (
+		frappe.qb.from_(activity)
+		.select(activity.activity_date, activity[field])
+		.where((activity.patient == patient) & (activity[field] > 0))
+		.orderby(activity.activity_date)
+	)
+	if from_date:
+		query = query.where(activity.activity_date >= from_date)
+	if to_date:
+		query = query.where(activity.activity_date <= to_date)
+
+	return query.run()
+
+
+def get_source_activity(patients):
+	"""Counts the activity of `patients` from Patient Medical Record and Therapy Session"""
+	record = frappe.qb.DocType("Patient Medical Record")
+	session = frappe.qb.DocType("Therapy Session")
+	activity = {}
+
+	for patient, activity_date, count in (
+		frappe.qb.from_(record)
+		.select(record.patient, record.communication_date, Count("*"))
+		.where(record.patient.isin(patients) & record.communication_date.isnotnull())
+		.groupby(record.patient, record.communication_date)
+		.run()
+	):
+		activity.setdefault((patient, getdate(activity_date)), {})["medical_records"] = count
+
+	for patient, activity_date, count in (
+		frappe.qb.from_(session)
+		.select(session.patient, Date(session.creation), Count("*"))
+		.where(session.patient.isin(patients) & (session.docstatus == 1))
+		.groupby(session.patient, Date(session.creation))
+		.run()
+	):
+		activity.setdefault((patient, getdate(activity_date)), {})["therapy_sessions"] = count
+
+	return activity
+
+
+def get_stored_activity(patients):
+	activity = frappe.qb.DocType("Patient Daily Activity")
+	return {
+		(row.patient, getdate(row.activity_date)): {field: row[field] for field in ACTIVITY_FIELDS}
+		for row in frappe.qb.from_(activity)
+		.select(activity.patient, activity.activity_date, *ACTIVITY_FIELDS)
+		.where(activity.patient.isin(patients))
+		.run(as_dict=True)
+	}
+
+
+def iter_patient_chunks(patients=None, chunk_size=500):
+	if patients:
+		for i in range(0, len(patients), chunk_size):
+			yield patients[i : i + chunk_size]
+		return
+
+	last_name = ""
+	while True:
+		chunk = frappe.get_all(
+			"Patient",
+			filters={"name": (">", last_name)},
+			order_by="name",
+			limit=chunk_size,
+			pluck="name",
+		)
+		if not chunk:
+			break
+		yield chunk
+		last_name = chunk[-1]
+
+
+def rebuild_patient_activity(patients=None, chunk_size=500):
+	"""Backfill, rebuilds the counters of `patients` (all if not set) from their documents"""
+	for chunk in iter_patient_chunks(patients, chunk_size):
+		frappe.db.delete("Patient Daily Activity", {"patient": ("in", chunk)})
+		insert_activity_rows(get_source_activity(chunk))
+
+
+def check_patient_activity(patients=None, chunk_size=500):
+	"""
+	Compares the counters of `patients` (all if not set) with their documents
+
+	:return: list of mismatches like { patient, activity_date, field, expected, actual }
+	"""
+	mismatches = []
+	for chunk in iter_patient_chunks(patients, chunk_size):
+		expected, stored = get_source_activity(chunk), get_stored_activity(chunk)
+		for key in sorted(set(expected) | set(stored)):
+			for field in ACTIVITY_FIELDS:
+				expected_count = expected.get(key, {}).get(field, 0)
+				actual_count = stored.get(key, {}).get(field, 0)
+				if expected_count != actual_count:
+					mismatches.append(
+						frappe._dict(
+							patient=key[0],
+							activity_date=key[1],
+							field=field,
+							expected=expected_count,
+							actual=actual_count,
+						)
+					)
+
+	return mismatches
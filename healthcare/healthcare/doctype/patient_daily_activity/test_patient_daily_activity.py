@@ -0,0 +1,65 @@
+# Copyright (c) 2026, earthians Health Informatics Pvt. Ltd. and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests import IntegrationTestCase
+from frappe.utils import add_days, getdate, nowdate
+
+from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
+	create_patient,
+)
+from healthcare.healthcare.doctype.patient_daily_activity.patient_daily_activity import (
+	check_patient_activity,
+	get_patient_activity,
+	rebuild_patient_activity,
+)
+from healthcare.healthcare.page.patient_progress.patient_progress import get_patient_heatmap_data
+
+
+class TestPatientDailyActivity(IntegrationTestCase):
+	def test_activity_maintained_by_medical_records(self):
+		patient = create_patient()
+		frappe.db.delete("Patient Medical Record", {"patient": patient})
+		rebuild_patient_activity([patient])
+
+		records = [create_medical_record(patient, nowdate()) for i in range(3)]
+		create_medical_record(patient, add_days(nowdate(), -10))
+		self.assertEqual(
+			get_patient_activity(patient),
+			((getdate(add_days(nowdate(), -10)), 1), (getdate(), 3)),
+		)
+		self.assertEqual(sorted(get_patient_heatmap_data(patient, nowdate()).values()), [1, 3])
+
+		# moved to another day
+		records[0].communication_date = add_days(nowdate(), -10)
+		records[0].save()
+		frappe.delete_doc("Patient Medical Record", records[1].name)
+		self.assertEqual(
+			get_patient_activity(patient),
+			((getdate(add_days(nowdate(), -10)), 2), (getdate(), 1)),
+		)
+		self.assertFalse(check_patient_activity([patient]))
+
+	def test_rebuild_and_check(self):
+		patient = create_patient()
+		create_medical_record(patient, nowdate())
+		frappe.db.delete("Patient Daily Activity", {"patient": patient})
+
+		mismatches = check_patient_activity([patient])
+		self.assertTrue(any(row.field == "medical_records" for row in mismatches))
+
+		rebuild_patient_activity([patient])
+		self.assertFalse(check_patient_activity([patient]))
+
+
+def create_medical_record(patient, communication_date):
+	return frappe.get_doc(
+		{
+			"doctype": "Patient Medical Record",
+			"patient": patient,
+			"status": "Open",
+			"subject": "_Test Patient Activity",
+			"communication_date": communication_date,
+			"reference_doctype": "Patient Medical Record",
+		}
+	).insert(ignore_permissions=True)
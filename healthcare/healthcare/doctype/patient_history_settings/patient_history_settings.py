@@ -10,7 +10,10 @@ from frappe import _
 from frappe.model.document import Document
 from frappe.utils import cint, cstr
 
-from healthcare.healthcare.page.patient_history.patient_history import get_patient_history_doctypes
+TRACKED_DOCTYPES_CACHE_KEY = "patient_history_tracked_doctypes"
+
+# doctype: (settings version and language, SubjectRenderer)
+_subject_renderers = {}
 
 
 class PatientHistorySettings(Document):
@@ -18,6 +21,11 @@ class PatientHistorySettings(Document):
 		self.validate_submittable_doctypes()
 		self.validate_date_fieldnames()
 
+	def on_update(self):
+		frappe.cache().delete_value(TRACKED_DOCTYPES_CACHE_KEY)
+		# readers may cache the committed state again before this transaction commits
+		frappe.db.after_commit.add(lambda: frappe.cache().delete_value(TRACKED_DOCTYPES_CACHE_KEY))
+
 	def validate_submittable_doctypes(self):
 		for entry in self.custom_doctypes:
 			if not cint(frappe.db.get_value("DocType", entry.document_type, "is_submittable")):
@@ -79,20 +87,7 @@ def create_medical_record(doc, method=None):
 	if not medical_record_required:
 		return
 
-	if frappe.db.exists("Patient Medical Record", {"reference_name": doc.name}):
-		return
-
-	subject = set_subject_field(doc)
-	date_field = get_date_field(doc.doctype)
-	medical_record = frappe.new_doc("Patient Medical Record")
-	medical_record.patient = doc.patient
-	medical_record.subject = subject
-	medical_record.status = "Open"
-	medical_record.communication_date = doc.get(date_field)
-	medical_record.reference_doctype = doc.doctype
-	medical_record.reference_name = doc.name
-	medical_record.reference_owner = doc.owner
-	medical_record.save(ignore_permissions=True)
+	enqueue_medical_record(doc)
 
 
 def update_medical_record(doc, method=None):
@@ -100,13 +95,7 @@ def update_medical_record(doc, method=None):
 	if not medical_record_required:
 		return
 
-	medical_record_id = frappe.db.exists("Patient Medical Record", {"reference_name": doc.name})
-
-	if medical_record_id:
-		subject = set_subject_field(doc)
-		frappe.db.set_value("Patient Medical Record", medical_record_id, "subject", subject)
-	else:
-		create_medical_record(doc)
+	enqueue_medical_record(doc)
 
 
 def delete_medical_record(doc, method=None):
@@ -119,80 +108,146 @@ def delete_medical_record(doc, method=None):
 		frappe.delete_doc("Patient Medical Record", record, force=1)
 
 
+def enqueue_medical_record(doc):
+	# rendering the subject is left out of the submit request
+	frappe.enqueue(
+		"healthcare.healthcare.doctype.patient_history_settings.patient_history_settings.make_medical_record",
+		queue="short",
+		enqueue_after_commit=True,
+		now=frappe.flags.in_test,
+		doctype=doc.doctype,
+		docname=doc.name,
+	)
+
+
+def make_medical_record(doctype, docname):
+	"""Creates or updates the Patient Medical Record of a submitted document"""
+	doc = frappe.get_doc(doctype, docname)
+	if doc.docstatus != 1:
+		return
+
+	medical_record_id = frappe.db.exists("Patient Medical Record", {"reference_name": doc.name})
+	if medical_record_id:
+		subject = set_subject_field(doc)
+		frappe.db.set_value("Patient Medical Record", medical_record_id, "subject", subject)
+		return
+
+	medical_record = frappe.new_doc("Patient Medical Record")
+	medical_record.patient = doc.patient
+	medical_record.subject = set_subject_field(doc)
+	medical_record.status = "Open"
+	medical_record.communication_date = doc.get(get_date_field(doc.doctype))
+	medical_record.reference_doctype = doc.doctype
+	medical_record.reference_name = doc.name
+	medical_record.reference_owner = doc.owner
+	medical_record.save(ignore_permissions=True)
+
+
 def set_subject_field(doc):
-	from frappe.utils.formatters import format_value
+	return get_subject_renderer(doc.doctype).render(doc)
 
-	meta = frappe.get_meta(doc.doctype)
-	subject = ""
-	patient_history_fields = get_patient_history_fields(doc)
 
-	for entry in patient_history_fields:
-		fieldname = entry.get("fieldname")
-		if entry.get("fieldtype") == "Table" and doc.get(fieldname):
-			formatted_value = get_formatted_value_for_table_field(
-				doc.get(fieldname), meta.get_field(fieldname)
-			)
-			subject += frappe.bold(_(entry.get("label")) + ":") + "<br>" + cstr(formatted_value) + "<br>"
+def get_subject_renderer(doctype):
+	"""Returns the SubjectRenderer of `doctype`, compiled once per settings change and language"""
+	tracked = get_tracked_doctypes().get(doctype, {})
+	version = (tracked.get("version"), frappe.local.lang)
 
-		else:
-			if doc.get(fieldname):
-				formatted_value = format_value(doc.get(fieldname), meta.get_field(fieldname), doc)
-				subject += frappe.bold(_(entry.get("label")) + ":") + cstr(formatted_value) + "<br>"
+	cached = _subject_renderers.get(doctype)
+	if not cached or cached[0] != version:
+		cached = (version, SubjectRenderer(doctype, tracked.get("selected_fields") or []))
+		_subject_renderers[doctype] = cached
 
-	return subject
+	return cached[1]
 
 
-def get_date_field(doctype):
-	dt = get_patient_history_config_dt(doctype)
+class SubjectRenderer:
+	"""Renders the Patient Medical Record subject of a document from the selected fields"""
 
-	return frappe.db.get_value(dt, {"document_type": doctype}, "date_fieldname")
+	def __init__(self, doctype, selected_fields):
+		meta = frappe.get_meta(doctype)
+		self.fields = []
+		for entry in selected_fields:
+			df = meta.get_field(entry.get("fieldname"))
+			label = frappe.bold(_(entry.get("label")) + ":")
+			if entry.get("fieldtype") == "Table" and df:
+				columns = [cdf for cdf in frappe.get_meta(df.options).fields if cdf.in_list_view]
+				self.fields.append((entry.get("fieldname"), df, label + "<br>", columns))
+			else:
+				self.fields.append((entry.get("fieldname"), df, label, None))
 
+	def render(self, doc):
+		from frappe.utils.formatters import format_value
 
-def get_patient_history_fields(doc):
-	dt = get_patient_history_config_dt(doc.doctype)
-	patient_history_fields = frappe.db.get_value(
-		dt, {"document_type": doc.doctype}, "selected_fields"
-	)
+		buffer = []
+		for fieldname, df, label, columns in self.fields:
+			value = doc.get(fieldname)
+			if not value:
+				continue
 
-	if patient_history_fields:
-		return json.loads(patient_history_fields)
+			buffer.append(label)
+			if columns is not None:
+				render_table(value, columns, buffer)
+			else:
+				buffer.append(cstr(format_value(value, df, doc)))
+			buffer.append("<br>")
 
+		return "".join(buffer)
 
-def get_formatted_value_for_table_field(items, df):
-	child_meta = frappe.get_meta(df.options)
 
-	table_head = ""
-	table_row = ""
-	html = ""
-	create_head = True
+def render_table(items, columns, buffer):
+	buffer.append("<table class='table table-condensed table-bordered'>")
+	buffer.extend("<td>" + cdf.label + "</td>" for cdf in columns)
 	for item in items:
-		table_row += "<tr>"
-		for cdf in child_meta.fields:
-			if cdf.in_list_view:
-				if create_head:
-					table_head += "<td>" + cdf.label + "</td>"
-				if item.get(cdf.fieldname):
-					table_row += "<td>" + str(item.get(cdf.fieldname)) + "</td>"
-				else:
-					table_row += "<td></td>"
-		create_head = False
-		table_row += "</tr>"
-
-	html += (
-		"<table class='table table-condensed table-bordered'>" + table_head + table_row + "</table>"
-	)
+		buffer.append("<tr>")
+		for cdf in columns:
+			value = item.get(cdf.fieldname)
+			buffer.append("<td>" + str(value) + "</td>" if value else "<td></td>")
+		buffer.append("</tr>")
+	buffer.append("</table>")
 
-	return html
 
+def get_date_field(doctype):
+	return get_tracked_doctypes().get(doctype, {}).get("date_fieldname")
 
-def get_patient_history_config_dt(doctype):
-	if frappe.db.get_value("DocType", doctype, "custom"):
-		return "Patient History Custom Document Type"
-	else:
-		return "Patient History Standard Document Type"
+
+def get_patient_history_fields(doc):
+	return get_tracked_doctypes().get(doc.doctype, {}).get("selected_fields")
+
+
+def get_tracked_doctypes():
+	"""
+	Returns a dict like { document_type: { date_fieldname, selected_fields, version } } of
+	the document types configured in Patient History Settings
+	"""
+	tracked_doctypes = frappe.cache().get_value(TRACKED_DOCTYPES_CACHE_KEY)
+	if tracked_doctypes is not None:
+		return tracked_doctypes
+
+	# compiled subject renderers are rebuilt when the version changes
+	version = frappe.generate_hash(length=10)
+	tracked_doctypes = {}
+	for dt in ["Patient History Standard Document Type", "Patient History Custom Document Type"]:
+		for entry in frappe.get_all(
+			dt,
+			filters={"parenttype": "Patient History Settings"},
+			fields=["document_type", "date_fieldname", "selected_fields"],
+			order_by="idx",
+		):
+			selected_fields = entry.selected_fields and json.loads(entry.selected_fields)
+			tracked_doctypes[entry.document_type] = {
+				"date_fieldname": entry.date_fieldname,
+				"selected_fields": selected_fields,
+				"version": version,
+			}
+
+	frappe.cache().set_value(TRACKED_DOCTYPES_CACHE_KEY, tracked_doctypes)
+	return tracked_doctypes
 
 
 def validate_medical_record_required(doc):
+	if doc.doctype not in get_tracked_doctypes():
+		return False
+
 	if (
 		frappe.flags.in_patch
 		or frappe.flags.in_install
@@ -201,9 +256,6 @@ def validate_medical_record_required(doc):
 	):
 		return False
 
-	if doc.doctype not in get_patient_history_doctypes():
-		return False
-
 	return True
 
 
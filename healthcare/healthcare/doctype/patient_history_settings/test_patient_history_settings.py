@@ -12,6 +12,12 @@ from frappe.utils import getdate, strip_html
 from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
 	create_patient,
 )
+from healthcare.healthcare.doctype.patient_history_settings.patient_history_settings import (
+	SubjectRenderer,
+	get_subject_renderer,
+	get_tracked_doctypes,
+	validate_medical_record_required,
+)
 
 
 class TestPatientHistorySettings(IntegrationTestCase):
@@ -52,6 +58,33 @@ class TestPatientHistorySettings(IntegrationTestCase):
 		self.assertEqual(medical_rec.patient, patient)
 		self.assertEqual(medical_rec.communication_date, getdate())
 
+	def test_tracked_doctypes(self):
+		self.assertEqual(get_tracked_doctypes()["Test Patient Feedback"]["date_fieldname"], "date")
+
+		# untracked document types are skipped without a query
+		todo = frappe.new_doc("ToDo")
+		with self.assertQueryCount(0):
+			self.assertFalse(validate_medical_record_required(todo))
+
+	def test_subject_renderer(self):
+		self.assertIs(
+			get_subject_renderer("Test Patient Feedback"), get_subject_renderer("Test Patient Feedback")
+		)
+
+		encounter = frappe.new_doc("Patient Encounter")
+		for i in range(200):
+			encounter.append("drug_prescription", {"drug_name": f"_Test Drug {i}", "dosage": "1-0-1"})
+
+		renderer = SubjectRenderer(
+			"Patient Encounter",
+			[{"label": "Drug Prescription", "fieldname": "drug_prescription", "fieldtype": "Table"}],
+		)
+		with self.assertQueryCount(0):
+			subject = renderer.render(encounter)
+
+		self.assertEqual(subject.count("<tr>"), 200)
+		self.assertIn("<td>_Test Drug 199</td>", subject)
+
 
 def create_custom_doctype():
 	if not frappe.db.exists("DocType", "Test Patient Feedback"):
@@ -6,8 +6,37 @@
 import frappe
 from frappe.model.document import Document
 
+from healthcare.healthcare.doctype.patient_daily_activity.patient_daily_activity import (
+	update_patient_activity,
+)
+
 
 class PatientMedicalRecord(Document):
 	def after_insert(self):
 		if self.reference_doctype == "Patient Medical Record":
 			frappe.db.set_value("Patient Medical Record", self.name, "reference_name", self.name)
+
+		update_patient_activity(self.patient, self.communication_date, "medical_records")
+
+	def on_update(self):
+		if self.flags.in_insert:
+			return
+
+		before = self.get_doc_before_save()
+		if before and (
+			before.patient != self.patient
+			or str(before.communication_date) != str(self.communication_date)
+		):
+			update_patient_activity(before.patient, before.communication_date, "medical_records", -1)
+			update_patient_activity(self.patient, self.communication_date, "medical_records")
+
+	def on_trash(self):
+		update_patient_activity(self.patient, self.communication_date, "medical_records", -1)
+
+
+def on_doctype_update():
+	frappe.db.add_index(
+		"Patient Medical Record",
+		["patient", "communication_date", "name"],
+		index_name="patient_communication_date_name_index",
+	)
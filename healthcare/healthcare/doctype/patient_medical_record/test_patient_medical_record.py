@@ -15,6 +15,7 @@ from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment
 	create_healthcare_docs,
 	create_medical_department,
 )
+from healthcare.healthcare.page.patient_history.patient_history import get_feed, iter_feed
 
 
 class TestPatientMedicalRecord(IntegrationTestCase):
@@ -62,6 +63,62 @@ class TestPatientMedicalRecord(IntegrationTestCase):
 		)
 		self.assertTrue(medical_rec)
 
+	def test_feed_pagination(self):
+		patient = "_Test Feed Patient"
+		timestamp = frappe.utils.now()
+		frappe.db.bulk_insert(
+			"Patient Medical Record",
+			[
+				"name",
+				"creation",
+				"modified",
+				"owner",
+				"modified_by",
+				"patient",
+				"status",
+				"communication_date",
+				"reference_doctype",
+				"subject",
+			],
+			[
+				(
+					f"_Test Feed Record {i:03d}",
+					timestamp,
+					timestamp,
+					"Administrator",
+					"Administrator",
+					patient,
+					"Open",
+					add_days(nowdate(), -(i // 7)) if i % 10 else None,
+					"Vital Signs" if i % 2 else "Patient Encounter",
+					f"Record {i}",
+				)
+				for i in range(50)
+			],
+		)
+
+		# undated records are paged too, after the dated ones
+		feed = get_feed(patient, page_length=50)
+		expected = [record.name for record in feed]
+		self.assertEqual(len(expected), 50)
+		self.assertEqual([record.communication_date for record in feed[45:]], [None] * 5)
+
+		for start in (20, 40, 45, 60):
+			page = get_feed(patient, start=start, page_length=20)
+			self.assertEqual([record.name for record in page], expected[start : start + 20])
+
+		records = []
+		page = get_feed(patient, page_length=20)
+		while page:
+			records += [record.name for record in page]
+			page = get_feed(
+				patient, page_length=20, after=[page[-1].communication_date, page[-1].name]
+			)
+		self.assertEqual(records, expected)
+
+		chunks = list(iter_feed(patient, document_types=["Vital Signs"], chunk_size=10))
+		self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+
 
 def create_procedure(appointment):
 	if appointment:
@@ -5,8 +5,11 @@ frappe.ui.form.on('Sample Collection', {
 	onload: function(frm) {
 		frappe.realtime.on("observation_creation_progress", (status) => {
 			if (status == "Completed") {
+				frappe.hide_progress();
 				frm.reload_doc();
 				frappe.dom.unfreeze();
+			} else if (status && status.total) {
+				frappe.show_progress(__("Creating Observations"), status.progress, status.total);
 			}
 		})
 	},
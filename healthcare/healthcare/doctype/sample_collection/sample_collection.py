@@ -7,13 +7,19 @@ import json
 
 import frappe
 from frappe.model.document import Document
-from frappe.utils import now_datetime
+from frappe.query_builder import Case
+from frappe.utils import now, now_datetime
 
-from healthcare.healthcare.doctype.observation.observation import add_observation
+from healthcare.healthcare.doctype.observation.observation import (
+	make_observation,
+	preload_observation_links,
+)
 from healthcare.healthcare.doctype.observation_template.observation_template import (
 	get_observation_template_details,
 )
 
+OBSERVATION_BATCH_SIZE = 20
+
 
 class SampleCollection(Document):
 	def after_insert(self):
@@ -96,79 +102,87 @@ def insert_observation(selected, sample_collection, component_observations=None,
 		if component_observations and len(component_observations) > 0:
 			component_observations = json.loads(component_observations)
 		comp_obs_ref = create_specimen(sample_col_doc.get("patient"), selected, component_observations)
+
+		child_parent_observation = None
+		if child_name:
+			child_parent_observation = frappe.db.get_value(
+				"Observation Sample Collection", child_name, "component_observation_parent"
+			)
+
+		collection_date_time = now_datetime()
+		observations = []
+		# fields to set per Observation Sample Collection row
+		row_updates = {}
 		for i, obs in enumerate(selected):
 			parent_observation = obs.get("component_observation_parent")
+			reference_child = obs.get("reference_child") if obs.get("reference_child") else ""
 
 			if child_name:
-				parent_observation = frappe.db.get_value(
-					"Observation Sample Collection", child_name, "component_observation_parent"
-				)
+				parent_observation = child_parent_observation
 
 			if obs.get("status") == "Open":
 				# non has_component templates
 				if not obs.get("has_component") or obs.get("has_component") == 0:
-					observation = add_observation(
-						patient=sample_col_doc.get("patient"),
-						template=obs.get("observation_template"),
-						doc="Sample Collection",
-						docname=sample_collection,
-						parent=parent_observation,
-						specimen=comp_obs_ref.get(obs.get("name"))
-						or comp_obs_ref.get(i + 1)
-						or comp_obs_ref.get(obs.get("idx")),
-						invoice=sample_col_doc.get("reference_name"),
-						practitioner=sample_col_doc.get("referring_practitioner"),
-						child=obs.get("reference_child") if obs.get("reference_child") else "",
-						service_request=obs.get("service_request"),
-					)
-					if observation:
-						frappe.db.set_value(
-							"Observation Sample Collection",
-							obs.get("name"),
-							{
-								"status": "Collected",
-								"collection_date_time": now_datetime(),
-								"specimen": comp_obs_ref.get(obs.get("name")),
-							},
+					observations.append(
+						make_observation(
+							patient=sample_col_doc.get("patient"),
+							template=obs.get("observation_template"),
+							doc="Sample Collection",
+							docname=sample_collection,
+							parent=parent_observation,
+							specimen=comp_obs_ref.get(obs.get("name"))
+							or comp_obs_ref.get(i + 1)
+							or comp_obs_ref.get(obs.get("idx")),
+							invoice=sample_col_doc.get("reference_name"),
+							practitioner=sample_col_doc.get("referring_practitioner"),
+							child=reference_child,
+							service_request=obs.get("service_request"),
 						)
+					)
+					row_updates[obs.get("name")] = {
+						"status": "Collected",
+						"collection_date_time": collection_date_time,
+						"specimen": comp_obs_ref.get(obs.get("name")),
+					}
 				else:
 					# to deal the component template checked from main table and collected
 					if obs.get("component_observations"):
 						component_observations = json.loads(obs.get("component_observations"))
+						specimen = None
 						for j, comp in enumerate(component_observations):
-							observation = add_observation(
-								patient=sample_col_doc.get("patient"),
-								template=comp.get("observation_template"),
-								doc="Sample Collection",
-								docname=sample_collection,
-								parent=obs.get("component_observation_parent"),
-								specimen=comp_obs_ref.get(j + 1) or comp_obs_ref.get(obs.get("name")),
-								invoice=sample_col_doc.get("reference_name"),
-								practitioner=sample_col_doc.get("referring_practitioner"),
-								child=obs.get("reference_child") if obs.get("reference_child") else "",
-								service_request=obs.get("service_request"),
+							specimen = comp_obs_ref.get(j + 1) or comp_obs_ref.get(obs.get("name"))
+							observations.append(
+								make_observation(
+									patient=sample_col_doc.get("patient"),
+									template=comp.get("observation_template"),
+									doc="Sample Collection",
+									docname=sample_collection,
+									parent=obs.get("component_observation_parent"),
+									specimen=specimen,
+									invoice=sample_col_doc.get("reference_name"),
+									practitioner=sample_col_doc.get("referring_practitioner"),
+									child=reference_child,
+									service_request=obs.get("service_request"),
+								)
 							)
-							if observation:
-								comp["status"] = "Collected"
-								comp["collection_date_time"] = now_datetime()
-								comp["specimen"] = comp_obs_ref.get(j + 1) or comp_obs_ref.get(obs.get("name"))
+							comp["status"] = "Collected"
+							comp["collection_date_time"] = collection_date_time
+							comp["specimen"] = specimen
 
-						frappe.db.set_value(
-							"Observation Sample Collection",
-							obs.get("name"),
-							{
-								"collection_date_time": now_datetime(),
-								"component_observations": json.dumps(component_observations, default=str),
-								"status": "Collected",
-								"specimen": comp_obs_ref.get(j + 1) or comp_obs_ref.get(obs.get("name")),
-							},
-						)
+						row_updates[obs.get("name")] = {
+							"collection_date_time": collection_date_time,
+							"component_observations": json.dumps(
+								component_observations, default=str
+							),
+							"status": "Collected",
+							"specimen": specimen,
+						}
 			# to deal individually checked from component dialog
 			if component_observations:
 				for j, comp in enumerate(component_observations):
 					if comp.get("observation_template") == obs.get("observation_template"):
 						comp["status"] = "Collected"
-						comp["collection_date_time"] = now_datetime()
+						comp["collection_date_time"] = collection_date_time
 						comp["specimen"] = comp_obs_ref.get(j + 1)
 
 		child_db_set_dict = {"component_observations": json.dumps(component_observations, default=str)}
@@ -179,11 +193,11 @@ def insert_observation(selected, sample_collection, component_observations=None,
 			child_db_set_dict["status"] = "Collected"
 
 		if child_name:
-			frappe.db.set_value(
-				"Observation Sample Collection",
-				child_name,
-				child_db_set_dict,
-			)
+			row_updates.setdefault(child_name, {}).update(child_db_set_dict)
+
+		insert_observations(observations, sample_collection)
+		update_sample_collection_rows(row_updates)
+
 		if sample_collection:
 			non_collected_samples = frappe.db.get_all(
 				"Observation Sample Collection", {"parent": sample_collection, "status": ["!=", "Collected"]}
@@ -206,6 +220,41 @@ def insert_observation(selected, sample_collection, component_observations=None,
 	)
 
 
+def insert_observations(observations, sample_collection):
+	"""Inserts `observations` in batches, publishing the progress after each batch"""
+	preload_observation_links(observations)
+	for start in range(0, len(observations), OBSERVATION_BATCH_SIZE):
+		for observation in observations[start : start + OBSERVATION_BATCH_SIZE]:
+			observation.insert(ignore_permissions=True)
+
+		frappe.publish_realtime(
+			event="observation_creation_progress",
+			message={
+				"progress": min(start + OBSERVATION_BATCH_SIZE, len(observations)),
+				"total": len(observations),
+			},
+			doctype="Sample Collection",
+			docname=sample_collection,
+		)
+
+
+def update_sample_collection_rows(row_updates):
+	"""Sets the fields of many Observation Sample Collection rows, { row: { field: value } }"""
+	if not row_updates:
+		return
+
+	row = frappe.qb.DocType("Observation Sample Collection")
+	query = frappe.qb.update(row)
+	for fieldname in {field for fields in row_updates.values() for field in fields}:
+		value = Case()
+		for name, fields in row_updates.items():
+			if fieldname in fields:
+				value = value.when(row.name == name, fields[fieldname])
+		query = query.set(row[fieldname], value.else_(row[fieldname]))
+
+	query.set(row.modified, now()).where(row.name.isin(list(row_updates))).run()
+
+
 def create_specimen(patient, selected, component_observations):
 	groups = {}
 	# to group by
@@ -2,9 +2,51 @@
 # Copyright (c) 2015, ESS and Contributors
 # See license.txt
 
-
+import frappe
 from frappe.tests import IntegrationTestCase
 
+from healthcare.healthcare.doctype.observation.test_observation import create_sales_invoice
+from healthcare.healthcare.doctype.observation_template.test_observation_template import (
+	create_observation_template,
+)
+from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
+	create_patient,
+)
+from healthcare.healthcare.doctype.sample_collection.sample_collection import insert_observation
+
 
 class TestSampleCollection(IntegrationTestCase):
-	pass
+	def test_collect_samples(self):
+		frappe.db.set_single_value("Healthcare Settings", "create_observation_on_si_submit", 1)
+		patient = create_patient()
+		obs_template = create_observation_template("Total Cholesterol", 7, True)
+		sales_invoice = create_sales_invoice(patient, obs_template.name)
+		sample_collection = frappe.get_doc(
+			"Sample Collection", {"reference_name": sales_invoice.name}
+		)
+		rows = [row.as_dict() for row in sample_collection.observation_sample_collection]
+
+		insert_observation(frappe.as_json(rows), sample_collection.name)
+
+		observation = frappe.db.get_value(
+			"Observation",
+			{
+				"observation_template": obs_template.name,
+				"reference_docname": sample_collection.name,
+			},
+			["specimen", "permitted_data_type", "patient_name", "sales_invoice"],
+			as_dict=True,
+		)
+		self.assertTrue(observation.specimen)
+		self.assertEqual(observation.permitted_data_type, "Quantity")
+		self.assertEqual(
+			observation.patient_name, frappe.db.get_value("Patient", patient, "patient_name")
+		)
+		self.assertEqual(observation.sales_invoice, sales_invoice.name)
+
+		sample_collection.reload()
+		self.assertEqual(sample_collection.status, "Collected")
+		self.assertEqual(sample_collection.observation_sample_collection[0].status, "Collected")
+		self.assertEqual(
+			sample_collection.observation_sample_collection[0].specimen, observation.specimen
+		)
@@ -13,6 +13,9 @@ from frappe import _
 from frappe.utils import now_datetime
 
 from healthcare.controllers.service_request_controller import ServiceRequestController
+from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import (
+	get_healthcare_settings,
+)
 from healthcare.healthcare.doctype.observation.observation import add_observation
 from healthcare.healthcare.doctype.observation_template.observation_template import (
 	get_observation_template_details,
@@ -64,10 +67,10 @@ class ServiceRequest(ServiceRequestController):
 			self.staff_role = template.staff_role
 
 		if not self.intent:
-			self.intent = frappe.db.get_single_value("Healthcare Settings", "default_intent")
+			self.intent = get_healthcare_settings().default_intent
 
 		if not self.priority:
-			self.priority = frappe.db.get_single_value("Healthcare Settings", "default_priority")
+			self.priority = get_healthcare_settings().default_priority
 
 	def update_invoice_details(self, qty):
 		"""
@@ -113,7 +116,7 @@ def make_clinical_procedure(service_request):
 		service_request = frappe._dict(service_request)
 
 	if (
-		frappe.db.get_single_value("Healthcare Settings", "process_service_request_only_if_paid")
+		get_healthcare_settings().process_service_request_only_if_paid
 		and service_request.billing_status != "Invoiced"
 	):
 		frappe.throw(
@@ -145,7 +148,7 @@ def make_lab_test(service_request):
 		service_request = frappe._dict(service_request)
 
 	if (
-		frappe.db.get_single_value("Healthcare Settings", "process_service_request_only_if_paid")
+		get_healthcare_settings().process_service_request_only_if_paid
 		and service_request.billing_status != "Invoiced"
 	):
 		frappe.throw(
@@ -180,7 +183,7 @@ def make_therapy_session(service_request):
 		service_request = frappe._dict(service_request)
 
 	if (
-		frappe.db.get_single_value("Healthcare Settings", "process_service_request_only_if_paid")
+		get_healthcare_settings().process_service_request_only_if_paid
 		and service_request.billing_status != "Invoiced"
 	):
 		frappe.throw(
@@ -212,7 +215,7 @@ def make_observation(service_request):
 		service_request = frappe._dict(service_request)
 
 	if (
-		frappe.db.get_single_value("Healthcare Settings", "process_service_request_only_if_paid")
+		get_healthcare_settings().process_service_request_only_if_paid
 		and service_request.billing_status != "Invoiced"
 	):
 		frappe.throw(
@@ -4,12 +4,24 @@
 import frappe
 from frappe.model.document import Document
 
+from healthcare.healthcare.doctype.observation.observation import clear_observation_details_cache
+
 
 class Specimen(Document):
 	def before_insert(self):
-		patient_doc = frappe.get_doc("Patient", self.patient)
+		patient_doc = frappe.get_cached_doc("Patient", self.patient)
 		if patient_doc.dob:
 			self.patient_age = patient_doc.calculate_age().get("age_in_string")
 
 	def after_insert(self):
 		self.db_set("barcode", self.name)
+
+	def on_update(self):
+		# the received time is part of the cached observation details of the reports
+		clear_observation_details_cache(
+			frappe.get_all(
+				"Observation",
+				filters={"specimen": self.name},
+				fields=["parent_observation", "sales_invoice", "service_request"],
+			)
+		)
@@ -16,6 +16,9 @@ from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings impor
 	get_receivable_account,
 )
 from healthcare.healthcare.doctype.nursing_task.nursing_task import NursingTask
+from healthcare.healthcare.doctype.patient_daily_activity.patient_daily_activity import (
+	update_patient_activity,
+)
 from healthcare.healthcare.doctype.service_request.service_request import (
 	update_service_request_status,
 )
@@ -47,6 +50,7 @@ class TherapySession(Document):
 			frappe.db.set_value("Service Request", self.service_request, "status", "active-Request Status")
 
 		self.update_sessions_count_in_therapy_plan(on_cancel=True)
+		update_patient_activity(self.patient, self.creation, "therapy_sessions", -1)
 
 	def validate_duplicate(self):
 		end_time = datetime.datetime.combine(
@@ -88,6 +92,7 @@ class TherapySession(Document):
 	def on_submit(self):
 		validate_nursing_tasks(self)
 		self.update_sessions_count_in_therapy_plan()
+		update_patient_activity(self.patient, self.creation, "therapy_sessions")
 
 		if self.service_request:
 			frappe.db.set_value("Service Request", self.service_request, "status", "Completed")
@@ -126,6 +126,8 @@ class PatientHistory {
 			filters['document_types'] = document_types;
 		if (selected_date_range)
 			filters['date_range'] = selected_date_range;
+		if (this.start && this.after)
+			filters['after'] = this.after;
 
 		let me = this;
 		frappe.call({
@@ -214,6 +216,8 @@ class PatientHistory {
 
 		this.page.main.find('.patient_documents_list').append(details);
 		this.start += data.length;
+		let last = data[data.length - 1];
+		this.after = JSON.stringify([last.communication_date, last.name]);
 
 		if (data.length === 20) {
 			this.page.main.find(".btn-get-records").show();
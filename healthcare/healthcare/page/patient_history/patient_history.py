@@ -8,22 +8,116 @@ import json
 import frappe
 from frappe.utils import cint
 
+FEED_FIELDS = [
+	"name",
+	"owner",
+	"communication_date",
+	"reference_doctype",
+	"reference_name",
+	"subject",
+]
 
-@frappe.whitelist()
-def get_feed(name, document_types=None, date_range=None, start=0, page_length=20):
-	"""get feed"""
-	filters = get_filters(name, document_types, date_range)
 
-	result = frappe.db.get_all(
-		"Patient Medical Record",
-		fields=["name", "owner", "communication_date", "reference_doctype", "reference_name", "subject"],
-		filters=filters,
-		order_by="communication_date DESC",
-		limit=cint(page_length),
-		start=cint(start),
-	)
+@frappe.whitelist()
+def get_feed(name, document_types=None, date_range=None, start=0, page_length=20, after=None):
+	"""
+	get feed, newest first, followed by records without a communication date
 
-	return result
+	:param after: [communication_date, name] of the last record of the previous page, pages
+	        after it instead of skipping `start` records
+	"""
+	filters = get_filters(name, document_types, date_range)
+	if after:
+		if isinstance(after, str):
+			after = json.loads(after)
+		return get_feed_after(filters, after, page_length)
+
+	start, page_length = cint(start), cint(page_length)
+	records = get_feed_query(filters).limit(page_length).offset(start).run(as_dict=True)
+	if len(records) < page_length and "communication_date" not in filters:
+		dated = start + len(records)
+		if start and not records:
+			dated = frappe.db.count(
+				"Patient Medical Record", {**filters, "communication_date": ["is", "set"]}
+			)
+		records += (
+			get_feed_query(filters, undated=True)
+			.limit(page_length - len(records))
+			.offset(max(start - dated, 0))
+			.run(as_dict=True)
+		)
+
+	return records
+
+
+def get_feed_after(filters, after, page_length=20):
+	record = frappe.qb.DocType("Patient Medical Record")
+	communication_date, name = after
+	page_length = cint(page_length)
+
+	records = []
+	if communication_date:
+		records = (
+			get_feed_query(filters)
+			.where(
+				(record.communication_date <= communication_date)
+				& ((record.communication_date < communication_date) | (record.name < name))
+			)
+			.limit(page_length)
+			.run(as_dict=True)
+		)
+
+	if len(records) < page_length and "communication_date" not in filters:
+		query = get_feed_query(filters, undated=True)
+		if not communication_date:
+			query = query.where(record.name < name)
+		records += query.limit(page_length - len(records)).run(as_dict=True)
+
+	return records
+
+
+def get_feed_query(filters, undated=False):
+	"""
+	Feed query of `filters`, newest first on the (patient, communication_date, name) index,
+	or of the records without a communication date by name if `undated`
+	"""
+	record = frappe.qb.DocType("Patient Medical Record")
+	query = frappe.qb.from_(record).select(*FEED_FIELDS).where(record.patient == filters["patient"])
+	if undated:
+		query = query.where(record.communication_date.isnull())
+	else:
+		query = query.where(record.communication_date.isnotnull()).orderby(
+			record.communication_date, order=frappe.qb.desc
+		)
+	query = query.orderby(record.name, order=frappe.qb.desc)
+
+	if filters.get("reference_doctype"):
+		query = query.where(record.reference_doctype.isin(filters["reference_doctype"][1]))
+	if filters.get("communication_date"):
+		from_date, to_date = filters["communication_date"][1]
+		query = query.where(record.communication_date.between(from_date, to_date))
+
+	return query
+
+
+def iter_feed(name, document_types=None, date_range=None, chunk_size=500):
+	"""
+	Yields the feed of patient `name` in chunks of at most `chunk_size` records, e.g. a
+	year of history with date_range=["2025-01-01", "2025-12-31"]
+	"""
+	if not isinstance(document_types, (str, type(None))):
+		document_types = json.dumps(document_types)
+	if not isinstance(date_range, (str, type(None))):
+		date_range = json.dumps(date_range, default=str)
+
+	records = get_feed(name, document_types, date_range, page_length=chunk_size)
+	while records:
+		yield records
+		if len(records) < chunk_size:
+			break
+
+		after = [records[-1].communication_date, records[-1].name]
+		records = get_feed(name, document_types, date_range, page_length=chunk_size, after=after)
 
 
 def get_filters(name, document_types=None, date_range=None):
@@ -59,13 +153,8 @@ def get_feed_for_dt(doctype, docname):
 
 @frappe.whitelist()
 def get_patient_history_doctypes():
-	document_types = []
-	settings = frappe.get_single("Patient History Settings")
-
-	for entry in settings.standard_doctypes:
-		document_types.append(entry.document_type)
-
-	for entry in settings.custom_doctypes:
-		document_types.append(entry.document_type)
+	from healthcare.healthcare.doctype.patient_history_settings.patient_history_settings import (
+		get_tracked_doctypes,
+	)
 
-	return document_types
+	return list(get_tracked_doctypes())
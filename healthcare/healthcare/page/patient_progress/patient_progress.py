@@ -1,41 +1,42 @@
 import json
-from datetime import datetime
 
 import frappe
 from frappe import _
-from frappe.utils import get_timespan_date_range, getdate
+from frappe.utils import (
+	add_days,
+	add_years,
+	cint,
+	get_timespan_date_range,
+	get_timestamp,
+	getdate,
+)
+
+from healthcare.healthcare.doctype.patient_daily_activity.patient_daily_activity import (
+	get_patient_activity,
+)
 
 
 @frappe.whitelist()
 def get_therapy_sessions_count(patient):
-	total = frappe.db.count("Therapy Session", filters={"docstatus": 1, "patient": patient})
-
-	month_start = datetime.today().replace(day=1)
-	this_month = frappe.db.count(
-		"Therapy Session", filters={"creation": [">", month_start], "docstatus": 1, "patient": patient}
-	)
+	month_start = getdate().replace(day=1)
+	total, this_month = 0, 0
+	for activity_date, count in get_patient_activity(patient, field="therapy_sessions"):
+		total += count
+		if activity_date >= month_start:
+			this_month += count
 
 	return {"total_therapy_sessions": total, "therapy_sessions_this_month": this_month}
 
 
 @frappe.whitelist()
 def get_patient_heatmap_data(patient, date):
-	return dict(
-		frappe.db.sql(
-			"""
-		SELECT
-			unix_timestamp(communication_date), count(*)
-		FROM
-			`tabPatient Medical Record`
-		WHERE
-			communication_date > subdate(%(date)s, interval 1 year) and
-			communication_date < subdate(%(date)s, interval -1 year) and
-			patient = %(patient)s
-		GROUP BY communication_date
-		ORDER BY communication_date asc""",
-			{"date": date, "patient": patient},
+	date = getdate(date)
+	return {
+		cint(get_timestamp(activity_date)): count
+		for activity_date, count in get_patient_activity(
+			patient, add_days(add_years(date, -1), 1), add_days(add_years(date, 1), -1)
 		)
-	)
+	}
 
 
 @frappe.whitelist()
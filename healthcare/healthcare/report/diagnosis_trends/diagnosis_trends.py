@@ -3,7 +3,7 @@
 
 import frappe
 from frappe import _, scrub
-from frappe.database.query import OPERATOR_MAP
+from frappe.query_builder.functions import Count, Date
 from frappe.utils import add_days, add_to_date, flt, getdate
 
 from erpnext.accounts.utils import get_fiscal_year
@@ -21,6 +21,8 @@ class DiagnosisTrends(object):
 	def __init__(self, filters=None):
 		self.data = []
 		self.periodic_daterange = []
+		self.period_labels = {}
+		self.fiscal_years = []
 		self.filters = frappe._dict(filters or {})
 		self.months = [
 			"Jan",
@@ -89,8 +91,8 @@ class DiagnosisTrends(object):
 			}
 		)
 
-		for end_date in self.periodic_daterange:
-			period = self.get_period(end_date)
+		self.periods = [self.get_period(end_date) for end_date in self.periodic_daterange]
+		for period in self.periods:
 			self.columns.append(
 				{"label": _(period), "fieldname": scrub(period), "fieldtype": "Int", "width": 120}
 			)
@@ -101,26 +103,38 @@ class DiagnosisTrends(object):
 
 	def get_data(self):
 		pe_diagnosis = frappe.qb.DocType("Patient Encounter Diagnosis")
+		creation_date = Date(pe_diagnosis.creation)
 		query = (
 			frappe.qb.from_(pe_diagnosis)
-			.select("name", "creation", "diagnosis")
+			.select(
+				pe_diagnosis.diagnosis, creation_date.as_("creation_date"), Count("*").as_("count")
+			)
 			.where(pe_diagnosis.creation[self.filters.from_date : self.filters.to_date])
+			.groupby(pe_diagnosis.diagnosis, creation_date)
 		)
 
 		department = self.filters.get("department")
 
 		if department:
-			encounters = frappe.get_all(
-				"Patient Encounter", filters={"medical_department": department}, pluck="name"
+			encounter = frappe.qb.DocType("Patient Encounter")
+			query = (
+				query.join(encounter)
+				.on(pe_diagnosis.parent == encounter.name)
+				.where(encounter.medical_department == department)
 			)
-			if encounters:
-				_operator = OPERATOR_MAP["in"]
-				query = query.where(_operator(pe_diagnosis.parent, encounters))
 
+		# one row per diagnosis and day
 		self.entries = query.run(as_dict=True)
 		self.get_rows()
 
-	def get_period(self, appointment_date):
+	def get_period(self, posting_date):
+		posting_date = getdate(posting_date)
+		if posting_date not in self.period_labels:
+			self.period_labels[posting_date] = self.get_period_label(posting_date)
+
+		return self.period_labels[posting_date]
+
+	def get_period_label(self, appointment_date):
 		if self.filters.range == "Weekly":
 			period = "Week " + str(appointment_date.isocalendar()[1])
 		elif self.filters.range == "Monthly":
@@ -128,14 +142,25 @@ class DiagnosisTrends(object):
 		elif self.filters.range == "Quarterly":
 			period = "Quarter " + str(((appointment_date.month - 1) // 3) + 1)
 		else:
-			year = get_fiscal_year(appointment_date, company=self.filters.company)
-			period = str(year[0])
+			period = str(self.get_fiscal_year(appointment_date))
 
 		if getdate(self.filters.from_date).year != getdate(self.filters.to_date).year:
 			period += " " + str(appointment_date.year)
 
 		return period
 
+	def get_fiscal_year(self, posting_date):
+		"""Returns the fiscal year name of `posting_date`, looking each fiscal year up only once"""
+		for name, year_start_date, year_end_date in self.fiscal_years:
+			if year_start_date <= posting_date <= year_end_date:
+				return name
+
+		name, year_start_date, year_end_date = get_fiscal_year(
+			posting_date, company=self.filters.company
+		)[:3]
+		self.fiscal_years.append((name, getdate(year_start_date), getdate(year_end_date)))
+		return name
+
 	def get_rows(self):
 		self.get_periodic_data()
 
@@ -143,8 +168,7 @@ class DiagnosisTrends(object):
 			row = {"diagnosis": entity}
 
 			total = 0
-			for end_date in self.periodic_daterange:
-				period = self.get_period(end_date)
+			for period in self.periods:
 				amount = flt(period_data.get(period, 0.0))
 				row[scrub(period)] = amount
 				total += amount
@@ -157,9 +181,9 @@ class DiagnosisTrends(object):
 		self.appointment_periodic_data = frappe._dict()
 
 		for d in self.entries:
-			period = self.get_period(d.get("creation"))
+			period = self.get_period(d.creation_date)
 			self.appointment_periodic_data.setdefault(d.diagnosis, frappe._dict()).setdefault(period, 0.0)
-			self.appointment_periodic_data[d.diagnosis][period] += 1
+			self.appointment_periodic_data[d.diagnosis][period] += d.count
 
 	def get_chart_data(self):
 		length = len(self.columns)
@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 import frappe
 from frappe import DuplicateEntryError
 from frappe.tests import IntegrationTestCase
@@ -6,6 +8,7 @@ from frappe.utils import add_days, add_months, getdate
 from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
 	create_practitioner,
 )
+from healthcare.healthcare.report.diagnosis_trends import diagnosis_trends
 from healthcare.healthcare.report.diagnosis_trends.diagnosis_trends import execute
 from healthcare.tests.test_utils import create_encounter
 
@@ -102,3 +105,22 @@ class TestDiagnosisTrends(IntegrationTestCase):
 		data = [i["diagnosis"] for i in report[1]]
 
 		self.assertIn(self.diagnosis_cardio.diagnosis, data)
+
+	def test_yearly_report_resolves_fiscal_years_once(self):
+		filters = {
+			"from_date": str(add_months(getdate(), -12)),
+			"to_date": str(add_days(getdate(), 1)),
+			"range": "Yearly",
+		}
+		with patch.object(
+			diagnosis_trends, "get_fiscal_year", wraps=diagnosis_trends.get_fiscal_year
+		) as fiscal_year:
+			report = execute(filters)
+
+		# the first period and the (at most two) fiscal years spanned, not once per diagnosis
+		self.assertLessEqual(fiscal_year.call_count, 3)
+
+		row = next(row for row in report[1] if row["diagnosis"] == self.diagnosis.diagnosis)
+		periods = [column["fieldname"] for column in report[0][1:-1]]
+		self.assertGreaterEqual(row["total"], 1)
+		self.assertEqual(row["total"], sum(row[period] for period in periods))
@@ -4,8 +4,8 @@
 
 import frappe
 
-from healthcare.healthcare.doctype.inpatient_medication_entry.inpatient_medication_entry import (
-	get_current_healthcare_service_unit,
+from healthcare.healthcare.doctype.inpatient_record.inpatient_record import (
+	get_current_service_units,
 )
 
 
@@ -135,9 +135,10 @@ def get_conditions(filters):
 
 def get_inpatient_details(data, service_unit):
 	service_unit_filtered_data = []
+	service_units = get_current_service_units([entry.inpatient_record for entry in data])
 
 	for entry in data:
-		entry["healthcare_service_unit"] = get_current_healthcare_service_unit(entry.inpatient_record)
+		entry["healthcare_service_unit"] = service_units.get(entry.inpatient_record)
 		if entry.is_completed:
 			entry["inpatient_medication_entry"] = get_inpatient_medication_entry(entry.name)
 
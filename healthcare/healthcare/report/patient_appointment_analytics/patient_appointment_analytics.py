@@ -31,6 +31,8 @@ class Analytics(object):
 			"Nov",
 			"Dec",
 		]
+		self.period_labels = {}
+		self.fiscal_years = []
 		self.get_period_date_ranges()
 
 	def run(self):
@@ -97,8 +99,8 @@ class Analytics(object):
 				}
 			)
 
-		for end_date in self.periodic_daterange:
-			period = self.get_period(end_date)
+		self.periods = [self.get_period(end_date) for end_date in self.periodic_daterange]
+		for period in self.periods:
 			self.columns.append(
 				{"label": _(period), "fieldname": scrub(period), "fieldtype": "Int", "width": 120}
 			)
@@ -117,6 +119,13 @@ class Analytics(object):
 			self.get_rows()
 
 	def get_period(self, appointment_date):
+		appointment_date = getdate(appointment_date)
+		if appointment_date not in self.period_labels:
+			self.period_labels[appointment_date] = self.get_period_label(appointment_date)
+
+		return self.period_labels[appointment_date]
+
+	def get_period_label(self, appointment_date):
 		if self.filters.range == "Weekly":
 			period = "Week " + str(appointment_date.isocalendar()[1])
 		elif self.filters.range == "Monthly":
@@ -124,21 +133,34 @@ class Analytics(object):
 		elif self.filters.range == "Quarterly":
 			period = "Quarter " + str(((appointment_date.month - 1) // 3) + 1)
 		else:
-			year = get_fiscal_year(appointment_date, company=self.filters.company)
-			period = str(year[0])
+			period = str(self.get_fiscal_year(appointment_date))
 
 		if getdate(self.filters.from_date).year != getdate(self.filters.to_date).year:
 			period += " " + str(appointment_date.year)
 
 		return period
 
+	def get_fiscal_year(self, appointment_date):
+		"""Returns the fiscal year of `appointment_date`, looking each fiscal year up only once"""
+		for name, year_start_date, year_end_date in self.fiscal_years:
+			if year_start_date <= appointment_date <= year_end_date:
+				return name
+
+		name, year_start_date, year_end_date = get_fiscal_year(
+			appointment_date, company=self.filters.company
+		)[:3]
+		self.fiscal_years.append((name, getdate(year_start_date), getdate(year_end_date)))
+		return name
+
 	def get_appointments_based_on_healthcare_practitioner(self):
 		filters = self.get_common_filters()
 
+		# one row per practitioner and day
 		self.entries = frappe.db.get_all(
 			"Patient Appointment",
-			fields=["appointment_date", "name", "patient", "practitioner"],
+			fields=["appointment_date", "practitioner", "count(*) as count"],
 			filters=filters,
+			group_by="practitioner, appointment_date",
 		)
 
 	def get_appointments_based_on_medical_department(self):
@@ -146,10 +168,12 @@ class Analytics(object):
 		if not filters.get("department"):
 			filters["department"] = ("!=", "")
 
+		# one row per department and day
 		self.entries = frappe.db.get_all(
 			"Patient Appointment",
-			fields=["appointment_date", "name", "patient", "practitioner", "department"],
+			fields=["appointment_date", "department", "count(*) as count"],
 			filters=filters,
+			group_by="department, appointment_date",
 		)
 
 	def get_common_filters(self):
@@ -172,8 +196,7 @@ class Analytics(object):
 				row = {"department": entity}
 
 			total = 0
-			for end_date in self.periodic_daterange:
-				period = self.get_period(end_date)
+			for period in self.periods:
 				amount = flt(period_data.get(period, 0.0))
 				row[scrub(period)] = amount
 				total += amount
@@ -191,11 +214,11 @@ class Analytics(object):
 				self.appointment_periodic_data.setdefault(d.practitioner, frappe._dict()).setdefault(
 					period, 0.0
 				)
-				self.appointment_periodic_data[d.practitioner][period] += 1
+				self.appointment_periodic_data[d.practitioner][period] += d.count
 
 			elif self.filters.tree_type == "Medical Department":
 				self.appointment_periodic_data.setdefault(d.department, frappe._dict()).setdefault(period, 0.0)
-				self.appointment_periodic_data[d.department][period] += 1
+				self.appointment_periodic_data[d.department][period] += d.count
 
 	def get_chart_data(self):
 		length = len(self.columns)
@@ -9,17 +9,27 @@ import json
 import frappe
 from frappe import _
 from frappe.query_builder import DocType
-from frappe.utils import cint, cstr, flt, get_link_to_form, time_diff_in_hours
+from frappe.query_builder.functions import Coalesce
+from frappe.utils import cint, cstr, flt, get_link_to_form, getdate, time_diff_in_hours
 from frappe.utils.formatters import format_value
 
 from erpnext.setup.utils import insert_record
 
+from healthcare.healthcare.doctype.healthcare_service_unit.healthcare_service_unit import (
+	get_occupancy,
+)
 from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import (
-	get_income_account,
+	get_healthcare_settings,
+	get_income_accounts,
 )
 from healthcare.healthcare.doctype.lab_test.lab_test import create_multiple
-from healthcare.healthcare.doctype.observation.observation import add_observation
+from healthcare.healthcare.doctype.observation.observation import (
+	add_observation,
+	make_observation,
+	preload_observation_links,
+)
 from healthcare.healthcare.doctype.observation_template.observation_template import (
+	get_item_observation_templates,
 	get_observation_template_details,
 )
 from healthcare.setup import setup_healthcare
@@ -30,12 +40,15 @@ def get_healthcare_services_to_invoice(patient, customer, company, link_customer
 	patient = frappe.get_doc("Patient", patient)
 	items_to_invoice = []
 	if patient:
+		# resolve settings once, every collector below reads from the same doc
+		settings = get_healthcare_settings()
+
 		# Customer validated, build a list of billable services
-		items_to_invoice += get_appointments_to_invoice(patient, company)
-		items_to_invoice += get_encounters_to_invoice(patient, company)
+		items_to_invoice += get_appointments_to_invoice(patient, company, settings)
+		items_to_invoice += get_encounters_to_invoice(patient, company, settings)
 		items_to_invoice += get_lab_tests_to_invoice(patient, company)
-		items_to_invoice += get_clinical_procedures_to_invoice(patient, company)
-		items_to_invoice += get_inpatient_services_to_invoice(patient, company)
+		items_to_invoice += get_clinical_procedures_to_invoice(patient, company, settings)
+		items_to_invoice += get_inpatient_services_to_invoice(patient, company, settings)
 		items_to_invoice += get_therapy_plans_to_invoice(patient, company)
 		items_to_invoice += get_therapy_sessions_to_invoice(patient, company)
 		items_to_invoice += get_service_requests_to_invoice(patient, company)
@@ -58,7 +71,184 @@ def validate_customer_created(patient, customer, link_customer):
 		frappe.msgprint(message, alert=True)
 
 
-def get_appointments_to_invoice(patient, company):
+def get_values_map(doctype, names, fields):
+	"""Returns {name: row} for all `names` of `doctype`, fetched with a single query"""
+	names = {name for name in names if name}
+	if not names:
+		return {}
+
+	return {
+		row.name: row
+		for row in frappe.get_all(
+			doctype, filters={"name": ("in", list(names))}, fields=["name", *fields]
+		)
+	}
+
+
+def get_billing_item_and_rate_cached(doc, cache):
+	"""
+	Memoized get_appointment_billing_item_and_rate, the result only depends on
+	the fields in the key, which repeat heavily across a patient's documents
+	"""
+	key = (
+		doc.get("doctype"),
+		doc.get("practitioner"),
+		bool(doc.get("inpatient_record")),
+		doc.get("appointment_type"),
+		doc.get("department"),
+		doc.get("medical_department"),
+		doc.get("service_unit"),
+	)
+	if key not in cache:
+		cache[key] = get_appointment_billing_item_and_rate(doc)
+
+	return cache[key]
+
+
+def get_selling_price_list(customer=None):
+	"""
+	Returns the Price List healthcare services are billed with: the Healthcare Settings
+	default, then the customer's default, then Selling Settings, then the first enabled
+	selling Price List by name
+	"""
+	price_list = get_healthcare_settings().default_price_list
+	if not price_list and customer:
+		price_list = frappe.get_cached_value("Customer", customer, "default_price_list")
+	if not price_list:
+		price_list = frappe.db.get_single_value("Selling Settings", "selling_price_list")
+	if not price_list:
+		price_list = frappe.db.get_value(
+			"Price List", {"selling": 1, "enabled": 1}, "name", order_by="name asc"
+		)
+
+	return price_list
+
+
+class HealthcarePriceResolver:
+	"""
+	Selling prices of items for one (customer, price list, company) context
+
+	Item Prices of all requested items are fetched with one query and kept for the lifetime
+	of the resolver, usually one invoice build. Items whose price depends on more than the
+	price list and customer (sales UOM, rate pricing rules) or have no current Item Price
+	are resolved with ERPNext's get_item_details, once per item.
+	"""
+
+	def __init__(self, company, customer=None, price_list=None, currency=None, warehouse=None):
+		self.company = company
+		self.customer = customer
+		self.price_list = price_list or get_selling_price_list(customer)
+		self.currency = currency
+		if not self.currency and self.price_list:
+			self.currency = frappe.get_cached_value("Price List", self.price_list, "currency")
+		self.warehouse = warehouse
+		self.details = {}
+		self.has_rate_pricing_rules = frappe.db.exists(
+			"Pricing Rule", {"selling": 1, "disable": 0, "rate_or_discount": "Rate"}
+		)
+
+	@classmethod
+	def for_patient(cls, patient, company, **kwargs):
+		return cls(company, frappe.db.get_value("Patient", patient, "customer"), **kwargs)
+
+	def get_rate(self, item_code):
+		return self.get_item_details([item_code])[item_code].price_list_rate
+
+	def get_item_details(self, item_codes):
+		"""Returns {item_code: {item_name, description, price_list_rate}} for `item_codes`"""
+		missing = {item_code for item_code in item_codes if item_code not in self.details}
+		if missing:
+			self.details.update(self.get_item_prices(missing))
+			for item_code in missing - set(self.details):
+				self.details[item_code] = self.get_erpnext_item_details(item_code)
+
+		return {item_code: self.details[item_code] for item_code in item_codes}
+
+	def get_item_prices(self, item_codes):
+		if self.has_rate_pricing_rules or not self.price_list:
+			return {}
+
+		items = {
+			item.name: item
+			for item in frappe.get_all(
+				"Item",
+				filters={"name": ("in", list(item_codes))},
+				fields=["name", "item_name", "description", "stock_uom", "sales_uom"],
+			)
+			if not item.sales_uom or item.sales_uom == item.stock_uom
+		}
+		if not items:
+			return {}
+
+		today = getdate()
+		item_price = DocType("Item Price")
+		party_condition = Coalesce(item_price.customer, "") == ""
+		if self.customer:
+			party_condition |= item_price.customer == self.customer
+
+		prices = {}
+		for row in (
+			frappe.qb.from_(item_price)
+			.select(
+				item_price.item_code,
+				item_price.price_list_rate,
+				item_price.customer,
+				item_price.uom,
+				item_price.valid_from,
+			)
+			.where(
+				(item_price.price_list == self.price_list)
+				& item_price.item_code.isin(list(items))
+				& party_condition
+				& (Coalesce(item_price.supplier, "") == "")
+				& (Coalesce(item_price.batch_no, "") == "")
+				& (Coalesce(item_price.valid_from, "2000-01-01") <= today)
+				& (Coalesce(item_price.valid_upto, "2500-12-31") >= today)
+			)
+			.run(as_dict=True)
+		):
+			if row.uom and row.uom != items[row.item_code].stock_uom:
+				continue
+			# customer specific prices first, then the most recent, then UOM specific ones
+			key = (bool(row.customer), getdate(row.valid_from or "2000-01-01"), bool(row.uom))
+			if row.item_code not in prices or key > prices[row.item_code][0]:
+				prices[row.item_code] = (key, row.price_list_rate)
+
+		return {
+			item_code: frappe._dict(
+				item_name=items[item_code].item_name,
+				description=items[item_code].description,
+				price_list_rate=flt(rate),
+			)
+			for item_code, (key, rate) in prices.items()
+		}
+
+	def get_erpnext_item_details(self, item_code):
+		from erpnext.stock.get_item_details import get_item_details
+
+		args = {
+			"doctype": "Sales Invoice",
+			"item_code": item_code,
+			"company": self.company,
+			"customer": self.customer,
+			"selling_price_list": self.price_list,
+			"price_list_currency": self.currency,
+			"plc_conversion_rate": 1.0,
+			"conversion_rate": 1.0,
+		}
+		if self.warehouse:
+			args["warehouse"] = self.warehouse
+
+		item_details = get_item_details(args)
+		return frappe._dict(
+			item_name=item_details.item_name,
+			description=item_details.description,
+			price_list_rate=flt(item_details.price_list_rate),
+		)
+
+
+def get_appointments_to_invoice(patient, company, settings=None):
+	settings = settings or get_healthcare_settings()
 	appointments_to_invoice = []
 	patient_appointments = frappe.get_list(
 		"Patient Appointment",
@@ -71,13 +261,33 @@ def get_appointments_to_invoice(patient, company):
 		},
 		order_by="appointment_date",
 	)
+	if not patient_appointments:
+		return appointments_to_invoice
+
+	procedure_templates = get_values_map(
+		"Clinical Procedure Template",
+		[appointment.procedure_template for appointment in patient_appointments],
+		["is_billable"],
+	)
+	appointments_with_fee_validity = set()
+	if settings.enable_free_follow_ups:
+		appointments_with_fee_validity = set(
+			frappe.get_all(
+				"Fee Validity Reference",
+				filters={"appointment": ("in", [appointment.name for appointment in patient_appointments])},
+				pluck="appointment",
+			)
+		)
+	income_accounts = get_income_accounts(
+		[appointment.practitioner for appointment in patient_appointments], company
+	)
+	billing_details = {}
 
 	for appointment in patient_appointments:
 		# Procedure Appointments
 		if appointment.procedure_template:
-			if frappe.db.get_value(
-				"Clinical Procedure Template", appointment.procedure_template, "is_billable"
-			):
+			template = procedure_templates.get(appointment.procedure_template)
+			if template and template.is_billable:
 				appointments_to_invoice.append(
 					{
 						"reference_type": "Patient Appointment",
@@ -87,18 +297,16 @@ def get_appointments_to_invoice(patient, company):
 				)
 		# Consultation Appointments, should check fee validity
 		else:
-			if frappe.db.get_single_value(
-				"Healthcare Settings", "enable_free_follow_ups"
-			) and frappe.db.exists("Fee Validity Reference", {"appointment": appointment.name}):
+			if appointment.name in appointments_with_fee_validity:
 				continue  # Skip invoicing, fee validty present
 			practitioner_charge = 0
 			income_account = None
 			service_item = None
 			if appointment.practitioner:
-				details = get_appointment_billing_item_and_rate(appointment)
+				details = get_billing_item_and_rate_cached(appointment, billing_details)
 				service_item = details.get("service_item")
 				practitioner_charge = details.get("practitioner_charge")
-				income_account = get_income_account(appointment.practitioner, appointment.company)
+				income_account = income_accounts.get(appointment.practitioner)
 			appointments_to_invoice.append(
 				{
 					"reference_type": "Patient Appointment",
@@ -112,9 +320,10 @@ def get_appointments_to_invoice(patient, company):
 	return appointments_to_invoice
 
 
-def get_encounters_to_invoice(patient, company):
+def get_encounters_to_invoice(patient, company, settings=None):
 	if not isinstance(patient, str):
 		patient = patient.name
+	settings = settings or get_healthcare_settings()
 	encounters_to_invoice = []
 	encounters = frappe.get_list(
 		"Patient Encounter",
@@ -122,21 +331,24 @@ def get_encounters_to_invoice(patient, company):
 		filters={"patient": patient, "company": company, "invoiced": False, "docstatus": 1},
 	)
 	if encounters:
+		income_accounts = get_income_accounts(
+			[encounter.practitioner for encounter in encounters], company
+		)
+		billing_details = {}
+
 		for encounter in encounters:
 			if not encounter.appointment:
 				practitioner_charge = 0
 				income_account = None
 				service_item = None
 				if encounter.practitioner:
-					if encounter.inpatient_record and frappe.db.get_single_value(
-						"Healthcare Settings", "do_not_bill_inpatient_encounters"
-					):
+					if encounter.inpatient_record and settings.do_not_bill_inpatient_encounters:
 						continue
 
-					details = get_appointment_billing_item_and_rate(encounter)
+					details = get_billing_item_and_rate_cached(encounter, billing_details)
 					service_item = details.get("service_item")
 					practitioner_charge = details.get("practitioner_charge")
-					income_account = get_income_account(encounter.practitioner, encounter.company)
+					income_account = income_accounts.get(encounter.practitioner)
 
 				encounters_to_invoice.append(
 					{
@@ -164,13 +376,14 @@ def get_lab_tests_to_invoice(patient, company):
 			"service_request": "",
 		},
 	)
+	templates = get_values_map(
+		"Lab Test Template", [lab_test.template for lab_test in lab_tests], ["item", "is_billable"]
+	)
 	for lab_test in lab_tests:
-		item, is_billable = frappe.get_cached_value(
-			"Lab Test Template", lab_test.template, ["item", "is_billable"]
-		)
-		if is_billable:
+		template = templates.get(lab_test.template)
+		if template and template.is_billable:
 			lab_tests_to_invoice.append(
-				{"reference_type": "Lab Test", "reference_name": lab_test.name, "service": item}
+				{"reference_type": "Lab Test", "reference_name": lab_test.name, "service": template.item}
 			)
 
 	return lab_tests_to_invoice
@@ -189,19 +402,27 @@ def get_observations_to_invoice(patient, company):
 			"service_request": "",
 		},
 	)
+	templates = get_values_map(
+		"Observation Template",
+		[observation.observation_template for observation in observations],
+		["item", "is_billable"],
+	)
 	for observation in observations:
-		item, is_billable = frappe.get_cached_value(
-			"Observation Template", observation.observation_template, ["item", "is_billable"]
-		)
-		if is_billable:
+		template = templates.get(observation.observation_template)
+		if template and template.is_billable:
 			observations_to_invoice.append(
-				{"reference_type": "Observation", "reference_name": observation.name, "service": item}
+				{
+					"reference_type": "Observation",
+					"reference_name": observation.name,
+					"service": template.item,
+				}
 			)
 
 	return observations_to_invoice
 
 
-def get_clinical_procedures_to_invoice(patient, company):
+def get_clinical_procedures_to_invoice(patient, company, settings=None):
+	settings = settings or get_healthcare_settings()
 	clinical_procedures_to_invoice = []
 	procedures = frappe.get_list(
 		"Clinical Procedure",
@@ -214,14 +435,21 @@ def get_clinical_procedures_to_invoice(patient, company):
 			"service_request": "",
 		},
 	)
+	templates = get_values_map(
+		"Clinical Procedure Template",
+		[procedure.procedure_template for procedure in procedures if not procedure.appointment],
+		["item", "is_billable"],
+	)
 	for procedure in procedures:
 		if not procedure.appointment:
-			item, is_billable = frappe.get_cached_value(
-				"Clinical Procedure Template", procedure.procedure_template, ["item", "is_billable"]
-			)
-			if procedure.procedure_template and is_billable:
+			template = templates.get(procedure.procedure_template)
+			if template and template.is_billable:
 				clinical_procedures_to_invoice.append(
-					{"reference_type": "Clinical Procedure", "reference_name": procedure.name, "service": item}
+					{
+						"reference_type": "Clinical Procedure",
+						"reference_name": procedure.name,
+						"service": template.item,
+					}
 				)
 
 		# consumables
@@ -231,9 +459,7 @@ def get_clinical_procedures_to_invoice(patient, company):
 			and procedure.status == "Completed"
 			and not procedure.consumption_invoiced
 		):
-			service_item = frappe.db.get_single_value(
-				"Healthcare Settings", "clinical_procedure_consumable_item"
-			)
+			service_item = settings.clinical_procedure_consumable_item
 			if not service_item:
 				msg = _("Please Configure Clinical Procedure Consumable Item in {0}").format(
 					get_link_to_form("Healthcare Settings", "Healthcare Settings")
@@ -254,17 +480,21 @@ def get_clinical_procedures_to_invoice(patient, company):
 	return clinical_procedures_to_invoice
 
 
-def get_inpatient_services_to_invoice(patient, company):
+def get_inpatient_services_to_invoice(patient, company, settings=None):
+	settings = settings or get_healthcare_settings()
 	services_to_invoice = []
-	if not frappe.db.get_single_value("Healthcare Settings", "automatically_generate_billable"):
+	if not settings.automatically_generate_billable:
 		ip_record = DocType("Inpatient Record")
 		ip_occupancy = DocType("Inpatient Occupancy")
+		service_unit = DocType("Healthcare Service Unit")
 
 		inpatient_services = (
 			frappe.qb.from_(ip_occupancy)
 			.join(ip_record)
 			.on(ip_occupancy.parent == ip_record.name)
-			.select(ip_occupancy.star)
+			.left_join(service_unit)
+			.on(ip_occupancy.service_unit == service_unit.name)
+			.select(ip_occupancy.star, service_unit.service_unit_type)
 			.where(
 				(ip_record.patient == patient.name)
 				& (ip_record.company == company)
@@ -273,11 +503,13 @@ def get_inpatient_services_to_invoice(patient, company):
 			.run(as_dict=True)
 		)
 
+		inpatient_records = {}
 		for inpatient_occupancy in inpatient_services:
-			service_unit_type = frappe.db.get_value(
-				"Healthcare Service Unit", inpatient_occupancy.service_unit, "service_unit_type"
-			)
-			service_unit_type = frappe.get_cached_doc("Healthcare Service Unit Type", service_unit_type)
+			service_unit_type = None
+			if inpatient_occupancy.service_unit_type:
+				service_unit_type = frappe.get_cached_doc(
+					"Healthcare Service Unit Type", inpatient_occupancy.service_unit_type
+				)
 			if service_unit_type and service_unit_type.is_billable:
 				hours_occupied = flt(
 					time_diff_in_hours(inpatient_occupancy.check_out, inpatient_occupancy.check_in)
@@ -295,7 +527,12 @@ def get_inpatient_services_to_invoice(patient, company):
 						"qty": qty,
 					}
 				)
-			inpatient_record_doc = frappe.get_doc("Inpatient Record", inpatient_occupancy.parent)
+
+			if inpatient_occupancy.parent not in inpatient_records:
+				inpatient_records[inpatient_occupancy.parent] = frappe.get_doc(
+					"Inpatient Record", inpatient_occupancy.parent
+				)
+			inpatient_record_doc = inpatient_records[inpatient_occupancy.parent]
 			for item in inpatient_record_doc.items:
 				if item.stock_entry and not item.invoiced:
 					services_to_invoice.append(
@@ -306,6 +543,9 @@ def get_inpatient_services_to_invoice(patient, company):
 							"qty": item.quantity,
 						}
 					)
+
+		# rent is billed per record, not per occupancy row
+		for inpatient_record_doc in inpatient_records.values():
 			inpatient_record_doc.add_service_unit_rent_to_billable_items()
 
 	else:
@@ -348,14 +588,18 @@ def get_therapy_plans_to_invoice(patient, company):
 			"docstatus": 1,
 		},
 	)
+	templates = get_values_map(
+		"Therapy Plan Template",
+		[plan.therapy_plan_template for plan in therapy_plans],
+		["linked_item"],
+	)
 	for plan in therapy_plans:
+		template = templates.get(plan.therapy_plan_template)
 		therapy_plans_to_invoice.append(
 			{
 				"reference_type": "Therapy Plan",
 				"reference_name": plan.name,
-				"service": frappe.db.get_value(
-					"Therapy Plan Template", plan.therapy_plan_template, "linked_item"
-				),
+				"service": template.linked_item if template else None,
 			}
 		)
 
@@ -364,11 +608,6 @@ def get_therapy_plans_to_invoice(patient, company):
 
 def get_therapy_sessions_to_invoice(patient, company):
 	therapy_sessions_to_invoice = []
-	therapy_plans = frappe.db.get_all("Therapy Plan", {"therapy_plan_template": ("!=", "")})
-	therapy_plans_created_from_template = []
-	for entry in therapy_plans:
-		therapy_plans_created_from_template.append(entry.name)
-
 	therapy_sessions = frappe.get_list(
 		"Therapy Session",
 		fields="*",
@@ -376,23 +615,41 @@ def get_therapy_sessions_to_invoice(patient, company):
 			"patient": patient.name,
 			"invoiced": 0,
 			"company": company,
-			"therapy_plan": ("not in", therapy_plans_created_from_template),
 			"docstatus": 1,
 			"service_request": "",
 		},
 	)
+	if not therapy_sessions:
+		return therapy_sessions_to_invoice
+
+	# sessions of plans created from a template are billed with the plan
+	therapy_plans = {therapy.therapy_plan for therapy in therapy_sessions if therapy.therapy_plan}
+	therapy_plans_created_from_template = set()
+	if therapy_plans:
+		therapy_plans_created_from_template = set(
+			frappe.get_all(
+				"Therapy Plan",
+				filters={"name": ("in", list(therapy_plans)), "therapy_plan_template": ("!=", "")},
+				pluck="name",
+			)
+		)
+	therapy_types = get_values_map(
+		"Therapy Type", [therapy.therapy_type for therapy in therapy_sessions], ["is_billable", "item"]
+	)
+
 	for therapy in therapy_sessions:
-		if not therapy.appointment:
-			if therapy.therapy_type and frappe.db.get_value(
-				"Therapy Type", therapy.therapy_type, "is_billable"
-			):
-				therapy_sessions_to_invoice.append(
-					{
-						"reference_type": "Therapy Session",
-						"reference_name": therapy.name,
-						"service": frappe.db.get_value("Therapy Type", therapy.therapy_type, "item"),
-					}
-				)
+		if therapy.appointment or therapy.therapy_plan in therapy_plans_created_from_template:
+			continue
+
+		therapy_type = therapy_types.get(therapy.therapy_type)
+		if therapy_type and therapy_type.is_billable:
+			therapy_sessions_to_invoice.append(
+				{
+					"reference_type": "Therapy Session",
+					"reference_name": therapy.name,
+					"service": therapy_type.item,
+				}
+			)
 
 	return therapy_sessions_to_invoice
 
@@ -409,27 +666,26 @@ def get_service_requests_to_invoice(patient, company):
 			"docstatus": 1,
 		},
 	)
+
+	templates_by_doctype = {}
 	for service_request in service_requests:
-		item, is_billable = frappe.get_cached_value(
-			service_request.template_dt, service_request.template_dn, ["item", "is_billable"]
-		)
-		price_list, price_list_currency = frappe.db.get_values(
-			"Price List", {"selling": 1}, ["name", "currency"]
-		)[0]
-		args = {
-			"doctype": "Sales Invoice",
-			"item_code": item,
-			"company": service_request.get("company"),
-			"customer": frappe.db.get_value("Patient", service_request.get("patient"), "customer"),
-			"plc_conversion_rate": 1.0,
-			"conversion_rate": 1.0,
-		}
-		if is_billable:
+		if service_request.template_dt:
+			templates_by_doctype.setdefault(service_request.template_dt, set()).add(
+				service_request.template_dn
+			)
+	templates = {
+		template_dt: get_values_map(template_dt, template_dns, ["item", "is_billable"])
+		for template_dt, template_dns in templates_by_doctype.items()
+	}
+
+	for service_request in service_requests:
+		template = templates.get(service_request.template_dt, {}).get(service_request.template_dn)
+		if template and template.is_billable:
 			orders_to_invoice.append(
 				{
 					"reference_type": "Service Request",
 					"reference_name": service_request.name,
-					"service": item,
+					"service": template.item,
 					"qty": service_request.quantity if service_request.quantity else 1,
 				}
 			)
@@ -550,9 +806,9 @@ def get_healthcare_service_item(is_inpatient):
 	service_item = None
 
 	if is_inpatient:
-		service_item = frappe.db.get_single_value("Healthcare Settings", "inpatient_visit_charge_item")
+		service_item = get_healthcare_settings().inpatient_visit_charge_item
 	else:
-		service_item = frappe.db.get_single_value("Healthcare Settings", "op_consulting_charge_item")
+		service_item = get_healthcare_settings().op_consulting_charge_item
 
 	return service_item
 
@@ -568,32 +824,39 @@ def manage_invoice_submit_cancel(doc, method):
 	if not doc.patient:
 		return
 
-	if doc.items:
-		for item in doc.items:
-			if item.get("reference_dt") and item.get("reference_dn"):
-				# TODO check
-				# if frappe.get_meta(item.reference_dt).has_field("invoiced"):
-				set_invoiced(item, method, doc.name)
+	settings = get_healthcare_settings()
 
-		if method == "on_submit" and frappe.db.get_single_value(
-			"Healthcare Settings", "create_observation_on_si_submit"
-		):
-			create_sample_collection_and_observation(doc)
+	if doc.items:
+		items = [item for item in doc.items if item.get("reference_dt") and item.get("reference_dn")]
+		if items:
+			# TODO check
+			# if frappe.get_meta(item.reference_dt).has_field("invoiced"):
+			set_invoiced_in_bulk(items, method, settings)
+
+		if method == "on_submit" and settings.create_observation_on_si_submit:
+			frappe.enqueue(
+				"healthcare.healthcare.utils.create_sample_collection_and_observation_for_invoice",
+				queue="long",
+				sales_invoice=doc.name,
+				enqueue_after_commit=True,
+				now=frappe.flags.in_test,
+			)
 
 	if method == "on_submit":
-		if frappe.db.get_single_value("Healthcare Settings", "create_lab_test_on_si_submit"):
+		if settings.create_lab_test_on_si_submit:
 			create_multiple("Sales Invoice", doc.name)
 
-		if (
-			not frappe.db.get_single_value("Healthcare Settings", "show_payment_popup")
-			and frappe.db.get_single_value("Healthcare Settings", "enable_free_follow_ups")
-			and doc.items
-		):
-			for item in doc.items:
-				if item.reference_dt == "Patient Appointment":
-					fee_validity = frappe.db.exists("Fee Validity", {"patient_appointment": item.reference_dn})
-					if fee_validity:
-						frappe.db.set_value("Fee Validity", fee_validity, "sales_invoice_ref", doc.name)
+		if not settings.show_payment_popup and settings.enable_free_follow_ups and doc.items:
+			appointments = [
+				item.reference_dn for item in doc.items if item.reference_dt == "Patient Appointment"
+			]
+			if appointments:
+				frappe.db.set_value(
+					"Fee Validity",
+					{"patient_appointment": ("in", appointments)},
+					"sales_invoice_ref",
+					doc.name,
+				)
 
 	if method == "on_cancel":
 		if doc.items and (doc.additional_discount_percentage or doc.discount_amount):
@@ -614,93 +877,142 @@ def manage_invoice_submit_cancel(doc, method):
 
 
 def set_invoiced(item, method, ref_invoice=None):
-	invoiced = False
-	if method == "on_submit":
-		validate_invoiced_on_submit(item)
-		invoiced = True
+	set_invoiced_in_bulk([item], method)
 
-	if item.reference_dt == "Clinical Procedure":
-		service_item = frappe.db.get_single_value(
-			"Healthcare Settings", "clinical_procedure_consumable_item"
-		)
-		if service_item == item.item_code:
-			frappe.db.set_value(item.reference_dt, item.reference_dn, "consumption_invoiced", invoiced)
-		else:
-			frappe.db.set_value(item.reference_dt, item.reference_dn, "invoiced", invoiced)
-	else:
-		if item.reference_dt not in ["Service Request", "Medication Request"]:
-			frappe.db.set_value(item.reference_dt, item.reference_dn, "invoiced", invoiced)
 
-	if item.reference_dt == "Patient Appointment":
-		if frappe.db.get_value("Patient Appointment", item.reference_dn, "procedure_template"):
-			dt_from_appointment = "Clinical Procedure"
-		else:
-			dt_from_appointment = "Patient Encounter"
-		manage_doc_for_appointment(dt_from_appointment, item.reference_dn, invoiced)
+def set_invoiced_in_bulk(items, method, settings=None):
+	"""
+	Propagate invoiced status of Sales Invoice Items to the referenced documents,
+	flags are validated and updated with one query per doctype, Service Request and
+	Medication Request still go through their per line quantity accounting
+	"""
+	settings = settings or get_healthcare_settings()
+	invoiced = method == "on_submit"
+
+	references = {}
+	order_items = []
+	for item in items:
+		if item.reference_dt in ["Service Request", "Medication Request"]:
+			order_items.append(item)
+			continue
+
+		fieldname = "invoiced"
+		if (
+			item.reference_dt == "Clinical Procedure"
+			and settings.clinical_procedure_consumable_item == item.item_code
+		):
+			fieldname = "consumption_invoiced"
+		references.setdefault((item.reference_dt, fieldname), []).append(item.reference_dn)
+
+	if invoiced:
+		validate_invoiced_on_submit_in_bulk(references, order_items)
 
-	elif item.reference_dt == "Lab Prescription":
+	for (doctype, fieldname), names in references.items():
+		frappe.db.set_value(doctype, {"name": ("in", names)}, fieldname, invoiced)
+
+	if references.get(("Patient Appointment", "invoiced")):
+		manage_docs_for_appointments(references[("Patient Appointment", "invoiced")], invoiced)
+
+	if references.get(("Lab Prescription", "invoiced")):
 		manage_prescriptions(
-			invoiced, item.reference_dt, item.reference_dn, "Lab Test", "lab_test_created"
+			invoiced,
+			"Lab Prescription",
+			references[("Lab Prescription", "invoiced")],
+			"Lab Test",
+			"lab_test_created",
 		)
 
-	elif item.reference_dt == "Procedure Prescription":
+	if references.get(("Procedure Prescription", "invoiced")):
 		manage_prescriptions(
-			invoiced, item.reference_dt, item.reference_dn, "Clinical Procedure", "procedure_created"
+			invoiced,
+			"Procedure Prescription",
+			references[("Procedure Prescription", "invoiced")],
+			"Clinical Procedure",
+			"procedure_created",
 		)
-	elif item.reference_dt in ["Service Request", "Medication Request"]:
-		# if order is invoiced, set both order and service transaction as invoiced
+
+	# if order is invoiced, set both order and service transaction as invoiced
+	for item in order_items:
 		hso = frappe.get_doc(item.reference_dt, item.reference_dn)
 		if invoiced:
 			hso.update_invoice_details(item.qty)
 		else:
 			hso.update_invoice_details(item.qty * -1)
 
-		# service transaction linking to HSO
-		if item.reference_dt == "Service Request":
-			template_map = {
-				"Clinical Procedure Template": "Clinical Procedure",
-				"Therapy Type": "Therapy Session",
-				"Lab Test Template": "Lab Test"
-				# 'Healthcare Service Unit': 'Inpatient Occupancy'
-			}
-
 
 def validate_invoiced_on_submit(item):
+	settings = get_healthcare_settings()
+	if item.reference_dt in ["Service Request", "Medication Request"]:
+		validate_invoiced_on_submit_in_bulk({}, [item])
+		return
+
+	fieldname = "invoiced"
 	if (
 		item.reference_dt == "Clinical Procedure"
-		and frappe.db.get_single_value("Healthcare Settings", "clinical_procedure_consumable_item")
-		== item.item_code
+		and settings.clinical_procedure_consumable_item == item.item_code
 	):
-		is_invoiced = frappe.db.get_value(item.reference_dt, item.reference_dn, "consumption_invoiced")
+		fieldname = "consumption_invoiced"
+	validate_invoiced_on_submit_in_bulk({(item.reference_dt, fieldname): [item.reference_dn]}, [])
 
-	elif item.reference_dt in ["Service Request", "Medication Request"]:
-		billing_status = frappe.db.get_value(item.reference_dt, item.reference_dn, "billing_status")
-		is_invoiced = True if billing_status == "Invoiced" else False
 
-	else:
-		is_invoiced = frappe.db.get_value(item.reference_dt, item.reference_dn, "invoiced")
-	if is_invoiced:
-		frappe.throw(
-			_("The item referenced by {0} - {1} is already invoiced").format(
-				item.reference_dt, item.reference_dn
-			)
+def validate_invoiced_on_submit_in_bulk(references, order_items):
+	for (doctype, fieldname), names in references.items():
+		already_invoiced = frappe.get_all(
+			doctype, filters={"name": ("in", names), fieldname: 1}, pluck="name"
 		)
+		# the same document billed twice in one invoice
+		already_invoiced += [name for name in set(names) if names.count(name) > 1]
+		if already_invoiced:
+			throw_already_invoiced(doctype, already_invoiced[0])
+
+	orders = {}
+	for item in order_items:
+		orders.setdefault(item.reference_dt, []).append(item.reference_dn)
+
+	for doctype, names in orders.items():
+		already_invoiced = frappe.get_all(
+			doctype, filters={"name": ("in", names), "billing_status": "Invoiced"}, pluck="name"
+		)
+		if already_invoiced:
+			throw_already_invoiced(doctype, already_invoiced[0])
 
 
-def manage_prescriptions(invoiced, ref_dt, ref_dn, dt, created_check_field):
-	created = frappe.db.get_value(ref_dt, ref_dn, created_check_field)
-	if created:
-		# Fetch the doc created for the prescription
-		doc_created = frappe.db.get_value(dt, {"prescription": ref_dn})
-		frappe.db.set_value(dt, doc_created, "invoiced", invoiced)
+def throw_already_invoiced(reference_dt, reference_dn):
+	frappe.throw(
+		_("The item referenced by {0} - {1} is already invoiced").format(reference_dt, reference_dn)
+	)
 
 
-def manage_doc_for_appointment(dt_from_appointment, appointment, invoiced):
-	dn_from_appointment = frappe.db.get_value(
-		dt_from_appointment, filters={"appointment": appointment}
+def manage_prescriptions(invoiced, ref_dt, ref_dns, dt, created_check_field):
+	created = frappe.get_all(
+		ref_dt, filters={"name": ("in", ref_dns), created_check_field: 1}, pluck="name"
 	)
-	if dn_from_appointment:
-		frappe.db.set_value(dt_from_appointment, dn_from_appointment, "invoiced", invoiced)
+	if created:
+		# Update the docs created for the prescriptions
+		frappe.db.set_value(dt, {"prescription": ("in", created)}, "invoiced", invoiced)
+
+
+def manage_docs_for_appointments(appointments, invoiced):
+	procedure_appointments = []
+	consultation_appointments = []
+	for appointment in frappe.get_all(
+		"Patient Appointment",
+		filters={"name": ("in", appointments)},
+		fields=["name", "procedure_template"],
+	):
+		if appointment.procedure_template:
+			procedure_appointments.append(appointment.name)
+		else:
+			consultation_appointments.append(appointment.name)
+
+	if procedure_appointments:
+		frappe.db.set_value(
+			"Clinical Procedure", {"appointment": ("in", procedure_appointments)}, "invoiced", invoiced
+		)
+	if consultation_appointments:
+		frappe.db.set_value(
+			"Patient Encounter", {"appointment": ("in", consultation_appointments)}, "invoiced", invoiced
+		)
 
 
 @frappe.whitelist()
@@ -782,25 +1094,15 @@ def get_children(doctype, parent=None, company=None, is_root=False):
 		fields += [parent_fieldname + " as parent"]
 
 	service_units = frappe.get_list(doctype, fields=fields, filters=filters)
+	occupancy = get_occupancy()
 	for each in service_units:
 		if each["expandable"] != 1 or each["value"].startswith("All Healthcare Service Units"):
 			continue
 
-		available_count = frappe.db.count(
-			"Healthcare Service Unit",
-			filters={"parent_healthcare_service_unit": each["value"], "inpatient_occupancy": 1},
-		)
-
-		if available_count > 0:
-			occupied_count = frappe.db.count(
-				"Healthcare Service Unit",
-				filters={
-					"parent_healthcare_service_unit": each["value"],
-					"inpatient_occupancy": 1,
-					"occupancy_status": "Occupied",
-				},
-			)
+		if each["value"] in occupancy:
 			# set occupancy status of group node
+			occupied_count = cint(occupancy[each["value"]].occupied)
+			available_count = cint(occupancy[each["value"]].total)
 			each["occupied_of_available"] = f"{str(occupied_count)} Occupied of {str(available_count)}"
 
 	return service_units
@@ -1076,7 +1378,7 @@ def create_healthcare_service_unit_tree_root(doc, method=None):
 
 
 def validate_nursing_tasks(document):
-	if not frappe.db.get_single_value("Healthcare Settings", "validate_nursing_checklists"):
+	if not get_healthcare_settings().validate_nursing_checklists:
 		return True
 
 	filters = {
@@ -1123,54 +1425,37 @@ def company_on_trash(doc, method):
 		service_unit_doc.delete()
 
 
-def create_sample_collection_and_observation(doc):
-	meta = frappe.get_meta("Sales Invoice Item", cached=True)
-	diag_report_required = False
-	data = []
-	for item in doc.items:
-		# to set patient in item table if not set
-		if meta.has_field("patient") and not item.patient:
-			item.patient = doc.patient
+def create_sample_collection_and_observation_for_invoice(sales_invoice):
+	"""
+	Queued on invoice submit, skips invoices cancelled before the job ran and leaves the
+	error log linked on the invoice if the lab orders could not be created
+	"""
+	doc = frappe.get_doc("Sales Invoice", sales_invoice)
+	if doc.docstatus != 1:
+		return
 
-		# ignore if already created from service request
-		if item.get("reference_dt") == "Service Request" and item.get("reference_dn"):
-			if frappe.db.exists(
-				"Observation Sample Collection", {"service_request": item.get("reference_dn")}
-			) or frappe.db.exists(
-				"Sample Collection", {"service_request": item.get("reference_dn")}
-			):
-				continue
+	frappe.db.savepoint("invoice_observations")
+	try:
+		create_sample_collection_and_observation(doc)
+	except Exception:
+		frappe.db.rollback(save_point="invoice_observations")
+		error_log = frappe.log_error(
+			title=_("Sample Collection and Observations not created"),
+			reference_doctype="Sales Invoice",
+			reference_name=sales_invoice,
+		)
+		doc.add_comment(
+			"Comment",
+			_("Sample Collection and Observations could not be created, see {0}").format(
+				get_link_to_form("Error Log", error_log.name)
+			),
+		)
 
-		template_id = frappe.db.exists("Observation Template", {"item": item.item_code})
-		if template_id:
-			temp_dict = {}
-			temp_dict["name"] = template_id
-			if meta.has_field("patient") and item.get("patient"):
-				temp_dict["patient"] = item.get("patient")
-				temp_dict["child"] = item.get("name")
-			data.append(temp_dict)
 
-	out_data = []
-	for d in data:
-		observation_template = frappe.get_value(
-			"Observation Template",
-			d.get("name"),
-			[
-				"sample_type",
-				"sample",
-				"medical_department",
-				"container_closure_color",
-				"name",
-				"sample_qty",
-				"has_component",
-				"sample_collection_required",
-			],
-			as_dict=True,
-		)
-		if observation_template:
-			observation_template["patient"] = d.get("patient")
-			observation_template["child"] = d.get("child")
-			out_data.append(observation_template)
+def create_sample_collection_and_observation(doc):
+	meta = frappe.get_meta("Sales Invoice Item", cached=True)
+	diag_report_required = False
+	out_data = plan_invoice_observations(doc, meta)
 	if not meta.has_field("patient"):
 		sample_collection = create_sample_collection(doc, doc.patient)
 	else:
@@ -1208,6 +1493,52 @@ def create_sample_collection_and_observation(doc):
 			insert_diagnostic_report(doc, patient, sample_collection.name)
 
 
+def plan_invoice_observations(doc, meta):
+	"""
+	Returns the observation templates of the items of the Sales Invoice `doc`, with their
+	components resolved, from the cached item index and without a query per item
+	"""
+	item_templates = get_item_observation_templates()
+
+	# ignore if already created from service request
+	service_requests = [
+		item.get("reference_dn")
+		for item in doc.items
+		if item.get("reference_dt") == "Service Request" and item.get("reference_dn")
+	]
+	collected_service_requests = set()
+	if service_requests:
+		for doctype in ["Observation Sample Collection", "Sample Collection"]:
+			collected_service_requests.update(
+				frappe.get_all(
+					doctype,
+					filters={"service_request": ["in", service_requests]},
+					pluck="service_request",
+				)
+			)
+
+	out_data = []
+	for item in doc.items:
+		# to set patient in item table if not set
+		if meta.has_field("patient") and not item.patient:
+			item.patient = doc.patient
+
+		if (
+			item.get("reference_dt") == "Service Request"
+			and item.get("reference_dn") in collected_service_requests
+		):
+			continue
+
+		if item.item_code in item_templates:
+			observation_template = frappe._dict(item_templates[item.item_code])
+			if meta.has_field("patient") and item.get("patient"):
+				observation_template["patient"] = item.get("patient")
+				observation_template["child"] = item.get("name")
+			out_data.append(observation_template)
+
+	return out_data
+
+
 def create_sample_collection(doc, patient):
 	patient = frappe.get_doc("Patient", patient)
 	sample_collection = frappe.new_doc("Sample Collection")
@@ -1246,14 +1577,19 @@ def insert_observation_and_sample_collection(doc, patient, grp, sample_collectio
 			child=child if child else "",
 		)
 
-		sample_reqd_component_obs, non_sample_reqd_component_obs = get_observation_template_details(
-			grp.get("name")
-		)
+		if "sample_reqd_components" in grp:
+			sample_reqd_component_obs = grp.get("sample_reqd_components")
+			non_sample_reqd_component_obs = grp.get("non_sample_reqd_components")
+		else:
+			(
+				sample_reqd_component_obs,
+				non_sample_reqd_component_obs,
+			) = get_observation_template_details(grp.get("name"))
 		# create observation for non sample_collection_reqd grouped templates
 
 		if len(non_sample_reqd_component_obs) > 0:
-			for comp in non_sample_reqd_component_obs:
-				add_observation(
+			component_observations = [
+				make_observation(
 					patient=patient,
 					template=comp,
 					practitioner=doc.ref_practitioner,
@@ -1261,6 +1597,11 @@ def insert_observation_and_sample_collection(doc, patient, grp, sample_collectio
 					invoice=doc.name,
 					child=child if child else "",
 				)
+				for comp in non_sample_reqd_component_obs
+			]
+			preload_observation_links(component_observations)
+			for observation in component_observations:
+				observation.insert(ignore_permissions=True)
 		# create sample_colleciton child row for  sample_collection_reqd grouped templates
 		if len(sample_reqd_component_obs) > 0:
 			sample_collection.append(
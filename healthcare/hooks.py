@@ -135,6 +135,24 @@ doc_events = {
 	"Patient": {
 		"after_insert": "healthcare.regional.india.abdm.utils.set_consent_attachment_details"
 	},
+	"Practitioner Schedule": {
+		"on_update": "healthcare.healthcare.doctype.patient_appointment.patient_appointment.clear_availability_cache",
+		"on_trash": "healthcare.healthcare.doctype.patient_appointment.patient_appointment.clear_availability_cache",
+	},
+	"Healthcare Practitioner": {
+		"on_update": "healthcare.healthcare.doctype.patient_appointment.patient_appointment.clear_availability_cache",
+	},
+	"Healthcare Service Unit": {
+		"on_update": "healthcare.healthcare.doctype.patient_appointment.patient_appointment.clear_availability_cache",
+	},
+	"Holiday List": {
+		"on_update": "healthcare.healthcare.doctype.patient_appointment.patient_appointment.clear_availability_cache",
+		"on_trash": "healthcare.healthcare.doctype.patient_appointment.patient_appointment.clear_availability_cache",
+	},
+	"Leave Application": {
+		"on_submit": "healthcare.healthcare.doctype.patient_appointment.patient_appointment.clear_availability_cache",
+		"on_cancel": "healthcare.healthcare.doctype.patient_appointment.patient_appointment.clear_availability_cache",
+	},
 	"Payment Entry": {
 		"on_submit": "healthcare.healthcare.custom_doctype.payment_entry.set_paid_amount_in_treatment_counselling",
 		"on_cancel": "healthcare.healthcare.custom_doctype.payment_entry.set_paid_amount_in_treatment_counselling",
@@ -149,6 +167,7 @@ scheduler_events = {
 		"healthcare.healthcare.doctype.patient_appointment.patient_appointment.update_appointment_status",
 		"healthcare.healthcare.doctype.fee_validity.fee_validity.update_validity_status",
 		"healthcare.healthcare.doctype.inpatient_record.inpatient_record.add_occupied_service_unit_in_ip_to_billables",
+		"healthcare.healthcare.doctype.diagnostic_report.diagnostic_report.reconcile_observation_counters",
 	],
 }
 
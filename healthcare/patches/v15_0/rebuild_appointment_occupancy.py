@@ -0,0 +1,7 @@
+from healthcare.healthcare.doctype.appointment_occupancy.appointment_occupancy import (
+	rebuild_appointment_occupancy,
+)
+
+
+def execute():
+	rebuild_appointment_occupancy()
@@ -0,0 +1,7 @@
+from healthcare.healthcare.doctype.patient_daily_activity.patient_daily_activity import (
+	rebuild_patient_activity,
+)
+
+
+def execute():
+	rebuild_patient_activity()
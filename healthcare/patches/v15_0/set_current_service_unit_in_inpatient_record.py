@@ -0,0 +1,29 @@
+import frappe
+
+
+def execute():
+	io = frappe.qb.DocType("Inpatient Occupancy")
+	ip = frappe.qb.DocType("Inpatient Record")
+	occupancies = (
+		frappe.qb.from_(io)
+		.join(ip)
+		.on(io.parent == ip.name)
+		.select(io.parent, io.service_unit)
+		.where(
+			(io.parenttype == "Inpatient Record") & ip.status.isin(["Admitted", "Discharge Scheduled"])
+		)
+		.orderby(io.parent)
+		.orderby(io.idx)
+		.run(as_dict=True)
+	)
+
+	# last occupancy of each record wins
+	service_units = {occupancy.parent: occupancy.service_unit for occupancy in occupancies}
+	for inpatient_record, service_unit in service_units.items():
+		frappe.db.set_value(
+			"Inpatient Record",
+			inpatient_record,
+			"current_service_unit",
+			service_unit,
+			update_modified=False,
+		)
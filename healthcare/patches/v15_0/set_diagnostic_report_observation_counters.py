@@ -0,0 +1,7 @@
+from healthcare.healthcare.doctype.diagnostic_report.diagnostic_report import (
+	reconcile_observation_counters,
+)
+
+
+def execute():
+	reconcile_observation_counters()
@@ -0,0 +1,44 @@
+import frappe
+from frappe.utils import get_datetime
+
+
+def execute():
+	"""
+	Rent used to be re-billed from check in on every run, so set the billing marker of
+	occupancies already billed into active Inpatient Records to the last time the record
+	was saved, to keep incremental billing from billing those hours again.
+	"""
+	io = frappe.qb.DocType("Inpatient Occupancy")
+	ip = frappe.qb.DocType("Inpatient Record")
+	iri = frappe.qb.DocType("Inpatient Record Item")
+	su = frappe.qb.DocType("Healthcare Service Unit")
+	sut = frappe.qb.DocType("Healthcare Service Unit Type")
+
+	occupancies = (
+		frappe.qb.from_(io)
+		.join(ip)
+		.on(io.parent == ip.name)
+		.join(su)
+		.on(io.service_unit == su.name)
+		.join(sut)
+		.on(su.service_unit_type == sut.name)
+		.join(iri)
+		.on((iri.parent == ip.name) & (iri.item_code == sut.item))
+		.select(io.name, io.check_out, ip.modified)
+		.distinct()
+		.where(ip.status.isin(["Admitted", "Discharge Scheduled"]))
+		.run(as_dict=True)
+	)
+
+	for occupancy in occupancies:
+		billed_till = get_datetime(occupancy.modified)
+		if occupancy.check_out:
+			billed_till = min(get_datetime(occupancy.check_out), billed_till)
+
+		frappe.db.set_value(
+			"Inpatient Occupancy",
+			occupancy.name,
+			"scheduled_billing_time",
+			billed_till,
+			update_modified=False,
+		)